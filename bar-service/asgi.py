@@ -0,0 +1,74 @@
+"""Asyncio serving mode for the bar service.
+
+Serves the same routes as app.py from Quart. The scheduling logic in
+bar.py is blocking and runs on a thread pool; the STATION_COUNT station
+threads that do the work are the same in both modes.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5003
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, g, jsonify, request
+
+import bar
+
+app = Quart(__name__)
+
+# Threads for the bar logic, per process; each covers one delivery waiting
+# on the sidecar, as the threads of the threaded server do
+THREADS = int(os.getenv("GUNICORN_THREADS", "8"))
+
+@app.before_serving
+async def start_threads():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=THREADS))
+
+@app.before_request
+async def _count_request_start():
+    g.in_flight_route = bar.route_label(request.url_rule)
+    bar.requests_in_flight.add(1, {"route": g.in_flight_route})
+
+@app.teardown_request
+async def _count_request_end(exc=None):
+    route = g.pop('in_flight_route', None)
+    if route is not None:
+        bar.requests_in_flight.add(-1, {"route": route})
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Prometheus scrape endpoint for this process's metrics"""
+    return bar.metrics_response()
+
+@app.route('/dapr/subscribe', methods=['GET'])
+async def subscribe():
+    """Tell Dapr what topics we want to subscribe to"""
+    return jsonify(bar.subscriptions())
+
+@app.route('/bar-orders-bulk', methods=['POST'])
+async def handle_bar_orders_bulk():
+    """Handle a batch of beer orders from a Dapr bulk subscription"""
+    payload = await request.get_json(force=True, silent=True)
+    return await asyncio.to_thread(bar.handle_orders_bulk, payload)
+
+@app.route('/bar-orders', methods=['POST'])
+async def handle_bar_order():
+    """Handle incoming beer orders from pub/sub"""
+    return await asyncio.to_thread(bar.handle_order, request.headers, await request.get_data())
+
+@app.route('/ready')
+async def ready():
+    return await asyncio.to_thread(bar.readiness)
+
+@app.route('/health', methods=['GET'])
+async def health():
+    return jsonify({'status': 'healthy', 'service': 'bar'})
+
+@app.route('/queue', methods=['GET'])
+async def queue_status():
+    """Current order queue depth and station wait times"""
+    return jsonify(bar.queue_snapshot())
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5003")))
@@ -0,0 +1,43 @@
+"""Gunicorn settings for running the bar service in production.
+
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+Worker and thread counts come from the environment. The app is preloaded
+in the master so workers fork with the code already imported, and
+OpenTelemetry is set up in each worker after the fork.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5003')}"
+
+# Each worker runs its own STATION_COUNT stations, so capacity scales with
+# WEB_CONCURRENCY. Deliveries are acked as soon as they are queued, so a few
+# threads per worker are enough.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "10"))
+keepalive = 5
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")
+
+# Applied before the app is preloaded, so bar.py skips its import-time setup
+raw_env = ["OTEL_INIT_AFTER_FORK=1"]
+
+
+def post_fork(server, worker):
+    import bar
+    bar.init_telemetry()
+
+
+def worker_exit(server, worker):
+    """Flush buffered spans within the graceful timeout and close the sidecar channel"""
+    import bar
+    from opentelemetry import trace
+    bar.close_dapr_client()
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "force_flush"):
+        provider.force_flush(timeout_millis=graceful_timeout * 500)
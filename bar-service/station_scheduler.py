@@ -0,0 +1,168 @@
+"""Per-item scheduling for a service's prep stations.
+
+Each order is split into one unit per item. A free station takes the item
+whose oldest unit has waited longest, together with up to ``batch_size``
+waiting units of that same item from any order, and prepares them at once
+in that item's prep time, so three IPAs are poured in the time of one. An
+order is done when its last unit is.
+
+The scheduler only keeps the books and runs no threads or timers; the
+service decides how stations wait and sleep, and holds a lock around it.
+Times are whatever clock the caller passes as ``now``.
+"""
+import heapq
+import itertools
+from collections import deque
+
+
+class ScheduledOrder:
+    """An accepted order and how far along its units are"""
+
+    __slots__ = ('order_id', 'payload', 'enqueued_at', 'started_at', 'waiting', 'remaining', 'done',
+                 'estimated_ready_at')
+
+    def __init__(self, order_id, payload, enqueued_at, units):
+        self.order_id = order_id
+        self.payload = payload
+        self.enqueued_at = enqueued_at
+        self.started_at = None
+        self.waiting = units
+        self.remaining = units
+        self.done = {}  # item -> units prepared so far
+        self.estimated_ready_at = None
+
+
+class Batch:
+    """Identical units taken by one station, one per entry in ``orders``"""
+
+    __slots__ = ('item', 'orders', 'prep_time', 'finish_at', 'started')
+
+    def __init__(self, item, orders, prep_time, finish_at, started):
+        self.item = item
+        self.orders = orders
+        self.prep_time = prep_time
+        self.finish_at = finish_at
+        self.started = started  # orders whose first unit is in this batch
+
+
+class StationScheduler:
+    """Plan which items ``stations`` parallel stations prepare next.
+
+    ``prep_time(item)`` gives the seconds one batch of ``item`` takes.
+    """
+
+    def __init__(self, stations, prep_time, batch_size=1):
+        self.stations = stations
+        self.batch_size = max(1, batch_size)
+        self._prep_time = prep_time
+        self._seq = itertools.count()
+        self._waiting = {}  # item -> deque of (seq, order ID), oldest first
+        self._orders = {}   # order ID -> ScheduledOrder
+        self._running = []  # batches a station is preparing
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    @property
+    def queued(self):
+        """Orders with at least one unit no station has started"""
+        return sum(1 for order in self._orders.values() if order.waiting)
+
+    @property
+    def busy(self):
+        return len(self._running)
+
+    def waiting_units(self):
+        """``{item: units waiting}`` for items with a queue"""
+        return {item: len(units) for item, units in self._waiting.items() if units}
+
+    def add(self, order_id, items, payload, now):
+        """Accept an order and return its estimated ready time.
+
+        An order that is already scheduled (a redelivery) is left as it is.
+        """
+        if order_id in self._orders:
+            return self._orders[order_id].estimated_ready_at
+        if not items:
+            raise ValueError(f"order {order_id} has no items")
+        self._orders[order_id] = ScheduledOrder(order_id, payload, now, len(items))
+        for item in items:
+            self._waiting.setdefault(item, deque()).append((next(self._seq), order_id))
+        self.estimate(now)
+        return self._orders[order_id].estimated_ready_at
+
+    def _next_item(self, waiting):
+        """The item whose oldest waiting unit came in first"""
+        heads = [(units[0][0], item) for item, units in waiting.items() if units]
+        return min(heads)[1] if heads else None
+
+    def next_batch(self, now):
+        """Start the next batch on a free station, or None if nothing waits"""
+        item = self._next_item(self._waiting)
+        if item is None:
+            return None
+        units = self._waiting[item]
+        orders, started = [], []
+        for _ in range(min(self.batch_size, len(units))):
+            _, order_id = units.popleft()
+            order = self._orders[order_id]
+            order.waiting -= 1
+            if order.started_at is None:
+                order.started_at = now
+                started.append(order)
+            orders.append(order)
+        if not units:
+            del self._waiting[item]
+        prep_time = self._prep_time(item)
+        batch = Batch(item, orders, prep_time, now + prep_time, started)
+        self._running.append(batch)
+        return batch
+
+    def finish(self, batch):
+        """Mark a batch prepared and return the orders it completed"""
+        self._running.remove(batch)
+        done = []
+        for order in batch.orders:
+            order.remaining -= 1
+            order.done[batch.item] = order.done.get(batch.item, 0) + 1
+            if order.remaining == 0:
+                del self._orders[order.order_id]
+                done.append(order)
+        return done
+
+    def backlog(self, now):
+        """Seconds of work accepted: until the last order is estimated ready"""
+        return max([0.0, *(ready_at - now for ready_at in self.estimate(now).values())])
+
+    def estimate(self, now):
+        """Re-estimate every order's ready time by playing the queue forward.
+
+        Stations free up as their running batches finish and then take
+        batches in the same order ``next_batch`` would. Later arrivals only
+        join batches or queue behind, so an estimate does not move as more
+        orders come in; it moves when prep runs long or short.
+        """
+        ready = {order_id: now for order_id in self._orders}
+        free_at = [batch.finish_at for batch in self._running]
+        free_at += [now] * max(0, self.stations - len(free_at))
+        heapq.heapify(free_at)
+        for batch in self._running:
+            for order in batch.orders:
+                ready[order.order_id] = max(ready[order.order_id], batch.finish_at)
+
+        waiting = {item: deque(units) for item, units in self._waiting.items() if units}
+        while waiting:
+            item = self._next_item(waiting)
+            units = waiting[item]
+            start = max(heapq.heappop(free_at), now)
+            finish_at = start + self._prep_time(item)
+            for _ in range(min(self.batch_size, len(units))):
+                _, order_id = units.popleft()
+                ready[order_id] = max(ready[order_id], finish_at)
+            if not units:
+                del waiting[item]
+            heapq.heappush(free_at, finish_at)
+
+        for order_id, ready_at in ready.items():
+            self._orders[order_id].estimated_ready_at = ready_at
+        return ready
@@ -0,0 +1,67 @@
+"""Dapr gRPC calls the Python SDK has no public method for.
+
+The SDK pinned in requirements.txt has no bulk publish and no synchronous
+actor call, and its ``execute_state_transaction`` cannot set metadata, and
+so a TTL, per operation. These three go to the client's gRPC stub directly,
+so check them against the SDK whenever the pin moves. Errors are the
+stub's ``grpc.RpcError``.
+"""
+from dapr.proto.common.v1 import common_pb2
+from dapr.proto.runtime.v1 import dapr_pb2
+
+
+def _to_bytes(data):
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def bulk_publish(client, pubsub_name, topic, entries, content_type):
+    """Publish ``[(entry_id, data)]`` to ``topic`` in one call; returns the IDs that failed"""
+    response = client._stub.BulkPublishEventAlpha1(dapr_pb2.BulkPublishRequest(
+        pubsub_name=pubsub_name,
+        topic=topic,
+        entries=[
+            dapr_pb2.BulkPublishRequestEntry(entry_id=entry_id, event=_to_bytes(data), content_type=content_type)
+            for entry_id, data in entries
+        ]
+    ))
+    return {entry.entry_id for entry in response.failedEntries}
+
+
+def invoke_actor(client, actor_type, actor_id, method, data=b''):
+    """Call a method on an actor through the sidecar; returns the reply body"""
+    response = client._stub.InvokeActor(dapr_pb2.InvokeActorRequest(
+        actor_type=actor_type,
+        actor_id=actor_id,
+        method=method,
+        data=data
+    ))
+    return response.data
+
+
+def execute_state_transaction(client, store_name, upserts, first_write=False):
+    """Write ``[(key, value, etag, metadata)]`` in one state transaction.
+
+    Each write is guarded by its ETag when it has one, and carries its own
+    state metadata such as ``ttlInSeconds``. With ``first_write`` a write
+    without an ETag fails if its key already exists, as does the whole
+    transaction.
+    """
+    options = common_pb2.StateOptions(
+        concurrency=common_pb2.StateOptions.CONCURRENCY_FIRST_WRITE
+    ) if first_write else None
+    client._stub.ExecuteStateTransaction(dapr_pb2.ExecuteStateTransactionRequest(
+        storeName=store_name,
+        operations=[
+            dapr_pb2.TransactionalStateOperation(
+                operationType='upsert',
+                request=common_pb2.StateItem(
+                    key=key,
+                    value=_to_bytes(value),
+                    etag=common_pb2.Etag(value=etag) if etag else None,
+                    metadata=metadata,
+                    options=options
+                )
+            )
+            for key, value, etag, metadata in upserts
+        ]
+    ))
@@ -0,0 +1,799 @@
+"""The kitchen service: scheduling burger orders onto its stations, simulating
+the work and publishing the ETAs, progress and completions.
+
+Shared by both ways of serving it: app.py (Flask) and asgi.py (Quart, which
+runs these functions on a thread pool). The request handlers at the end
+take the parsed request and return what the route should, a body or
+``(body, status, headers)``.
+"""
+from dapr.clients import DaprClient
+from dapr.clients.exceptions import DaprGrpcError
+from dapr.clients.grpc._state import Concurrency, StateOptions
+from dapr.clients.http.helpers import get_api_url
+from dapr.conf import settings
+from cloudevents.http import from_http
+import atexit
+import base64
+import grpc
+import json
+import logging
+import time
+import os
+import sys
+import queue
+import threading
+import urllib.request
+from logging.handlers import QueueHandler, QueueListener
+
+# OpenTelemetry API. Spans and metrics recorded through it are no-ops until
+# init_telemetry installs the SDK.
+from opentelemetry import metrics, trace, propagate, context
+from opentelemetry.propagate import set_global_textmap
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+import codec
+import dapr_grpc
+from seen_events import SeenEvents
+from station_scheduler import StationScheduler
+
+# Configure OpenTelemetry
+SERVICE_NAME = os.getenv("SERVICE_NAME", "kitchen-service")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317")
+
+# OTEL_SDK_DISABLED=true, the standard OpenTelemetry switch, turns telemetry
+# off altogether: the SDK, the exporter and the instrumentation are not even
+# imported, which takes a good part off a cold start
+TELEMETRY_ENABLED = os.getenv("OTEL_SDK_DISABLED", "").lower() != "true"
+if TELEMETRY_ENABLED:
+    from opentelemetry.sdk.metrics import Histogram, MeterProvider
+    from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.exporter.prometheus import PrometheusMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+    from opentelemetry.instrumentation.grpc import GrpcInstrumentorClient
+
+# Pre-fork servers set this so the exporter is only created in the workers
+OTEL_INIT_AFTER_FORK = os.getenv("OTEL_INIT_AFTER_FORK", "").lower() in ("1", "true")
+
+# Share of new traces to record. Requests that arrive with a trace context
+# follow the caller's sampling decision instead.
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Histogram buckets in seconds, from sub-millisecond sidecar calls to slow orders
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class BackgroundLogHandler(QueueHandler):
+    """Queue log records for a writer thread so requests never wait on stdout.
+
+    The thread is started by the first record a process logs, so forked
+    workers get their own.
+    """
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self._target = target
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._listener = QueueListener(self.queue, self._target)
+                    self._listener.start()
+                    self._pid = os.getpid()
+        super().enqueue(record)
+
+    def close(self):
+        """Write out what is still queued; runs at interpreter exit"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+log = logging.getLogger(SERVICE_NAME)
+log.setLevel(LOG_LEVEL)
+log.propagate = False
+log.addHandler(BackgroundLogHandler(logging.StreamHandler(sys.stdout)))
+
+tracer = trace.get_tracer(__name__)
+
+# Set W3C Trace Context propagator (used by Dapr)
+set_global_textmap(TraceContextTextMapPropagator())
+
+def init_telemetry():
+    """Install the tracer provider and OTLP exporter for this process.
+
+    The batch processor runs a background thread and the exporter holds a
+    gRPC channel, neither of which survives a fork, so pre-fork servers call
+    this from each worker instead of at import. Does nothing with
+    OTEL_SDK_DISABLED.
+    """
+    if not TELEMETRY_ENABLED:
+        return
+    resource = Resource(attributes={
+        "service.name": SERVICE_NAME,
+        "service.version": "1.0.0",
+        "deployment.environment": "development"
+    })
+
+    sampler = ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO))
+    trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
+
+    # Configure OTLP exporter
+    otlp_exporter = OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT, insecure=True)
+    span_processor = BatchSpanProcessor(otlp_exporter)
+    trace.get_tracer_provider().add_span_processor(span_processor)
+
+    # Metrics stay in this process and are scraped from /metrics
+    metrics.set_meter_provider(MeterProvider(
+        resource=resource,
+        metric_readers=[PrometheusMetricReader()],
+        views=[View(instrument_type=Histogram, aggregation=ExplicitBucketHistogramAggregation(LATENCY_BUCKETS))]
+    ))
+
+    log.info("🔍 OpenTelemetry initialized for %s (pid %d), exporting to %s, sampling %s of new traces",
+             SERVICE_NAME, os.getpid(), OTEL_EXPORTER_OTLP_ENDPOINT, TRACE_SAMPLE_RATIO)
+
+if not OTEL_INIT_AFTER_FORK:
+    init_telemetry()
+
+# Note: NOT using FlaskInstrumentor to avoid conflicts with Dapr's tracing
+# We'll manually create spans and extract context from Dapr's headers
+if TELEMETRY_ENABLED:
+    RequestsInstrumentor().instrument()
+    GrpcInstrumentorClient().instrument()
+
+# Metrics. Instruments are created at import and start recording once
+# init_telemetry has installed the meter provider in this process.
+meter = metrics.get_meter(__name__)
+sidecar_call_duration = meter.create_histogram(
+    "dapr.call.duration", unit="s", description="Latency of calls to the Dapr sidecar, by operation"
+)
+requests_in_flight = meter.create_up_down_counter(
+    "handler.requests.in_flight", unit="{request}", description="Requests being handled, by route"
+)
+prep_duration = meter.create_histogram(
+    "order.prep.duration", unit="s", description="Preparation time of each batch at a station, by item"
+)
+queue_wait_duration = meter.create_histogram(
+    "order.queue.wait", unit="s", description="Time from an order being scheduled to a station starting on it"
+)
+
+def route_label(rule):
+    """The ``route`` label of ``requests_in_flight`` for a matched URL rule"""
+    return rule.rule if rule is not None else "unmatched"
+
+def metrics_response():
+    """This process's metrics in the Prometheus text format"""
+    return generate_latest(REGISTRY), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+class TimedDaprClient:
+    """Wraps a Dapr client to time every sidecar call"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name == 'close' or not callable(attr):
+            return attr
+        timed = self._timed(name, attr)
+        setattr(self, name, timed)
+        return timed
+
+    @staticmethod
+    def _timed(name, call):
+        def record(start, outcome):
+            sidecar_call_duration.record(time.perf_counter() - start, {"operation": name, "outcome": outcome})
+
+        def timed(*args, **kwargs):
+            start, outcome = time.perf_counter(), "error"
+            try:
+                result = call(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                record(start, outcome)
+        return timed
+
+DAPR_STORE_NAME = "statestore"
+
+def _trace_headers():
+    """Inject the current trace context into each Dapr HTTP request"""
+    headers = {}
+    propagate.inject(headers)
+    return headers
+
+# One gRPC channel to the sidecar per process, created on first use. gRPC
+# calls get the current trace context from the instrumented channel.
+_dapr_client = None
+_dapr_client_lock = threading.Lock()
+
+def get_dapr_client():
+    """Return the process-wide Dapr client"""
+    global _dapr_client
+    if _dapr_client is None:
+        with _dapr_client_lock:
+            if _dapr_client is None:
+                _dapr_client = TimedDaprClient(DaprClient(headers_callback=_trace_headers))
+    return _dapr_client
+
+@atexit.register
+def close_dapr_client():
+    """Close the sidecar channel on shutdown"""
+    global _dapr_client
+    with _dapr_client_lock:
+        if _dapr_client is not None:
+            _dapr_client.close()
+            _dapr_client = None
+
+# Orders are acked as soon as they are scheduled. STATION_COUNT stations
+# work through them item by item, each taking up to STATION_BATCH_SIZE
+# identical items across orders at once. More than ORDER_QUEUE_SIZE orders
+# waiting for a station pushes back on Dapr with RETRY.
+STATION_COUNT = int(os.getenv("STATION_COUNT", "2"))
+STATION_BATCH_SIZE = int(os.getenv("STATION_BATCH_SIZE", "4"))
+ORDER_QUEUE_SIZE = int(os.getenv("ORDER_QUEUE_SIZE", "20"))
+# Seconds to cook one batch of each menu item; a JSON object in
+# ITEM_PREP_TIMES overrides them
+ITEM_PREP_TIMES = {
+    'Classic Burger': 3,
+    'Double Bacon Burger': 5,
+    'Veggie Burger': 4,
+    **json.loads(os.getenv("ITEM_PREP_TIMES", "{}"))
+}
+DEFAULT_PREP_TIME = 4
+# Multiplies the simulated prep time, e.g. 0.1 for fast load-test runs
+PREP_TIME_SCALE = float(os.getenv("PREP_TIME_SCALE", "1"))
+# Items finished for orders that are not done yet are reported on
+# kitchen-progress at most once per PROGRESS_INTERVAL seconds, in one event
+# for all orders; 0 turns progress events off
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "1"))
+
+def _prep_time(item):
+    """Simulated cooking time in seconds for one batch of ``item``"""
+    return ITEM_PREP_TIMES.get(item, DEFAULT_PREP_TIME) * PREP_TIME_SCALE
+
+scheduler = StationScheduler(STATION_COUNT, _prep_time, STATION_BATCH_SIZE)
+_schedule = threading.Condition()
+_stations = []
+_stations_lock = threading.Lock()
+_queue_stats = {'busy': 0, 'started': 0, 'processed': 0, 'rejected': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+_progress = {}  # order ID -> {item: done} for the next progress event
+
+# Dapr delivers at least once. A redelivered order handled in the last
+# DEDUP_TTL_SECONDS is acked without being cooked again: this process
+# remembers up to DEDUP_CACHE_SIZE of them, and a first-write marker per
+# order in the state store catches redeliveries to another replica.
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", "600"))
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+DEDUP_STATE_MARKERS = os.getenv("DEDUP_STATE_MARKERS", "true").lower() in ("1", "true")
+seen_orders = SeenEvents(DEDUP_CACHE_SIZE, DEDUP_TTL_SECONDS)
+
+# Encoding of the events this service publishes: "json", or "msgpack" for a
+# compact binary form. Incoming events are read in whichever they use.
+PAYLOAD_CONTENT_TYPE = codec.content_type(os.getenv("PAYLOAD_ENCODING", "json"))
+
+def _seen_key(order_id):
+    return f"kitchen-seen-{order_id}"
+
+def _claim_order(order_id):
+    """Write this service's marker for an order; False if it is already there.
+
+    The marker expires after DEDUP_TTL_SECONDS. Sidecar errors other than
+    the conflict let the order through, as making it twice beats not at all.
+    """
+    if not DEDUP_STATE_MARKERS:
+        return True
+    try:
+        get_dapr_client().save_state(
+            store_name=DAPR_STORE_NAME,
+            key=_seen_key(order_id),
+            value='1',
+            options=StateOptions(concurrency=Concurrency.first_write),
+            state_metadata={'ttlInSeconds': str(DEDUP_TTL_SECONDS)}
+        )
+        return True
+    except DaprGrpcError as e:
+        if e.code() == grpc.StatusCode.ABORTED:
+            return False
+        log.warning("⚠️ Kitchen dedup marker for order #%s not written: %s", order_id, e)
+        return True
+
+def _release_order(order_id):
+    """Remove an order's marker so its redelivery is not taken for a duplicate"""
+    if not DEDUP_STATE_MARKERS:
+        return
+    try:
+        get_dapr_client().delete_state(store_name=DAPR_STORE_NAME, key=_seen_key(order_id))
+    except Exception as e:
+        log.warning("⚠️ Kitchen dedup marker for order #%s not removed: %s", order_id, e)
+
+def _claim_orders(order_ids):
+    """Write the markers of several orders; returns the IDs already marked.
+
+    All markers go in one state transaction. If one of them is already
+    there the transaction writes nothing, and the orders are claimed one
+    at a time instead, which only happens for redeliveries.
+    """
+    if not DEDUP_STATE_MARKERS or not order_ids:
+        return set()
+    if len(order_ids) == 1:
+        return set() if _claim_order(order_ids[0]) else set(order_ids)
+    claim = TimedDaprClient._timed("execute_state_transaction", dapr_grpc.execute_state_transaction)
+    marker = {'ttlInSeconds': str(DEDUP_TTL_SECONDS)}
+    try:
+        claim(get_dapr_client(), DAPR_STORE_NAME, [
+            (_seen_key(order_id), '1', None, marker) for order_id in order_ids
+        ], first_write=True)
+        return set()
+    except grpc.RpcError as e:
+        if e.code() != grpc.StatusCode.ABORTED:
+            log.warning("⚠️ Kitchen dedup markers for %d orders not written: %s", len(order_ids), e)
+            return set()
+    return {order_id for order_id in order_ids if not _claim_order(order_id)}
+
+def _station_worker():
+    """Prepare batches of identical items as the scheduler hands them out"""
+    while True:
+        with _schedule:
+            batch = _schedule.wait_for(lambda: scheduler.next_batch(time.monotonic()))
+        _record_station_start(batch)
+        try:
+            prepare_batch(batch)
+        finally:
+            with _schedule:
+                done = scheduler.finish(batch)
+                flush = _queue_progress(batch, done)
+            _record_station_done(done)
+        if flush:
+            timer = threading.Timer(PROGRESS_INTERVAL, publish_progress)
+            timer.daemon = True
+            timer.start()
+        for order in done:
+            complete_order(order)
+
+def _queue_progress(batch, done):
+    """Note item counts of a finished batch's unfinished orders.
+
+    Orders the batch completed are dropped, their completion event says it
+    all. Returns True when this starts a new progress interval. The caller
+    holds ``_schedule``.
+    """
+    if not PROGRESS_INTERVAL:
+        return False
+    first = not _progress
+    for order in batch.orders:
+        if order.remaining:
+            _progress[order.order_id] = dict(order.done)
+    for order in done:
+        _progress.pop(order.order_id, None)
+    return first and bool(_progress)
+
+def _take_progress():
+    with _schedule:
+        progress = dict(_progress)
+        _progress.clear()
+    return progress
+
+def _progress_event(progress):
+    """One compact event for every order with new progress: ``{order_id: {item: done}}``"""
+    return codec.encode({'progress': progress}, PAYLOAD_CONTENT_TYPE)
+
+def publish_progress():
+    """Publish the progress collected over the last interval; best effort"""
+    progress = _take_progress()
+    if not progress:
+        return
+    try:
+        with tracer.start_as_current_span("publish_kitchen_progress") as span:
+            span.set_attribute("progress.orders", len(progress))
+            get_dapr_client().publish_event(
+                pubsub_name="orderpubsub",
+                topic_name="kitchen-progress",
+                data=_progress_event(progress),
+                data_content_type=PAYLOAD_CONTENT_TYPE
+            )
+    except Exception as e:
+        log.warning("⚠️ Kitchen progress for %d orders not published: %s", len(progress), e)
+
+def _record_station_start(batch):
+    waits = [order.started_at - order.enqueued_at for order in batch.started]
+    with _stations_lock:
+        _queue_stats['busy'] += 1
+        _queue_stats['started'] += len(waits)
+        _queue_stats['wait_total'] += sum(waits)
+        _queue_stats['wait_max'] = max([_queue_stats['wait_max'], *waits])
+    for wait in waits:
+        queue_wait_duration.record(wait)
+
+def _record_station_done(done):
+    with _stations_lock:
+        _queue_stats['busy'] -= 1
+        _queue_stats['processed'] += len(done)
+
+def _record_rejected():
+    with _stations_lock:
+        _queue_stats['rejected'] += 1
+
+def _ensure_stations():
+    """Start the station workers on first use (after any fork)"""
+    if len(_stations) == STATION_COUNT:
+        return
+    with _stations_lock:
+        while len(_stations) < STATION_COUNT:
+            worker = threading.Thread(
+                target=_station_worker,
+                name=f"kitchen-station-{len(_stations) + 1}",
+                daemon=True
+            )
+            worker.start()
+            _stations.append(worker)
+
+def _has_room(order_id):
+    """Whether the stations can take an order (or already have it)"""
+    with _schedule:
+        if order_id in scheduler or scheduler.queued < ORDER_QUEUE_SIZE:
+            return True
+    _record_rejected()
+    return False
+
+def _schedule_order(order_id, items):
+    """Hand an order's items to the scheduler.
+
+    Returns the estimated ready time as a Unix timestamp, or None when
+    ORDER_QUEUE_SIZE orders are already waiting. A redelivered order keeps
+    its place. The caller holds ``_schedule``.
+    """
+    if order_id not in scheduler and scheduler.queued >= ORDER_QUEUE_SIZE:
+        _record_rejected()
+        return None
+    now = time.monotonic()
+    ready_at = scheduler.add(order_id, items, context.get_current(), now)
+    return time.time() + (ready_at - now)
+
+def enqueue_order(order_id, items):
+    """Schedule an order for the stations; see ``_schedule_order``"""
+    _ensure_stations()
+    with _schedule:
+        estimated_ready_at = _schedule_order(order_id, items)
+        if estimated_ready_at is not None:
+            _schedule.notify_all()
+    return estimated_ready_at
+
+# Dapr bulk subscribe: the sidecar batches deliveries into one request per
+# BULK_MAX_MESSAGES events or BULK_MAX_AWAIT_MS, whichever comes first
+BULK_SUBSCRIBE = os.getenv("BULK_SUBSCRIBE", "").lower() in ("1", "true")
+BULK_MAX_MESSAGES = int(os.getenv("BULK_MAX_MESSAGES", "100"))
+BULK_MAX_AWAIT_MS = int(os.getenv("BULK_MAX_AWAIT_MS", "40"))
+
+def _subscription(topic, route):
+    subscription = {
+        'pubsubname': 'orderpubsub',
+        'topic': topic,
+        'route': route
+    }
+    if BULK_SUBSCRIBE:
+        subscription['route'] = f"{route}-bulk"
+        subscription['bulkSubscribe'] = {
+            'enabled': True,
+            'maxMessagesCount': BULK_MAX_MESSAGES,
+            'maxAwaitDurationMs': BULK_MAX_AWAIT_MS
+        }
+    return subscription
+
+SUBSCRIPTIONS = [_subscription('kitchen-orders', '/kitchen-orders')]
+
+def subscriptions():
+    """The topics to tell Dapr we subscribe to"""
+    log.info("📋 Dapr subscription endpoint called, returning: %s", SUBSCRIPTIONS)
+    return SUBSCRIPTIONS
+
+def _parse_order_event(headers, body):
+    """Return ``(order_id, customer_name, items)`` from an order CloudEvent"""
+    event = from_http(headers, body)
+    data = codec.decode(event.data, event.get('datacontenttype'))
+    return data['order_id'], data['customer_name'], data['items']
+
+def _bulk_entry_data(entry):
+    """Return ``(data, trace_carrier)`` for one bulk subscribe entry"""
+    event = entry['event']
+    if isinstance(event, dict) and 'specversion' in event:
+        data = event.get('data')
+        if data is None and 'data_base64' in event:
+            data = base64.b64decode(event['data_base64'])
+        carrier, content_type = event, event.get('datacontenttype')
+    else:
+        data, carrier = event, entry.get('metadata') or {}
+        content_type = entry.get('contentType')
+    return codec.decode(data, content_type), carrier
+
+def _completion_event(order_id, completed_at=None, estimated_ready_at=None):
+    """Payload of an event sent back to order-service on the completion topic.
+
+    Sent with ``estimated_ready_at`` when an order is scheduled and with
+    ``completed_at`` once it is done.
+    """
+    event = {'order_id': order_id}
+    if completed_at is not None:
+        event['completed_at'] = completed_at
+    if estimated_ready_at is not None:
+        event['estimated_ready_at'] = estimated_ready_at
+    return codec.encode(event, PAYLOAD_CONTENT_TYPE)
+
+def _batch_links(batch):
+    """Span links to the delivery trace of every order in a batch"""
+    return [trace.Link(trace.get_current_span(order.payload).get_span_context()) for order in batch.orders]
+
+def prepare_batch(batch):
+    """Cook one batch of identical items for every order in it"""
+    try:
+        # The batch belongs to the trace of its oldest order and links the rest
+        with tracer.start_as_current_span("cook_burgers", context=batch.orders[0].payload,
+                                          links=_batch_links(batch)) as span:
+            if span.is_recording():
+                span.set_attributes({
+                    "batch.item": batch.item,
+                    "batch.size": len(batch.orders),
+                    "batch.order_ids": [order.order_id for order in batch.orders],
+                    "cook.time_seconds": batch.prep_time
+                })
+
+            log.debug("   🍳 Cooking %d x %s (will take %ss)", len(batch.orders), batch.item, batch.prep_time)
+            time.sleep(batch.prep_time)
+            prep_duration.record(batch.prep_time, {"item": batch.item})
+    except Exception as e:
+        log.exception("❌ Kitchen processing error: %s", e)
+
+def complete_order(order):
+    """Publish the completion event for an order whose last item is done"""
+    token = context.attach(order.payload)
+    try:
+        # Publish kitchen completion event back to order-service
+        with tracer.start_as_current_span("publish_kitchen_completed") as span:
+            span.set_attribute("order.id", order.order_id)
+            log.debug("   📤 Publishing kitchen-completed event for order #%s", order.order_id)
+            get_dapr_client().publish_event(
+                pubsub_name="orderpubsub",
+                topic_name="kitchen-completed",
+                data=_completion_event(order.order_id, completed_at=time.time()),
+                data_content_type=PAYLOAD_CONTENT_TYPE
+            )
+
+        log.info("✅ Kitchen completed order #%s", order.order_id)
+
+    except Exception as e:
+        log.exception("❌ Kitchen processing error: %s", e)
+    finally:
+        context.detach(token)
+
+def _publish_estimate(order_id, estimated_ready_at):
+    """Tell order-service when an order should be ready; best effort"""
+    try:
+        get_dapr_client().publish_event(
+            pubsub_name="orderpubsub",
+            topic_name="kitchen-completed",
+            data=_completion_event(order_id, estimated_ready_at=estimated_ready_at),
+            data_content_type=PAYLOAD_CONTENT_TYPE
+        )
+    except Exception as e:
+        log.warning("⚠️ Kitchen ETA for order #%s not published: %s", order_id, e)
+
+def _publish_estimates(estimates):
+    """Tell order-service when orders should be ready; best effort.
+
+    Takes ``[(order_id, estimated_ready_at, ctx)]``. One order's ETA is
+    published under its trace; several go out in one bulk publish.
+    """
+    if len(estimates) == 1:
+        order_id, estimated_ready_at, ctx = estimates[0]
+        token = context.attach(ctx)
+        try:
+            _publish_estimate(order_id, estimated_ready_at)
+        finally:
+            context.detach(token)
+        return
+    bulk_publish = TimedDaprClient._timed("bulk_publish_event", dapr_grpc.bulk_publish)
+    try:
+        failed = bulk_publish(get_dapr_client(), "orderpubsub", "kitchen-completed", [
+            (order_id, _completion_event(order_id, estimated_ready_at=estimated_ready_at))
+            for order_id, estimated_ready_at, _ in estimates
+        ], PAYLOAD_CONTENT_TYPE)
+    except Exception as e:
+        log.warning("⚠️ Kitchen ETAs for %d orders not published: %s", len(estimates), e)
+        return
+    if failed:
+        log.warning("⚠️ Kitchen ETAs for %d orders not published", len(failed))
+
+def _check_order(order_id, items):
+    """True to ack an order this service already took, False while the
+    stations are full, None if it still needs its marker. Raises ValueError
+    for an order without items."""
+    if not items:
+        raise ValueError(f"order {order_id} has no items")
+    if order_id in seen_orders:
+        log.debug("🔁 Kitchen already has order #%s, acking the redelivery", order_id)
+        return True
+    # Check for room first so a full queue does not cost a marker round trip
+    if not _has_room(order_id):
+        return False
+    return None
+
+def _schedule_claimed(ctx, order_id, customer_name, items, duplicate, estimates):
+    """Schedule an order whose marker was claimed, under the delivery's trace.
+
+    A ``duplicate`` (marked by another replica) is only acked. Appends the
+    order's ETA to ``estimates`` and returns whether it was queued; the
+    marker is removed again if it was not.
+    """
+    with tracer.start_as_current_span("handle_kitchen_order", context=ctx) as span:
+        estimated_ready_at = None
+        if not duplicate:
+            try:
+                estimated_ready_at = enqueue_order(order_id, items)
+            except Exception:
+                _release_order(order_id)
+                raise
+            if estimated_ready_at is None:
+                _release_order(order_id)
+        queued = duplicate or estimated_ready_at is not None
+        if queued:
+            seen_orders.add(order_id)
+        if span.is_recording():
+            span.set_attributes({
+                "order.id": order_id,
+                "order.customer_name": customer_name,
+                "order.duplicate": duplicate,
+                "queue.depth": scheduler.queued,
+                "queue.accepted": queued
+            })
+        if estimated_ready_at is not None:
+            estimates.append((order_id, estimated_ready_at, context.get_current()))
+    return queued
+
+def _accept_orders(orders):
+    """Schedule ``[(ctx, order_id, customer_name, items)]`` and publish the ETAs.
+
+    Returns one result per order: True once it is queued (or was already),
+    False if the stations are full, or the exception that kept it out.
+    The markers of the new orders are claimed in one call and their ETAs
+    published in one, so a bulk delivery costs two sidecar round trips
+    rather than two per order.
+    """
+    results, new = [], []
+    for ctx, order_id, customer_name, items in orders:
+        try:
+            results.append(_check_order(order_id, items))
+        except Exception as e:
+            results.append(e)
+        if results[-1] is None:
+            new.append(len(results) - 1)
+
+    # Orders beyond the room left wait for a redelivery without a marker
+    with _schedule:
+        room = max(ORDER_QUEUE_SIZE - scheduler.queued, 0)
+    for i in new[room:]:
+        results[i] = False
+        _record_rejected()
+    new = new[:room]
+
+    duplicates = _claim_orders([orders[i][1] for i in new])
+    estimates = []
+    for i in new:
+        ctx, order_id, customer_name, items = orders[i]
+        try:
+            results[i] = _schedule_claimed(ctx, order_id, customer_name, items, order_id in duplicates, estimates)
+        except Exception as e:
+            results[i] = e
+    if estimates:
+        _publish_estimates(estimates)
+    return results
+
+def _bulk_entry_order(entry):
+    """``(ctx, order_id, customer_name, items)`` of one bulk subscribe entry"""
+    data, carrier = _bulk_entry_data(entry)
+    return propagate.extract(carrier), data['order_id'], data['customer_name'], data['items']
+
+def handle_orders_bulk(payload):
+    """Accept a bulk delivery of burger orders, one status per entry"""
+    entries = (payload or {}).get('entries') or []
+    orders, errors = [], {}
+    for n, entry in enumerate(entries):
+        try:
+            orders.append((n, _bulk_entry_order(entry)))
+        except Exception as e:
+            errors[n] = e
+    results = dict(zip((n for n, _ in orders), _accept_orders([order for _, order in orders])))
+    results.update(errors)
+
+    statuses = []
+    for n, entry in enumerate(entries):
+        result = results[n]
+        if isinstance(result, Exception):
+            log.error("❌ Kitchen bulk entry %s error: %s", entry.get('entryId'), result)
+            status = 'DROP'
+        else:
+            status = 'SUCCESS' if result else 'RETRY'
+        statuses.append({'entryId': entry.get('entryId'), 'status': status})
+    log.debug("📦 Kitchen bulk delivery: %d orders", len(entries))
+    return {'statuses': statuses}
+
+def handle_order(headers, body):
+    """Accept one burger order delivered by pub/sub"""
+    try:
+        # Extract trace context from incoming headers
+        ctx = propagate.extract(headers)
+
+        log.debug("🔍 Received traceparent: %s", headers.get('traceparent'))
+
+        # Parse CloudEvent
+        order_id, customer_name, items = _parse_order_event(headers, body)
+
+        log.debug("🍔 Kitchen received order #%s for %s", order_id, customer_name)
+        log.debug("   Items: %s", items)
+
+        # Use the extracted context for processing
+        queued = _accept_orders([(ctx, order_id, customer_name, items)])[0]
+        if isinstance(queued, Exception):
+            raise queued
+        if not queued:
+            log.warning("⏸️ Kitchen queue full, asking Dapr to retry order #%s", order_id)
+            return {'status': 'RETRY'}, 200
+
+        # Return SUCCESS status for Dapr pub/sub (must be empty body or specific format)
+        return '', 200
+
+    except Exception as e:
+        log.exception("❌ Kitchen error: %s", e)
+        # Return DROP status to indicate we can't process this message
+        return {'status': 'DROP'}, 200
+
+def _sidecar_ready():
+    """Whether the Dapr sidecar answers its outbound health check"""
+    req = urllib.request.Request(f"{get_api_url()}/healthz/outbound")
+    if settings.DAPR_API_TOKEN:
+        req.add_header('dapr-api-token', settings.DAPR_API_TOKEN)
+    try:
+        with urllib.request.urlopen(req, timeout=1):
+            return True
+    except OSError:
+        return False
+
+# /health is liveness: the process answers. /ready is readiness: the sidecar
+# is up too, so a new replica takes traffic as soon as it can serve it.
+def readiness():
+    if not _sidecar_ready():
+        return {'status': 'waiting for the Dapr sidecar'}, 503
+    return {'status': 'ready'}, 200
+
+def queue_snapshot():
+    """Queue and station statistics for the /queue endpoint"""
+    with _schedule:
+        depth, waiting = scheduler.queued, scheduler.waiting_units()
+        backlog = scheduler.backlog(time.monotonic())
+    with _stations_lock:
+        stats = dict(_queue_stats)
+    return {
+        'stations': STATION_COUNT,
+        'batch_size': STATION_BATCH_SIZE,
+        'busy': stats['busy'],
+        'depth': depth,
+        'capacity': ORDER_QUEUE_SIZE,
+        'waiting_items': waiting,
+        'backlog_seconds': round(backlog, 3),
+        'processed': stats['processed'],
+        'rejected': stats['rejected'],
+        'wait_seconds': {
+            'avg': stats['wait_total'] / stats['started'] if stats['started'] else 0.0,
+            'max': stats['wait_max']
+        }
+    }
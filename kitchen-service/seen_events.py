@@ -0,0 +1,56 @@
+"""Bounded memory of recently handled pub/sub events.
+
+Dapr delivers at least once, so an event can come again after a lost ack,
+a sidecar restart or a consumer rebalance. ``SeenEvents`` remembers the
+keys of events handled in the last ``ttl`` seconds, at most ``max_size`` of
+them with the least recently seen evicted first, so a redelivery can be
+acked without doing the work again.
+
+It only knows about this process. A redelivery that lands on another
+replica, or after a restart, has to be caught by something in the state
+store.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class SeenEvents:
+    """Thread-safe LRU of event keys with a time to live"""
+
+    def __init__(self, max_size=10000, ttl=600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # key -> time first handled, oldest use first
+
+    def __contains__(self, key):
+        if key is None:
+            return False
+        with self._lock:
+            handled_at = self._seen.get(key)
+            if handled_at is None:
+                return False
+            if self._clock() - handled_at > self.ttl:
+                del self._seen[key]
+                return False
+            self._seen.move_to_end(key)
+            return True
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, key):
+        """Remember ``key`` as handled; None is ignored"""
+        if key is None:
+            return
+        with self._lock:
+            self._seen.setdefault(key, self._clock())
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
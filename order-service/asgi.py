@@ -0,0 +1,187 @@
+"""Asyncio serving mode for the order service.
+
+Serves the same routes as app.py from Quart. The order logic in orders.py is
+blocking and runs on a thread pool; the board's Server-Sent Events streams
+wait on the event loop instead, so an open browser tab holds no thread.
+That stream is the only reason to serve this module: every other route
+pays a thread hop that app.py does not, so app.py is the default.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, request
+from opentelemetry import context, propagate
+
+import orders
+from order_stream import format_sse
+
+app = Quart(__name__)
+
+# Threads for the order logic, per process; each covers one request waiting
+# on the sidecar, as the threads of the threaded server do
+THREADS = int(os.getenv("GUNICORN_THREADS", "32"))
+
+@app.before_serving
+async def start_threads():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=THREADS))
+    await orders.register_order_actor()
+
+async def _in_thread(fn, *args):
+    """Run ``fn`` on the thread pool under the caller's trace context"""
+    token = context.attach(propagate.extract(request.headers))
+    try:
+        return await asyncio.to_thread(fn, *args)
+    finally:
+        context.detach(token)
+
+@app.before_request
+async def _count_request_start():
+    g.in_flight_route = orders.route_label(request.url_rule)
+    orders.requests_in_flight.add(1, {"route": g.in_flight_route})
+
+@app.teardown_request
+async def _count_request_end(exc=None):
+    route = g.pop('in_flight_route', None)
+    if route is not None:
+        orders.requests_in_flight.add(-1, {"route": route})
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Prometheus scrape endpoint for this process's metrics"""
+    return orders.metrics_response()
+
+@app.route('/ready')
+async def ready():
+    return await _in_thread(orders.readiness)
+
+@app.route('/health')
+async def health():
+    return jsonify({'status': 'healthy'}), 200
+
+@app.route('/')
+async def index():
+    return orders.render_index(live_updates=True)
+
+@app.route('/api/orders', methods=['POST'])
+async def create_order():
+    form = await request.form
+    return await _in_thread(orders.place_order, form.get('customer_name'), form.getlist('items'))
+
+@app.route('/api/orders', methods=['GET'])
+async def get_orders():
+    """The order board, or a page of orders when queried with
+    ``limit``, ``cursor`` and/or ``status``"""
+    if request.args:
+        return await _in_thread(orders.query_orders, request.args)
+    return await _in_thread(orders.board, request.if_none_match)
+
+@app.route('/api/orders/stream', methods=['GET'])
+async def stream_orders():
+    """Server-Sent Events stream of order card updates (htmx sse extension)"""
+    hub = orders.order_hub
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_seq = None
+
+    async def generate():
+        seq = hub.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            missed = hub.events_after(last_seq) if last_seq is not None else None
+            if missed is None:
+                yield format_sse('', event='resync', event_id=seq)
+            else:
+                seq = last_seq
+
+            while True:
+                events = await hub.wait_async(seq, timeout=orders.SSE_KEEPALIVE_SECONDS)
+                if events is None:
+                    seq = hub.last_seq
+                    yield format_sse('', event='resync', event_id=seq)
+                elif not events:
+                    yield ': keepalive\n\n'
+                for seq, event, data in events or ():
+                    yield format_sse(data, event=event, event_id=seq)
+        finally:
+            hub.unsubscribe()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.timeout = None
+    return response
+
+@app.route('/dapr/subscribe', methods=['GET'])
+async def subscribe():
+    """Tell Dapr what topics we want to subscribe to"""
+    return jsonify(orders.subscriptions())
+
+@app.route('/dapr/config', methods=['GET'])
+async def actor_config():
+    """Tell Dapr which actor types we host and when to deactivate them"""
+    return orders.actor_config()
+
+@app.route('/actors/<actor_type>/<actor_id>', methods=['DELETE'])
+async def deactivate_actor(actor_type, actor_id):
+    """Called by Dapr for actors that have been idle too long"""
+    return await orders.deactivate_actor(actor_type, actor_id)
+
+@app.route('/actors/<actor_type>/<actor_id>/method/<method>', methods=['PUT'])
+async def invoke_actor_method(actor_type, actor_id, method):
+    """Run one actor call; Dapr sends each actor one call at a time"""
+    return await orders.invoke_actor_method(
+        actor_type, actor_id, method, await request.get_data(), request.headers.get('Dapr-Reentrancy-Id')
+    )
+
+@app.route('/kitchen-completed', methods=['POST'])
+async def handle_kitchen_completed():
+    """Handle kitchen completion events"""
+    return await _in_thread(orders.handle_completion, 'kitchen', request.headers, await request.get_data())
+
+@app.route('/bar-completed', methods=['POST'])
+async def handle_bar_completed():
+    """Handle bar completion events"""
+    return await _in_thread(orders.handle_completion, 'bar', request.headers, await request.get_data())
+
+@app.route('/kitchen-progress', methods=['POST'])
+async def handle_kitchen_progress():
+    """Handle kitchen per-item progress events"""
+    return await _in_thread(orders.handle_progress, 'kitchen', request.headers, await request.get_data())
+
+@app.route('/bar-progress', methods=['POST'])
+async def handle_bar_progress():
+    """Handle bar per-item progress events"""
+    return await _in_thread(orders.handle_progress, 'bar', request.headers, await request.get_data())
+
+@app.route('/kitchen-completed-bulk', methods=['POST'])
+async def handle_kitchen_completed_bulk():
+    """Handle a batch of kitchen completion events"""
+    payload = await request.get_json(force=True, silent=True)
+    return await _in_thread(orders.handle_completions_bulk, 'kitchen', payload)
+
+@app.route('/bar-completed-bulk', methods=['POST'])
+async def handle_bar_completed_bulk():
+    """Handle a batch of bar completion events"""
+    payload = await request.get_json(force=True, silent=True)
+    return await _in_thread(orders.handle_completions_bulk, 'bar', payload)
+
+@app.route('/kitchen-progress-bulk', methods=['POST'])
+async def handle_kitchen_progress_bulk():
+    """Handle a batch of kitchen progress events"""
+    payload = await request.get_json(force=True, silent=True)
+    return await _in_thread(orders.handle_progress_bulk, 'kitchen', payload)
+
+@app.route('/bar-progress-bulk', methods=['POST'])
+async def handle_bar_progress_bulk():
+    """Handle a batch of bar progress events"""
+    payload = await request.get_json(force=True, silent=True)
+    return await _in_thread(orders.handle_progress_bulk, 'bar', payload)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5001")))
@@ -0,0 +1,73 @@
+"""Coalescing of kitchen and bar completion events.
+
+Completions that arrive within a short window are handed to one flush call
+as a batch grouped by order, so the kitchen and bar halves of the same order
+are merged in memory before anything is written, and the whole batch can be
+read and written with one round trip each.
+
+Each ``submit`` returns a future for that completion's outcome, so pub/sub
+handlers can still answer Dapr per event.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class CompletionBatcher:
+    """Collect ``(service_type, update)`` per order for ``window`` seconds.
+
+    ``update`` is whatever the station reported, e.g. a completion time or
+    an estimate. ``flush`` is called from a timer thread with a dict of
+    order ID to a list of ``(service_type, update)`` plus the ``link``
+    values passed to ``submit`` (e.g. span contexts), and returns a dict of
+    order ID to True (written) or False (retry later).
+    """
+
+    def __init__(self, flush, window=0.02):
+        self._flush = flush
+        self._window = window
+        self._lock = threading.Lock()
+        self._pending = {}  # order ID -> [(service_type, update, future)]
+        self._links = []
+
+    def submit(self, order_id, service_type, update, link=None):
+        future = Future()
+        with self._lock:
+            first = not self._pending
+            self._pending.setdefault(order_id, []).append((service_type, update, future))
+            if link is not None:
+                self._links.append(link)
+        if first:
+            timer = threading.Timer(self._window, self._run)
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def _take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            links, self._links = self._links, []
+        batch = {
+            order_id: [(service_type, update) for service_type, update, _ in entries]
+            for order_id, entries in pending.items()
+        }
+        return pending, batch, links
+
+    @staticmethod
+    def _resolve(pending, results, error=None):
+        for order_id, entries in pending.items():
+            for _, _, future in entries:
+                if future.done():  # cancelled by a disconnected caller
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results.get(order_id, False))
+
+    def _run(self):
+        pending, batch, links = self._take()
+        try:
+            results = self._flush(batch, links)
+        except Exception as e:
+            self._resolve(pending, None, e)
+        else:
+            self._resolve(pending, results)
@@ -0,0 +1,46 @@
+"""Gunicorn settings for running the order service in production.
+
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+The Procfile serves the threaded app.py. asgi.py is only for serving the
+board's live stream, and is slower for everything else.
+
+Worker and thread counts come from the environment. The app is preloaded
+in the master so workers fork with the code already imported, and
+OpenTelemetry is set up in each worker after the fork.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# One process per core; threads cover the waits on the sidecar (asgi.py
+# sizes its own thread pool from GUNICORN_THREADS too)
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "10"))
+keepalive = 5
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")
+
+# Applied before the app is preloaded, so orders.py skips its import-time setup
+raw_env = ["OTEL_INIT_AFTER_FORK=1"]
+
+
+def post_fork(server, worker):
+    import orders
+    orders.init_telemetry()
+
+
+def worker_exit(server, worker):
+    """Flush buffered spans within the graceful timeout and close the sidecar channel"""
+    import orders
+    from opentelemetry import trace
+    orders.close_dapr_client()
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "force_flush"):
+        provider.force_flush(timeout_millis=graceful_timeout * 500)
@@ -0,0 +1,74 @@
+"""Append-only archive of finished orders, for offline analysis.
+
+Orders are queued in memory as they become ready and written out by a
+background thread every ``interval`` seconds, each batch as one gzip member
+of JSON lines appended to the archive file. Concatenated gzip members read
+back as a single stream, so the whole file works with ``gzip.open``,
+``zcat`` or ``pandas.read_json(path, lines=True)``::
+
+    zcat orders-archive.jsonl.gz | jq -s 'group_by(.customer_name) | map({(.[0].customer_name): length}) | add'
+
+Each batch goes to the file in one ``write`` on a descriptor opened with
+``O_APPEND``, so the gunicorn workers of one host can share an archive
+without interleaving their batches.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+
+
+class OrderArchive:
+    """Queue finished orders and append them to ``path`` in batches.
+
+    ``on_error`` is called with the exception when a batch could not be
+    written; the batch stays queued for the next attempt.
+    """
+
+    def __init__(self, path, interval=5.0, on_error=None):
+        self.path = path
+        self.interval = interval
+        self.archived = 0
+        self._on_error = on_error
+        self._lock = threading.Lock()
+        self._queued = []
+        self._thread = None
+
+    def add(self, order):
+        with self._lock:
+            self._queued.append(order)
+            if self._thread is None:
+                # Started on first use, so pre-fork servers start it in each worker
+                self._thread = threading.Thread(target=self._run, name="order-archive", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write everything queued so far; returns how many orders were written"""
+        with self._lock:
+            batch, self._queued = self._queued, []
+        if not batch:
+            return 0
+        lines = ''.join(json.dumps(order, separators=(',', ':')) + '\n' for order in batch)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, gzip.compress(lines.encode('utf-8')))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            with self._lock:
+                self._queued[:0] = batch
+            raise
+        self.archived += len(batch)
+        return len(batch)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                if self._on_error is not None:
+                    self._on_error(e)
@@ -0,0 +1,303 @@
+"""Recent-orders index kept in the Dapr state store.
+
+Each new order is appended to one of a fixed number of small shard keys,
+picked at random, with an ETag-guarded write. Concurrent placements only
+contend when they land on the same shard, and the loser of a race retries on
+another shard instead of overwriting the winner. When a shard's head fills
+up its entries are sealed into an immutable numbered page and the head
+starts over, so no key grows without bound however many orders there are::
+
+    order-index-{shard}       {"entries": [[created_at, order_id], ...], "pages": n, "older_max": entry}
+    order-index-{shard}-{k}   {"entries": [...], "older_max": entry}   sealed page k, 0 <= k < n
+
+``older_max`` is the newest entry in the pages before it, so a reader knows
+exactly when older pages can still matter even though entries written by
+different processes are only roughly in time order.
+
+Within a process, appends are group-committed: whichever request gets to
+the writer first writes every entry queued so far in one shard update, so a
+burst costs a few writes rather than one contended write per order.
+
+Reads merge the newest entries of every shard, following older pages only
+as far as needed. The same layout under ``order-index-{name}-...`` keys
+backs secondary indexes such as the ready orders.
+
+Orders still in progress (pending or preparing) are kept apart in a small
+mutable set, ``order-open-{shard}``, sharded by order ID so an update knows
+which key to change. It stays small because orders leave it once ready.
+
+This module holds the layout, batching and merge logic; orders.py makes the
+state store calls.
+"""
+import base64
+import json
+import random
+import threading
+import zlib
+from concurrent.futures import Future
+
+
+def head_key(shard, index=None):
+    return f"order-index-{shard}" if index is None else f"order-index-{index}-{shard}"
+
+
+def page_key(shard, page, index=None):
+    return f"{head_key(shard, index)}-{page}"
+
+
+def pick_shard(shards):
+    return random.randrange(shards)
+
+
+def append(head_data, entries, page_size):
+    """Add ``(created_at, order_id)`` entries to a shard head.
+
+    Returns ``(head, sealed)``: the head JSON to write back, and ``(page,
+    data)`` to write first when the head was already full, otherwise None.
+    Only the head's own entries are sealed, so a given full head always
+    seals to the same page and content and writers racing to seal it
+    cannot disagree.
+    """
+    head = json.loads(head_data) if head_data else {'entries': [], 'pages': 0, 'older_max': None}
+    sealed = None
+    if len(head['entries']) >= page_size:
+        sealed = head['pages'], json.dumps({'entries': head['entries'], 'older_max': head['older_max']})
+        head = {
+            'entries': [],
+            'pages': head['pages'] + 1,
+            'older_max': max(head['entries'] + ([head['older_max']] if head['older_max'] else []))
+        }
+    head['entries'].extend(list(entry) for entry in entries)
+    return json.dumps(head), sealed
+
+
+class GroupCommit:
+    """Batch concurrent index appends into single writes.
+
+    ``write`` takes a list of entries and stores them all, or raises.
+    ``append`` blocks until the caller's entry has been written, by this
+    thread or by another that took it along in its batch.
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._writer = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = []  # (entry, future)
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return batch
+
+    @staticmethod
+    def _resolve(batch, error=None):
+        for _, future in batch:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    def append(self, entry):
+        future = Future()
+        with self._lock:
+            self._pending.append((entry, future))
+        with self._writer:
+            batch = self._take() if not future.done() else []
+            if batch:
+                try:
+                    self._write([entry for entry, _ in batch])
+                except Exception as e:
+                    self._resolve(batch, e)
+                else:
+                    self._resolve(batch)
+        return future.result()
+
+
+def encode_cursor(entry, resume=None):
+    """Opaque paging cursor for "entries older than this one".
+
+    ``resume`` is ``RecentReader``'s per-shard position, so the next page
+    starts reading where this one stopped instead of at the shard heads.
+    """
+    cursor = list(entry) + ([resume] if resume is not None else [])
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``: ``(entry, resume)``, ``resume`` None if
+    the cursor has none; raises ValueError for a malformed cursor"""
+    try:
+        created_at, order_id, *rest = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        resume = rest[0] if rest else None
+        if resume is not None:
+            resume = [
+                None if position is None else (int(position[0]), bool(position[1]))
+                for position in resume
+            ]
+    except Exception:
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return (str(created_at), str(order_id)), resume
+
+
+class RecentReader:
+    """Finds the newest ``limit`` entries older than a cursor across shards.
+
+    Drive it with the state reads of your choice::
+
+        reader = RecentReader(shards, limit, start)
+        keys = reader.first_keys()
+        while keys:
+            reader.add({key: data, ...})  # one bulk read of ``keys``
+            keys = reader.next_keys()
+        order_ids, cursor = reader.result()
+
+    ``start`` is a decoded cursor from an earlier result, or None for the
+    newest entries; ``cursor`` is None once there is nothing older left.
+
+    The cursor records, per shard, the newest page that still holds entries
+    older than the last one returned: ``(page, head)``, where ``head`` says
+    the page was still the shard head when read, or None once the shard is
+    used up. Pages above it only hold entries already returned, and sealed
+    pages never change, so the next page of results starts there instead of
+    walking down from the heads again. Entries are only roughly in time
+    order across a shard's pages, so the page with the last entry returned
+    is usually read again.
+    """
+
+    def __init__(self, shards, limit, start=None, index=None):
+        before, resume = start or (None, None)
+        if resume is not None and len(resume) != shards:
+            resume = None  # written before a change in the number of shards
+        self.limit = limit
+        self.before = tuple(before) if before else None
+        self.index = index
+        self._shards = shards
+        self._resume = resume
+        self._keys = {}  # requested key -> (shard, page number or None for the head)
+        self._read = {shard: [] for shard in range(shards)}  # [(page, head, entries)] read
+        self._next_page = {shard: -1 for shard in range(shards)}
+        self._older_max = {shard: None for shard in range(shards)}
+
+    def first_keys(self):
+        self._keys = {}
+        for shard in range(self._shards):
+            position = self._resume[shard] if self._resume else (None, True)
+            if position is None:
+                continue
+            page, head = position
+            if head:
+                self._keys[head_key(shard, self.index)] = (shard, None)
+            if page is not None:
+                # A head read before may have been sealed into this page since
+                self._keys[page_key(shard, page, self.index)] = (shard, page)
+        return list(self._keys)
+
+    def add(self, raw):
+        """Take ``{key: data}`` for the keys last requested; missing keys are empty"""
+        # Deeper pages last, so each shard ends up with the deepest page's older_max
+        for key, (shard, page) in sorted(self._keys.items(), key=lambda item: item[1][1] is not None):
+            data = raw.get(key)
+            if not data and page is not None:
+                # A head not sealed yet, or an expired page; pages older
+                # than an expired one expired before it
+                if not self._read[shard] or page <= self._next_page[shard]:
+                    self._next_page[shard] = -1
+                continue
+            doc = json.loads(data) if data else {}
+            head = page is None
+            if head:
+                page = doc.get('pages', 0)
+            if self._read[shard]:
+                self._next_page[shard] = min(self._next_page[shard], page - 1)
+            else:
+                self._next_page[shard] = page - 1
+            entries = [tuple(entry) for entry in doc.get('entries', ())]
+            self._read[shard].append((page, head, entries))
+            older_max = doc.get('older_max')
+            self._older_max[shard] = tuple(older_max) if older_max else None
+
+    def _candidates(self):
+        entries = [
+            entry for shard_reads in self._read.values() for _, _, page_entries in shard_reads
+            for entry in page_entries
+            if self.before is None or entry < self.before
+        ]
+        entries.sort(reverse=True)
+        return entries
+
+    def next_keys(self):
+        """Older pages that could still hold one of the newest ``limit`` entries"""
+        candidates = self._candidates()
+        cutoff = candidates[self.limit - 1] if len(candidates) >= self.limit else None
+        self._keys = {}
+        for shard, page in self._next_page.items():
+            older_max = self._older_max[shard]
+            if page >= 0 and older_max and (cutoff is None or older_max > cutoff):
+                self._keys[page_key(shard, page, self.index)] = (shard, page)
+        return list(self._keys)
+
+    def _resume_at(self, shard, last):
+        """Where the next page of results starts reading ``shard``"""
+        left = [(page, head) for page, head, entries in self._read[shard] if any(entry < last for entry in entries)]
+        if left:
+            return max(left)
+        if self._next_page[shard] >= 0:
+            return self._next_page[shard], False
+        return None
+
+    def result(self):
+        candidates = self._candidates()
+        page = candidates[:self.limit]
+        more = len(candidates) > self.limit or any(p >= 0 for p in self._next_page.values())
+        if not (page and more):
+            return [order_id for _, order_id in page], None
+        resume = [self._resume_at(shard, page[-1]) for shard in range(self._shards)]
+        return [order_id for _, order_id in page], encode_cursor(page[-1], resume)
+
+
+def open_key(shard):
+    return f"order-open-{shard}"
+
+
+def open_shard(order_id, shards):
+    return zlib.crc32(order_id.encode('utf-8')) % shards
+
+
+def update_open(data, changes):
+    """Apply ``{order_id: (created_at, status) or None}`` to an open-orders shard.
+
+    None removes the order. Returns the shard JSON to write back.
+    """
+    orders = json.loads(data) if data else {}
+    for order_id, change in changes.items():
+        if change is None:
+            orders.pop(order_id, None)
+        else:
+            orders[order_id] = list(change)
+    return json.dumps(orders)
+
+
+def count_open(shards_data):
+    """Number of orders in progress, from the raw data of every open-orders shard"""
+    return sum(len(json.loads(data)) for data in shards_data if data)
+
+
+def select_open(shards_data, status, limit, before=None):
+    """Newest ``limit`` open orders with ``status``, older than ``before``.
+
+    Takes the raw data of every open-orders shard and returns
+    ``(order_ids, cursor)`` like ``RecentReader.result``.
+    """
+    before = tuple(before) if before else None
+    entries = sorted((
+        (created_at, order_id)
+        for data in shards_data if data
+        for order_id, (created_at, order_status) in json.loads(data).items()
+        if order_status == status and (before is None or (created_at, order_id) < before)
+    ), reverse=True)
+    page = entries[:limit]
+    cursor = encode_cursor(page[-1]) if len(entries) > limit else None
+    return [order_id for _, order_id in page], cursor
@@ -0,0 +1,107 @@
+"""Fan-out of order board updates to Server-Sent Events streams.
+
+All subscribers share one bounded ring buffer of events instead of holding a
+queue each, so publishing costs the same with one viewer or thousands, and an
+idle viewer is just a sequence number.
+
+Streams are served from an event loop: ``wait_async`` needs one
+cross-thread wakeup per loop per event rather than one per connection.
+Events are published from any thread.
+"""
+import asyncio
+import threading
+from collections import deque
+
+
+class OrderEventHub:
+    """Broadcast buffer of ``(seq, event, data)`` tuples.
+
+    Subscribers remember the last sequence number they saw and wait for
+    anything newer. A subscriber that falls further behind than the buffer
+    holds is told to resync (re-fetch the whole board) instead.
+    """
+
+    def __init__(self, buffer_size=256):
+        self._events = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop_events = {}  # event loop -> asyncio.Event for the next publish
+        self.subscribers = 0
+
+    def subscribe(self):
+        with self._lock:
+            self.subscribers += 1
+            return self._seq
+
+    def unsubscribe(self):
+        with self._lock:
+            self.subscribers -= 1
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, event, data):
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, event, data))
+            loops = list(self._loop_events)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:
+                # Loop already closed
+                with self._lock:
+                    self._loop_events.pop(loop, None)
+
+    def _wake_loop(self, loop):
+        """Release every coroutine waiting on ``loop`` (runs on that loop)"""
+        with self._lock:
+            waiters = self._loop_events.pop(loop, None)
+        if waiters is not None:
+            waiters.set()
+
+    def events_after(self, seq):
+        """Return the events newer than ``seq``, or None if some were dropped"""
+        with self._lock:
+            return self._events_after(seq)
+
+    async def wait_async(self, seq, timeout):
+        """Wait until there are events newer than ``seq`` or ``timeout`` passes.
+
+        Returns the new events (possibly empty on timeout), or None when the
+        subscriber has missed events and needs to resync.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._seq != seq:
+                return self._events_after(seq)
+            waiters = self._loop_events.get(loop)
+            if waiters is None:
+                waiters = self._loop_events[loop] = asyncio.Event()
+        try:
+            await asyncio.wait_for(waiters.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.events_after(seq)
+
+    def _events_after(self, seq):
+        if seq > self._seq:
+            # Sequence from a previous process, e.g. a Last-Event-ID after a restart
+            return None
+        if seq == self._seq:
+            return []
+        if not self._events or self._events[0][0] > seq + 1:
+            return None
+        return [e for e in self._events if e[0] > seq]
+
+
+def format_sse(data, event=None, event_id=None):
+    """Encode one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
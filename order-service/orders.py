@@ -0,0 +1,1656 @@
+"""The order service: taking orders, the order board and order queries, and
+applying the kitchen's and bar's events to the orders.
+
+Shared by both ways of serving it: app.py (Flask) and asgi.py (Quart, which
+runs these functions on a thread pool). The request handlers at the end
+take the parsed request and return what the route should, a body or
+``(body, status, headers)``.
+"""
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import escape
+from dapr.actor import Actor, ActorInterface, ActorRuntime, actormethod
+from dapr.actor.runtime.config import ActorRuntimeConfig
+from dapr.clients import DaprClient
+from dapr.clients.exceptions import DaprGrpcError
+from dapr.clients.grpc._request import TransactionalStateOperation
+from dapr.clients.grpc._state import Concurrency, StateOptions
+from dapr.clients.http.helpers import get_api_url
+from dapr.conf import settings
+from dapr.serializers import DefaultJSONSerializer, Serializer
+from cloudevents.http import from_http
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import atexit
+import base64
+import copy
+import grpc
+import hashlib
+import json
+import logging
+import math
+import queue
+import random
+import threading
+import urllib.request
+import time
+import uuid
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urlencode
+import os
+import sys
+
+import codec
+import dapr_grpc
+import order_index
+from completion_batch import CompletionBatcher
+from order_archive import OrderArchive
+from order_stream import OrderEventHub
+from publish_batch import PublishBatcher
+from seen_events import SeenEvents
+
+# OpenTelemetry API. Spans and metrics recorded through it are no-ops until
+# init_telemetry installs the SDK.
+from opentelemetry import context, metrics, trace, propagate
+from opentelemetry.propagate import set_global_textmap
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+# Configure OpenTelemetry
+SERVICE_NAME = os.getenv("SERVICE_NAME", "order-service")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317")
+
+# OTEL_SDK_DISABLED=true, the standard OpenTelemetry switch, turns telemetry
+# off altogether: the SDK, the exporter and the instrumentation are not even
+# imported, which takes a good part off a cold start
+TELEMETRY_ENABLED = os.getenv("OTEL_SDK_DISABLED", "").lower() != "true"
+if TELEMETRY_ENABLED:
+    from opentelemetry.sdk.metrics import Histogram, MeterProvider
+    from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.exporter.prometheus import PrometheusMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+    from opentelemetry.instrumentation.grpc import GrpcInstrumentorClient
+
+# Pre-fork servers set this so the exporter is only created in the workers
+OTEL_INIT_AFTER_FORK = os.getenv("OTEL_INIT_AFTER_FORK", "").lower() in ("1", "true")
+
+# Share of new traces to record. Requests that arrive with a trace context
+# follow the caller's sampling decision instead.
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Histogram buckets in seconds, from sub-millisecond sidecar calls to slow orders
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class BackgroundLogHandler(QueueHandler):
+    """Queue log records for a writer thread so requests never wait on stdout.
+
+    The thread is started by the first record a process logs, so forked
+    workers get their own.
+    """
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self._target = target
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._listener = QueueListener(self.queue, self._target)
+                    self._listener.start()
+                    self._pid = os.getpid()
+        super().enqueue(record)
+
+    def close(self):
+        """Write out what is still queued; runs at interpreter exit"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+log = logging.getLogger(SERVICE_NAME)
+log.setLevel(LOG_LEVEL)
+log.propagate = False
+log.addHandler(BackgroundLogHandler(logging.StreamHandler(sys.stdout)))
+
+tracer = trace.get_tracer(__name__)
+
+# Set W3C Trace Context propagator (used by Dapr)
+set_global_textmap(TraceContextTextMapPropagator())
+
+def init_telemetry():
+    """Install the tracer provider and OTLP exporter for this process.
+
+    The batch processor runs a background thread and the exporter holds a
+    gRPC channel, neither of which survives a fork, so pre-fork servers call
+    this from each worker instead of at import. Does nothing with
+    OTEL_SDK_DISABLED.
+    """
+    if not TELEMETRY_ENABLED:
+        return
+    resource = Resource(attributes={
+        "service.name": SERVICE_NAME,
+        "service.version": "1.0.0",
+        "deployment.environment": "development"
+    })
+
+    sampler = ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO))
+    trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
+
+    # Configure OTLP exporter
+    otlp_exporter = OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT, insecure=True)
+    span_processor = BatchSpanProcessor(otlp_exporter)
+    trace.get_tracer_provider().add_span_processor(span_processor)
+
+    # Metrics stay in this process and are scraped from /metrics
+    metrics.set_meter_provider(MeterProvider(
+        resource=resource,
+        metric_readers=[PrometheusMetricReader()],
+        views=[View(instrument_type=Histogram, aggregation=ExplicitBucketHistogramAggregation(LATENCY_BUCKETS))]
+    ))
+
+    log.info("🔍 OpenTelemetry initialized for %s (pid %d), exporting to %s, sampling %s of new traces",
+             SERVICE_NAME, os.getpid(), OTEL_EXPORTER_OTLP_ENDPOINT, TRACE_SAMPLE_RATIO)
+
+if not OTEL_INIT_AFTER_FORK:
+    init_telemetry()
+
+# Instrument requests and gRPC (for Dapr client SDK); app.py instruments Flask
+if TELEMETRY_ENABLED:
+    RequestsInstrumentor().instrument()
+    GrpcInstrumentorClient().instrument()
+
+# Metrics. Instruments are created at import and start recording once
+# init_telemetry has installed the meter provider in this process.
+meter = metrics.get_meter(__name__)
+sidecar_call_duration = meter.create_histogram(
+    "dapr.call.duration", unit="s", description="Latency of calls to the Dapr sidecar, by operation"
+)
+requests_in_flight = meter.create_up_down_counter(
+    "handler.requests.in_flight", unit="{request}", description="Requests being handled, by route"
+)
+orders_placed = meter.create_counter(
+    "orders.placed", unit="{order}", description="Orders accepted by POST /api/orders"
+)
+orders_turned_away = meter.create_counter(
+    "orders.turned_away", unit="{order}", description="Orders refused by admission control, by reason"
+)
+order_station_duration = meter.create_histogram(
+    "order.station.duration", unit="s", description="Time from placing an order to a station completing it, by station"
+)
+order_ready_duration = meter.create_histogram(
+    "order.ready.duration", unit="s", description="Time from placing an order to all of it being ready"
+)
+
+def route_label(rule):
+    """The ``route`` label of ``requests_in_flight`` for a matched URL rule"""
+    return rule.rule if rule is not None else "unmatched"
+
+def metrics_response():
+    """This process's metrics in the Prometheus text format"""
+    return generate_latest(REGISTRY), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+class TimedDaprClient:
+    """Wraps a Dapr client to time every sidecar call"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name == 'close' or not callable(attr):
+            return attr
+        timed = self._timed(name, attr)
+        setattr(self, name, timed)
+        return timed
+
+    @staticmethod
+    def _timed(name, call):
+        def record(start, outcome):
+            sidecar_call_duration.record(time.perf_counter() - start, {"operation": name, "outcome": outcome})
+
+        def timed(*args, **kwargs):
+            start, outcome = time.perf_counter(), "error"
+            try:
+                result = call(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                record(start, outcome)
+        return timed
+
+DAPR_STORE_NAME = "statestore"
+PUBSUB_NAME = "orderpubsub"
+STATE_READ_PARALLELISM = int(os.getenv("STATE_READ_PARALLELISM", "10"))
+
+# Read-your-write retries when a completion arrives before its order is visible
+ORDER_READ_RETRIES = int(os.getenv("ORDER_READ_RETRIES", "4"))
+ORDER_READ_RETRY_DELAY = float(os.getenv("ORDER_READ_RETRY_DELAY", "0.025"))
+
+# Recent-orders index: shard count, entries per index page, retries of an
+# append that lost an ETag race, and how many orders the board shows
+ORDER_INDEX_SHARDS = int(os.getenv("ORDER_INDEX_SHARDS", "16"))
+ORDER_INDEX_PAGE_SIZE = int(os.getenv("ORDER_INDEX_PAGE_SIZE", "100"))
+ORDER_INDEX_WRITE_RETRIES = int(os.getenv("ORDER_INDEX_WRITE_RETRIES", "12"))
+BOARD_SIZE = int(os.getenv("BOARD_SIZE", "10"))
+
+# Finished orders are written with a ttlInSeconds of ORDER_RETENTION_SECONDS,
+# so they stay on the board and in queries that long and then leave the
+# state store, as do sealed pages of the ready index. 0 keeps them forever.
+# Sealed pages of the main index can still list open orders, so they are
+# kept ORDER_INDEX_RETENTION_FACTOR times as long; an order still open by
+# then has been abandoned.
+# With ORDER_ARCHIVE_PATH set they are also appended to that gzipped JSON
+# lines file, every ORDER_ARCHIVE_INTERVAL seconds, as they become ready.
+ORDER_RETENTION_SECONDS = int(os.getenv("ORDER_RETENTION_SECONDS", "0"))
+RETENTION_METADATA = {'ttlInSeconds': str(ORDER_RETENTION_SECONDS)} if ORDER_RETENTION_SECONDS > 0 else {}
+ORDER_INDEX_RETENTION_FACTOR = int(os.getenv("ORDER_INDEX_RETENTION_FACTOR", "10"))
+INDEX_RETENTION_METADATA = (
+    {'ttlInSeconds': str(ORDER_RETENTION_SECONDS * ORDER_INDEX_RETENTION_FACTOR)} if ORDER_RETENTION_SECONDS > 0 else {}
+)
+ORDER_ARCHIVE_PATH = os.getenv("ORDER_ARCHIVE_PATH", "")
+ORDER_ARCHIVE_INTERVAL = float(os.getenv("ORDER_ARCHIVE_INTERVAL", "5"))
+
+# Filtered order queries (GET /api/orders?status=&limit=&cursor=)
+ORDER_STATUSES = ('pending', 'preparing', 'ready')
+ORDER_QUERY_MAX_LIMIT = int(os.getenv("ORDER_QUERY_MAX_LIMIT", "100"))
+
+# Completions arriving within this window are read and written as one batch
+COMPLETION_BATCH_WINDOW = float(os.getenv("COMPLETION_BATCH_WINDOW_MS", "20")) / 1000
+
+# Dapr delivers at least once. Station events applied in the last
+# DEDUP_TTL_SECONDS (up to DEDUP_CACHE_SIZE of them) are acked again by
+# CloudEvent ID without touching state. Redeliveries this process has not
+# seen are caught by the order itself: an update that changes nothing is
+# not written.
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", "600"))
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+seen_events = SeenEvents(DEDUP_CACHE_SIZE, DEDUP_TTL_SECONDS)
+
+# How orders are stored and events published: "json", or "msgpack" for a
+# compact binary form. Either can be read back whatever this is set to.
+PAYLOAD_CONTENT_TYPE = codec.content_type(os.getenv("PAYLOAD_ENCODING", "json"))
+
+def _encode(value):
+    return codec.encode(value, PAYLOAD_CONTENT_TYPE)
+
+def _event_data(event):
+    """The payload of a CloudEvent, in whichever encoding it was published"""
+    return codec.decode(event.data, event.get('datacontenttype'))
+
+def _trace_headers():
+    """Inject the current trace context into each Dapr HTTP request"""
+    headers = {}
+    propagate.inject(headers)
+    return headers
+
+# One gRPC channel to the sidecar per process, created on first use. gRPC
+# calls get the current trace context from the instrumented channel.
+_dapr_client = None
+_dapr_client_lock = threading.Lock()
+
+def get_dapr_client():
+    """Return the process-wide Dapr client"""
+    global _dapr_client
+    if _dapr_client is None:
+        with _dapr_client_lock:
+            if _dapr_client is None:
+                _dapr_client = TimedDaprClient(DaprClient(headers_callback=_trace_headers))
+    return _dapr_client
+
+@atexit.register
+def close_dapr_client():
+    """Close the sidecar channel on shutdown"""
+    global _dapr_client
+    with _dapr_client_lock:
+        if _dapr_client is not None:
+            _dapr_client.close()
+            _dapr_client = None
+
+# Flipped off the first time the sidecar rejects a bulk get or a state
+# transaction as unimplemented
+_bulk_get_supported = True
+_state_transactions_supported = True
+
+# Rendered order board cache. Local writes bump the generation so the next
+# poll rebuilds straight away; the TTL bounds staleness for changes made by
+# other replicas.
+BOARD_CACHE_TTL = float(os.getenv("BOARD_CACHE_TTL", "2"))
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "256"))
+_board_lock = threading.Lock()
+_board_generation = 0
+_board_cache = None  # (generation, built_at, html, etag)
+_card_cache = OrderedDict()  # (order_id, version) -> rendered card
+
+# Live board updates pushed over Server-Sent Events. The stream is served by
+# asgi.py only: in app.py every open stream would hold a server thread, so
+# the board it serves polls instead.
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+order_hub = OrderEventHub(buffer_size=int(os.getenv("SSE_BUFFER_SIZE", "256")))
+
+def _sidecar_ready():
+    """Whether the Dapr sidecar answers its outbound health check"""
+    req = urllib.request.Request(f"{get_api_url()}/healthz/outbound")
+    if settings.DAPR_API_TOKEN:
+        req.add_header('dapr-api-token', settings.DAPR_API_TOKEN)
+    try:
+        with urllib.request.urlopen(req, timeout=1):
+            return True
+    except OSError:
+        return False
+
+# /health is liveness: the process answers. /ready is readiness: the sidecar
+# is up too, so a new replica takes traffic as soon as it can serve it.
+def readiness():
+    if not _sidecar_ready():
+        return {'status': 'waiting for the Dapr sidecar'}, 503
+    return {'status': 'ready'}, 200
+
+# Pages and cards are rendered outside any Flask or Quart request too (cards
+# from the completion batch thread), so with an environment of their own
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=True
+)
+
+def render_index(live_updates):
+    """The order page; ``live_updates`` connects its board to the event stream"""
+    return templates.get_template('index.html').render(live_updates=live_updates)
+
+BEERS = ['Lager', 'IPA', 'Stout', 'Wheat Beer']
+
+def _new_order(customer_name, items):
+    """Build a new order record, splitting the items into food and drinks"""
+    return {
+        'order_id': str(uuid.uuid4())[:8],
+        'customer_name': customer_name,
+        'burgers': [item for item in items if 'Burger' in item],
+        'beers': [item for item in items if item in BEERS],
+        'status': 'pending',
+        'created_at': datetime.now().isoformat()
+    }
+
+def _station_events(order):
+    """Return the ``(topic, event)`` pairs an order fans out to"""
+    events = []
+    for topic, field in (("kitchen-orders", 'burgers'), ("bar-orders", 'beers')):
+        if order[field]:
+            events.append((topic, {
+                'order_id': order['order_id'],
+                'customer_name': order['customer_name'],
+                'items': order[field]
+            }))
+    return events
+
+def _write_index_entries(entries, index=None):
+    """Append entries to one shard of the recent-orders index, or of the
+    named secondary index.
+
+    The shard head is written back only if it is unchanged since it was
+    read (or still absent); losing that race moves on to another random
+    shard, so concurrent writers never drop each other's entries.
+    """
+    client = get_dapr_client()
+    for attempt in range(ORDER_INDEX_WRITE_RETRIES):
+        shard = order_index.pick_shard(ORDER_INDEX_SHARDS)
+        key = order_index.head_key(shard, index)
+        result = client.get_state(store_name=DAPR_STORE_NAME, key=key)
+        head, sealed = order_index.append(result.data, entries, ORDER_INDEX_PAGE_SIZE)
+        if sealed:
+            # The ready index holds finished orders alone; main index pages
+            # can still list open ones, so they are kept longer
+            client.save_state(
+                store_name=DAPR_STORE_NAME,
+                key=order_index.page_key(shard, sealed[0], index),
+                value=sealed[1],
+                state_metadata=RETENTION_METADATA if index == 'ready' else INDEX_RETENTION_METADATA
+            )
+        try:
+            client.save_state(
+                store_name=DAPR_STORE_NAME,
+                key=key,
+                value=head,
+                etag=result.etag or None,
+                options=StateOptions(concurrency=Concurrency.first_write)
+            )
+            return
+        except DaprGrpcError:
+            time.sleep(random.uniform(0, ORDER_READ_RETRY_DELAY))
+    raise RuntimeError(f"could not update the order index after {ORDER_INDEX_WRITE_RETRIES} attempts")
+
+def _update_open_orders(changes):
+    """Apply ``{order_id: (created_at, status) or None}`` to the open orders.
+
+    Each affected shard is rewritten guarded by the ETag it was read with,
+    and re-read and retried if another writer got there first.
+    """
+    client = get_dapr_client()
+    by_shard = {}
+    for order_id, change in changes.items():
+        by_shard.setdefault(order_index.open_shard(order_id, ORDER_INDEX_SHARDS), {})[order_id] = change
+
+    for shard, shard_changes in by_shard.items():
+        key = order_index.open_key(shard)
+        for attempt in range(ORDER_INDEX_WRITE_RETRIES):
+            result = client.get_state(store_name=DAPR_STORE_NAME, key=key)
+            try:
+                client.save_state(
+                    store_name=DAPR_STORE_NAME,
+                    key=key,
+                    value=order_index.update_open(result.data, shard_changes),
+                    etag=result.etag or None,
+                    options=StateOptions(concurrency=Concurrency.first_write)
+                )
+                break
+            except DaprGrpcError:
+                time.sleep(random.uniform(0, ORDER_READ_RETRY_DELAY))
+        else:
+            raise RuntimeError(f"could not update {key} after {ORDER_INDEX_WRITE_RETRIES} attempts")
+
+order_index_writer = order_index.GroupCommit(_write_index_entries)
+open_orders_writer = order_index.GroupCommit(lambda entries: _update_open_orders(dict(entries)))
+
+def _index_order(order):
+    """Add a new order to the recent-orders index and the open orders"""
+    order_index_writer.append((order['created_at'], order['order_id']))
+    open_orders_writer.append((order['order_id'], (order['created_at'], 'pending')))
+
+def _status_index_changes(previous, written):
+    """Index updates for orders whose status changed in a completion batch.
+
+    Returns ``(open_changes, ready_entries)``: orders still in progress get
+    their new status in the open set, and orders that became ready leave
+    it and are appended to the ready index.
+    """
+    open_changes, ready_entries = {}, []
+    for order_id, order in written.items():
+        status = _determine_order_status(order)[0]
+        if status == previous.get(order_id):
+            continue
+        if status == 'ready':
+            open_changes[order_id] = None
+            ready_entries.append((order['created_at'], order_id))
+        else:
+            open_changes[order_id] = (order['created_at'], status)
+    return open_changes, ready_entries
+
+# Station events of orders placed within this window go out as one bulk
+# publish per topic. 0 publishes each order's events right away, to every
+# station at once.
+PUBLISH_BATCH_WINDOW = float(os.getenv("PUBLISH_BATCH_WINDOW_MS", "0")) / 1000
+PUBLISH_PARALLELISM = int(os.getenv("PUBLISH_PARALLELISM", "16"))
+_publish_pool = ThreadPoolExecutor(max_workers=PUBLISH_PARALLELISM, thread_name_prefix="publish")
+
+# Flipped off the first time the sidecar rejects a bulk publish as unimplemented
+_bulk_publish_supported = True
+
+def _in_current_context(fn, *args):
+    """Bind ``fn(*args)`` to the current trace context, to run on another thread"""
+    ctx = context.get_current()
+
+    def run():
+        token = context.attach(ctx)
+        try:
+            return fn(*args)
+        finally:
+            context.detach(token)
+    return run
+
+def _publish_station_event(client, topic, event):
+    with tracer.start_as_current_span(f"publish_to_{topic.split('-')[0]}") as pub_span:
+        if pub_span.is_recording():
+            pub_span.set_attributes({"order.id": event['order_id'], "order.items": json.dumps(event['items'])})
+        log.debug("📤 Publishing to %s: order #%s", topic, event['order_id'])
+        client.publish_event(
+            pubsub_name=PUBSUB_NAME,
+            topic_name=topic,
+            data=_encode(event),
+            data_content_type=PAYLOAD_CONTENT_TYPE
+        )
+        log.debug("✅ Published to %s", topic)
+
+def _publish_station_events(client, order):
+    """Publish an order's events to all its stations at the same time.
+
+    With PUBLISH_BATCH_WINDOW set they join the next bulk publish instead.
+    Raises if any of them was not published.
+    """
+    events = _station_events(order)
+    if PUBLISH_BATCH_WINDOW and _bulk_publish_supported:
+        link = trace.get_current_span().get_span_context()
+        futures = [publish_batcher.submit(topic, _encode(event), link=link) for topic, event in events]
+    else:
+        # The first event is published from this thread, the others alongside it
+        futures = [
+            _publish_pool.submit(_in_current_context(_publish_station_event, client, topic, event))
+            for topic, event in events[1:]
+        ]
+        if events:
+            _publish_station_event(client, *events[0])
+    for future in futures:
+        future.result()
+
+def _bulk_publish_unsupported(topic, e):
+    """Whether ``e`` means the sidecar has no bulk publish; if so, stop using it"""
+    global _bulk_publish_supported
+
+    if not isinstance(e, grpc.RpcError) or e.code() != grpc.StatusCode.UNIMPLEMENTED:
+        return False
+    log.warning("⚠️ Bulk publish not supported, publishing %s events one by one", topic)
+    _bulk_publish_supported = False
+    return True
+
+def _publish_topic(client, topic, entries):
+    """Publish ``[(entry_id, data)]`` to ``topic`` in one call; returns the IDs that failed"""
+    if _bulk_publish_supported:
+        # The SDK has no bulk publish call yet, so this goes to the alpha API directly
+        bulk_publish = TimedDaprClient._timed("bulk_publish_event", dapr_grpc.bulk_publish)
+        try:
+            return bulk_publish(client, PUBSUB_NAME, topic, entries, PAYLOAD_CONTENT_TYPE)
+        except Exception as e:
+            if not _bulk_publish_unsupported(topic, e):
+                raise
+
+    failed = set()
+    for entry_id, data in entries:
+        try:
+            client.publish_event(
+                pubsub_name=PUBSUB_NAME,
+                topic_name=topic,
+                data=data,
+                data_content_type=PAYLOAD_CONTENT_TYPE
+            )
+        except Exception as e:
+            log.warning("⚠️ Publishing to %s failed: %s", topic, e)
+            failed.add(entry_id)
+    return failed
+
+def _flush_station_events(batch, links):
+    """Publish each topic's batch of station events, topics in parallel.
+
+    Returns the entry IDs that were not published.
+    """
+    client = get_dapr_client()
+    with tracer.start_as_current_span("publish_station_events", links=[trace.Link(link) for link in links]) as span:
+        if span.is_recording():
+            span.set_attributes({"batch.events": sum(len(entries) for entries in batch.values())})
+        futures = [
+            _publish_pool.submit(_in_current_context(_publish_topic, client, topic, entries))
+            for topic, entries in batch.items()
+        ]
+        return set().union(*(future.result() for future in futures))
+
+publish_batcher = PublishBatcher(_flush_station_events, window=PUBLISH_BATCH_WINDOW)
+
+# Admission control. New orders are turned away while a station they need
+# reports more than ADMISSION_MAX_BACKLOG_SECONDS of accepted work on its
+# GET /queue, or while ADMISSION_MAX_OPEN_ORDERS orders are in progress;
+# 0 turns a limit off. Both are read at most every ADMISSION_CHECK_INTERVAL
+# seconds, and a station that cannot be asked does not hold orders up.
+ADMISSION_MAX_BACKLOG_SECONDS = float(os.getenv("ADMISSION_MAX_BACKLOG_SECONDS", "0"))
+ADMISSION_MAX_OPEN_ORDERS = int(os.getenv("ADMISSION_MAX_OPEN_ORDERS", "0"))
+ADMISSION_CHECK_INTERVAL = float(os.getenv("ADMISSION_CHECK_INTERVAL", "1"))
+# Suggested wait when turning orders away for the open-orders limit
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+STATION_APP_IDS = {'kitchen': 'kitchen-service', 'bar': 'bar-service'}
+_refresh_lock = threading.Lock()  # held by the one request re-reading the load
+_count_lock = threading.Lock()  # for _load and the count below, never held over I/O
+_load = None  # (read_at, {station: backlog seconds or None}, open orders or None)
+_admitted_since_load = 0  # orders taken since _load was read
+
+def _read_station_backlog(client, station):
+    """Seconds of work a station has accepted; None if it cannot be asked"""
+    try:
+        response = client.invoke_method(STATION_APP_IDS[station], 'queue', http_verb='GET')
+        return float(json.loads(response.data)['backlog_seconds'])
+    except Exception as e:
+        log.debug("Could not read the %s queue: %s", station, e)
+        return None
+
+def _read_open_orders(client):
+    """Orders in progress, from the open-orders set; None if it cannot be read"""
+    try:
+        raw = _fetch_state(client, [order_index.open_key(shard) for shard in range(ORDER_INDEX_SHARDS)])
+        return order_index.count_open([data for data, _ in raw.values()])
+    except Exception as e:
+        log.debug("Could not count open orders: %s", e)
+        return None
+
+def _current_load():
+    """Return ``(backlogs, open_orders)``, re-read once ADMISSION_CHECK_INTERVAL
+    has passed. One request re-reads while the others use the last reading."""
+    global _load, _admitted_since_load
+    load = _load
+    if load is not None and time.monotonic() - load[0] < ADMISSION_CHECK_INTERVAL:
+        return load[1], load[2]
+    if not _refresh_lock.acquire(blocking=load is None):
+        return load[1], load[2]
+    try:
+        load = _load
+        if load is None or time.monotonic() - load[0] >= ADMISSION_CHECK_INTERVAL:
+            with _count_lock:
+                admitted = _admitted_since_load
+            client = get_dapr_client()
+            backlogs = {
+                station: _read_station_backlog(client, station) if ADMISSION_MAX_BACKLOG_SECONDS else None
+                for station in STATION_APP_IDS
+            }
+            open_orders = _read_open_orders(client) if ADMISSION_MAX_OPEN_ORDERS else None
+            load = (time.monotonic(), backlogs, open_orders)
+            # Orders taken during the reads may be missing from them, so
+            # they keep counting until the next reading
+            with _count_lock:
+                _load, _admitted_since_load = load, _admitted_since_load - admitted
+        return load[1], load[2]
+    finally:
+        _refresh_lock.release()
+
+def _admission(order, backlogs, open_orders):
+    """``(reason, retry_after)`` to turn ``order`` away, or None to take it.
+
+    ``reason`` is the busy station, or ``'open_orders'``.
+    """
+    refusals = []
+    if ADMISSION_MAX_BACKLOG_SECONDS:
+        for station, field in STATION_FIELDS:
+            backlog = backlogs.get(station)
+            if order[field] and backlog is not None and backlog > ADMISSION_MAX_BACKLOG_SECONDS:
+                # Until enough of the backlog is worked off
+                refusals.append((backlog - ADMISSION_MAX_BACKLOG_SECONDS, station))
+    if ADMISSION_MAX_OPEN_ORDERS and open_orders is not None:
+        # Orders this process took since the last count are open too
+        if open_orders + _admitted_since_load >= ADMISSION_MAX_OPEN_ORDERS:
+            refusals.append((ADMISSION_RETRY_AFTER, 'open_orders'))
+    if not refusals:
+        return None
+    retry_after, reason = max(refusals)
+    return reason, max(1, math.ceil(retry_after))
+
+def _admit(order):
+    """Admission decision for a new order, see ``_admission``"""
+    global _admitted_since_load
+    if not (ADMISSION_MAX_BACKLOG_SECONDS or ADMISSION_MAX_OPEN_ORDERS):
+        return None
+    refusal = _admission(order, *_current_load())
+    if refusal is None:
+        with _count_lock:
+            _admitted_since_load += 1
+    return refusal
+
+BUSY_MESSAGES = {
+    'kitchen': "🔥 The kitchen is busy",
+    'bar': "🍻 The bar is busy",
+    'open_orders': "⏳ We have our hands full"
+}
+
+def _turned_away(order, reason, retry_after):
+    """Record a refused order and return the "try again" response"""
+    orders_turned_away.add(1, {"reason": reason})
+    log.info("🚦 Order for %s turned away (%s), retry in %ss", order['customer_name'], reason, retry_after)
+    html = (
+        f'<div id="order-status" class="error">{BUSY_MESSAGES[reason]}, '
+        f'please try again in {retry_after} s.</div>'
+    )
+    return html, 200, {'Retry-After': str(retry_after)}
+
+def _order_placed_html(order):
+    return f'''<div id="order-status" class="success">
+            ✅ Order #{order['order_id']} placed successfully for {order['customer_name']}!<br>
+            🍔 Burgers: {len(order['burgers'])} | 🍺 Beers: {len(order['beers'])}
+        </div>'''
+
+NO_ITEMS_HTML = '<div id="order-status" class="error">Please select at least one item!</div>'
+
+def place_order(customer_name, items):
+    """Take a new order from the order form"""
+    try:
+        with tracer.start_as_current_span("create_order") as span:
+            log.debug("📝 Received order - Customer: %s, Items: %s", customer_name, items)
+
+            if not items:
+                span.set_attribute("error", True)
+                return NO_ITEMS_HTML
+
+            order = _new_order(customer_name, items)
+            order_id = order['order_id']
+
+            log.debug("📝 Processed - Burgers: %s, Beers: %s", order['burgers'], order['beers'])
+
+            refusal = _admit(order)
+            if refusal is not None:
+                span.set_attribute("order.turned_away", refusal[0])
+                return _turned_away(order, *refusal)
+
+            # Attributes are only worth building for sampled spans
+            if span.is_recording():
+                span.set_attributes({
+                    "order.id": order_id,
+                    "order.customer_name": customer_name,
+                    "order.burger_count": len(order['burgers']),
+                    "order.beer_count": len(order['beers'])
+                })
+
+        client = get_dapr_client()
+
+        # Save order to state store
+        log.debug("💾 Saving order #%s to state store", order_id)
+        if ORDER_ACTORS:
+            _invoke_order_actor(client, order_id, "Create", order)
+        else:
+            client.save_state(
+                store_name=DAPR_STORE_NAME,
+                key=f"order-{order_id}",
+                value=_encode(order)
+            )
+        log.info("✅ Order #%s saved to state store", order_id)
+
+        # Make it show up on the board
+        _index_order(order)
+        _invalidate_board()
+        _push_order_card(order_id, order, new=True)
+
+        # Events are only published once save_state has returned, so the order
+        # is normally readable before any station sees it. Completion handlers
+        # retry the read in case the store is slower to make it visible.
+
+        # Publish to the kitchen if burgers and to the bar if beers
+        _publish_station_events(client, order)
+
+        orders_placed.add(1)
+        return _order_placed_html(order)
+
+    except Exception as e:
+        return f'<div id="order-status" class="error">Error: {str(e)}</div>'
+
+
+# Which order field each station prepares
+STATION_FIELDS = (('kitchen', 'burgers'), ('bar', 'beers'))
+
+def _items_done(order, service_type, field):
+    """How many of the order's ``field`` items a station has finished"""
+    if order.get(f"{service_type}_status") == 'ready':
+        return len(order[field])
+    return min(len(order[field]), sum((order.get(f"{service_type}_items_done") or {}).values()))
+
+def _determine_order_status(order):
+    """Determine the overall status of an order from its items' progress.
+
+    ``preparing`` once any item is done, ``ready`` once every station the
+    order needs has finished it.
+    """
+    needed = [(service_type, field) for service_type, field in STATION_FIELDS if order[field]]
+    if needed and all(order.get(f"{service_type}_status") == 'ready' for service_type, _ in needed):
+        return 'ready', '✅ Ready'
+
+    done = sum(_items_done(order, service_type, field) for service_type, field in needed)
+    if done:
+        total = sum(len(order[field]) for _, field in needed)
+        return 'preparing', f'🔄 Preparing ({done}/{total} items)'
+    if order['burgers'] and order['beers']:
+        return 'pending', '⏳ Pending'
+    elif order['burgers']:
+        return 'pending', '⏳ Cooking'
+    else:  # only beers
+        return 'pending', '⏳ Pouring'
+
+def _estimated_ready_at(order):
+    """When the stations expect the unfinished parts of an order to be ready.
+
+    None once it is ready, or while a station has not reported an ETA yet.
+    """
+    etas = [
+        order.get(f"{service_type}_eta")
+        for service_type, field in STATION_FIELDS
+        if order[field] and order.get(f"{service_type}_status") != 'ready'
+    ]
+    if not etas or None in etas:
+        return None
+    return max(etas)
+
+def _item_list(order, service_type, field):
+    """The order's ``field`` items, ticking off the ones already served"""
+    if not order[field]:
+        return 'None'
+    if order.get(f"{service_type}_status") == 'ready':
+        return ', '.join(order[field])
+    done = dict(order.get(f"{service_type}_items_done") or {})
+    items = []
+    for item in order[field]:
+        if done.get(item, 0) > 0:
+            done[item] -= 1
+            item = f"{item} ✅"
+        items.append(item)
+    return ', '.join(items)
+
+def _render_order_card(order_id, order, oob=None):
+    """Render a single order card, optionally as an htmx out-of-band swap"""
+    status, status_text = _determine_order_status(order)
+    estimated_ready_at = _estimated_ready_at(order)
+    burgers = _item_list(order, 'kitchen', 'burgers')
+    beers = _item_list(order, 'bar', 'beers')
+
+    return templates.get_template('order_card.html').render(
+        order_id=order_id,
+        customer_name=order['customer_name'],
+        status=status,
+        status_text=status_text,
+        burgers=burgers,
+        beers=beers,
+        eta=datetime.fromtimestamp(estimated_ready_at).strftime('%H:%M:%S') if estimated_ready_at else None,
+        oob=oob
+    )
+
+def _push_order_card(order_id, order, new=False):
+    """Send a re-rendered card to everyone watching the board stream"""
+    if not order_hub.subscribers:
+        return
+
+    if new:
+        # Prepend the card and clear the "no orders yet" placeholder
+        html = (
+            '<div hx-swap-oob="afterbegin:#orders">'
+            f'{_render_order_card(order_id, order)}</div>'
+            '<p id="orders-empty" hx-swap-oob="true"></p>'
+        )
+    else:
+        html = _render_order_card(order_id, order, oob='true')
+    order_hub.publish('order', html)
+
+def _fetch_state_parallel(client, keys):
+    """Fetch state keys one by one, in parallel, for stores without bulk get"""
+    def fetch(key):
+        result = client.get_state(store_name=DAPR_STORE_NAME, key=key)
+        return key, (result.data, result.etag)
+
+    with ThreadPoolExecutor(max_workers=min(len(keys), STATE_READ_PARALLELISM)) as pool:
+        return dict(pool.map(fetch, keys))
+
+def _fetch_state(client, keys):
+    """Fetch several state keys with a single bulk state read.
+
+    Falls back to parallel single-key reads when the sidecar or state store
+    does not support bulk get, and re-reads any key the bulk call reported
+    an error for. Returns a dict of key to ``(data, etag)``; missing keys
+    are left out.
+    """
+    global _bulk_get_supported
+
+    if not keys:
+        return {}
+
+    if not _bulk_get_supported:
+        raw = _fetch_state_parallel(client, keys)
+    else:
+        try:
+            result = client.get_bulk_state(
+                store_name=DAPR_STORE_NAME,
+                keys=keys,
+                parallelism=STATE_READ_PARALLELISM
+            )
+            raw = {item.key: (item.data, item.etag) for item in result.items if not item.error}
+            failed = [item.key for item in result.items if item.error]
+            if failed:
+                raw.update(_fetch_state_parallel(client, failed))
+        except DaprGrpcError as e:
+            log.warning("⚠️ Bulk state get unavailable (%s), falling back to parallel reads", e.code())
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                _bulk_get_supported = False
+            raw = _fetch_state_parallel(client, keys)
+
+    return {key: value for key, value in raw.items() if value[0]}
+
+# Order actors: each order is a Dapr actor that keeps it in memory while
+# active and takes one call at a time, so kitchen and bar updates are applied
+# in turn without ETags and board reads skip the state store. Orders not
+# called for ORDER_ACTOR_IDLE_TIMEOUT seconds are deactivated. Needs a state
+# store with actorStateStore enabled; off, orders are plain order-{id} keys.
+ORDER_ACTORS = os.getenv("ORDER_ACTORS", "").lower() in ("1", "true")
+ORDER_ACTOR_TYPE = "OrderActor"
+ORDER_ACTOR_IDLE_TIMEOUT = float(os.getenv("ORDER_ACTOR_IDLE_TIMEOUT", "300"))
+ORDER_ACTOR_SCAN_INTERVAL = float(os.getenv("ORDER_ACTOR_SCAN_INTERVAL", "30"))
+
+class PlainJSONSerializer(Serializer):
+    """JSON without the SDK default's conversions, which would turn
+    ``created_at`` (and anything else that looks like a date) into a datetime"""
+
+    def serialize(self, obj, custom_hook=None):
+        return json.dumps(obj).encode('utf-8')
+
+    def deserialize(self, data, data_type=object, custom_hook=None):
+        return json.loads(data) if data else None
+
+class OrderActorInterface(ActorInterface):
+    @actormethod(name="Create")
+    async def create(self, order: dict) -> None:
+        ...
+
+    @actormethod(name="GetOrder")
+    async def get_order(self) -> dict:
+        ...
+
+    @actormethod(name="ApplyCompletions")
+    async def apply_completions(self, completions: list) -> dict:
+        ...
+
+class OrderActor(Actor, OrderActorInterface):
+    """One order, kept in memory while the actor is active.
+
+    Changes are written to the actor state store at the end of each call.
+    """
+
+    async def create(self, order):
+        await self._state_manager.set_state('order', order)
+
+    async def get_order(self):
+        found, order = await self._state_manager.try_get_state('order')
+        return order if found else None
+
+    async def apply_completions(self, completions):
+        """Apply ``[(service_type, update)]``; returns the order, its status
+        before and whether anything changed, or None for an unknown order"""
+        found, order = await self._state_manager.try_get_state('order')
+        if not found:
+            return None
+        updated = _apply_completions(copy.deepcopy(order), completions)
+        changed = updated != order
+        if changed:
+            await self._state_manager.set_state('order', updated)
+        return {'order': updated, 'previous': _determine_order_status(order)[0], 'changed': changed}
+
+ActorRuntime.set_actor_config(ActorRuntimeConfig(
+    actor_idle_timeout=timedelta(seconds=ORDER_ACTOR_IDLE_TIMEOUT),
+    actor_scan_interval=timedelta(seconds=ORDER_ACTOR_SCAN_INTERVAL)
+))
+
+async def register_order_actor():
+    """Host the order actor in this process, on the loop its calls will run on"""
+    if ORDER_ACTORS:
+        await ActorRuntime.register_actor(
+            OrderActor,
+            message_serializer=PlainJSONSerializer(),
+            state_serializer=PlainJSONSerializer()
+        )
+
+# The actor runtime is asyncio. asgi.py runs it on its own loop; app.py runs
+# its calls on one event loop thread per process, started on first use
+_actor_loop = None
+_actor_loop_lock = threading.Lock()
+
+def actor_loop():
+    """Return the actor event loop thread's loop, registering the order actor on first use"""
+    global _actor_loop
+    if _actor_loop is None:
+        with _actor_loop_lock:
+            if _actor_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="actors", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(register_order_actor(), loop).result()
+                _actor_loop = loop
+    return _actor_loop
+
+def run_actor(coro):
+    """Run one of the actor handlers below from a thread"""
+    return asyncio.run_coroutine_threadsafe(coro, actor_loop()).result()
+
+def _invoke_order_actor(client, order_id, method, data=None):
+    """Call a method on an order's actor through the sidecar; returns the JSON reply"""
+    # The SDK's actor proxy is asyncio only, so this goes to the gRPC API directly
+    invoke = TimedDaprClient._timed("invoke_actor", dapr_grpc.invoke_actor)
+    return invoke(client, ORDER_ACTOR_TYPE, order_id, method, json.dumps(data).encode('utf-8') if data is not None else b'')
+
+def _fetch_order_actors(client, order_ids):
+    """Read orders from their actors, in parallel, as ``_fetch_order_states`` does"""
+    def fetch(order_id):
+        return order_id, _invoke_order_actor(client, order_id, "GetOrder")
+
+    if not order_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(order_ids), STATE_READ_PARALLELISM)) as pool:
+        futures = [pool.submit(_in_current_context(fetch, order_id)) for order_id in order_ids]
+        replies = [future.result() for future in futures]
+    # An unknown order's actor replies null
+    return {order_id: (data, None) for order_id, data in replies if data and data != b'null'}
+
+def _fetch_order_states(client, order_ids):
+    """Fetch several raw orders as a dict of order ID to ``(data, etag)``"""
+    if ORDER_ACTORS:
+        return _fetch_order_actors(client, order_ids)
+    raw = _fetch_state(client, [f"order-{order_id}" for order_id in order_ids])
+    return {
+        order_id: raw[f"order-{order_id}"]
+        for order_id in order_ids
+        if f"order-{order_id}" in raw
+    }
+
+def _recent_order_ids(client, limit, start=None, index=None):
+    """Return ``(order_ids, cursor)`` for the newest orders, newest first.
+
+    ``start`` is a decoded cursor from a previous call, which picks up at the
+    index pages where that call stopped; the returned cursor is None when
+    there are no older orders. ``index`` reads a secondary
+    index (e.g. ``'ready'``) instead of all orders.
+    """
+    reader = order_index.RecentReader(ORDER_INDEX_SHARDS, limit, start, index)
+    keys = reader.first_keys()
+    while keys:
+        reader.add({key: data for key, (data, _) in _fetch_state(client, keys).items()})
+        keys = reader.next_keys()
+    return reader.result()
+
+def _cached_order_card(order_id, data, etag):
+    """Render an order card, reusing the last render of the same version.
+
+    The version is the state ETag, or the raw value for stores that do not
+    return one.
+    """
+    version = (order_id, etag or data)
+    with _board_lock:
+        card = _card_cache.get(version)
+        if card is not None:
+            _card_cache.move_to_end(version)
+            return card
+
+    card = _render_order_card(order_id, codec.decode(data))
+    with _board_lock:
+        _card_cache[version] = card
+        while len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    return card
+
+def _invalidate_board():
+    """Force the next board request to re-read state"""
+    global _board_generation
+    with _board_lock:
+        _board_generation += 1
+
+NO_ORDERS_HTML = '<p id="orders-empty" style="text-align: center; color: #666;">No orders yet. Place your first order above!</p>'
+
+def _render_board(order_ids, states):
+    """Join the cached cards of the orders that could be read"""
+    order_cards = [
+        _cached_order_card(order_id, *states[order_id])
+        for order_id in order_ids
+        if order_id in states
+    ]
+    return ''.join(order_cards) if order_cards else '<p>No orders found</p>'
+
+def _build_board():
+    """Read the recent orders and render the board HTML"""
+    client = get_dapr_client()
+
+    order_ids, _ = _recent_order_ids(client, BOARD_SIZE)
+    if not order_ids:
+        return NO_ORDERS_HTML
+
+    return _render_board(order_ids, _fetch_order_states(client, order_ids))
+
+def _query_order_ids(client, status, limit, start=None):
+    """Return ``(order_ids, cursor)`` for one page of orders with ``status``.
+
+    Ready orders come from their own index and in-progress ones from the
+    open-orders set, so the cost depends on the page size and the number of
+    open orders, not on how many orders there have ever been.
+    """
+    if status is None or status == 'ready':
+        return _recent_order_ids(client, limit, start, index=status)
+
+    before = start[0] if start else None
+    raw = _fetch_state(client, [order_index.open_key(shard) for shard in range(ORDER_INDEX_SHARDS)])
+    return order_index.select_open([data for data, _ in raw.values()], status, limit, before)
+
+def _parse_order_query(args):
+    """Return ``(status, limit, start)`` from the query string, ``start``
+    being the decoded cursor; ValueError if invalid"""
+    status = args.get('status') or None
+    if status is not None and status not in ORDER_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(ORDER_STATUSES)}")
+    limit = int(args.get('limit', BOARD_SIZE))
+    if not 1 <= limit <= ORDER_QUERY_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {ORDER_QUERY_MAX_LIMIT}")
+    cursor = args.get('cursor')
+    return status, limit, order_index.decode_cursor(cursor) if cursor else None
+
+def _with_status(states, status):
+    """Drop orders whose current status no longer matches the filter"""
+    if status is None:
+        return states
+    return {
+        order_id: state for order_id, state in states.items()
+        if _determine_order_status(codec.decode(state[0]))[0] == status
+    }
+
+def _render_order_page(order_ids, states, status, limit, cursor):
+    """Render a page of cards, ending in an htmx loader for the next page"""
+    html = _render_board(order_ids, states)
+    if cursor:
+        params = {'limit': limit, 'cursor': cursor}
+        if status:
+            params['status'] = status
+        html += (
+            f'<div hx-get="/api/orders?{escape(urlencode(params))}" hx-trigger="revealed" '
+            'hx-swap="outerHTML">Loading more orders…</div>'
+        )
+    return html
+
+def _order_page(status, limit, start):
+    """Read and render one page of a filtered order query"""
+    client = get_dapr_client()
+    order_ids, cursor = _query_order_ids(client, status, limit, start)
+    states = _with_status(_fetch_order_states(client, order_ids), status)
+    return _render_order_page(order_ids, states, status, limit, cursor), cursor
+
+def _cached_board():
+    """Return ``(board, generation)``; board is ``(html, etag)`` or None if stale"""
+    with _board_lock:
+        generation = _board_generation
+        cached = _board_cache
+    if cached and cached[0] == generation and time.monotonic() - cached[1] < BOARD_CACHE_TTL:
+        return (cached[2], cached[3]), generation
+    return None, generation
+
+def _store_board(generation, built_at, html):
+    """Cache a freshly built board and return ``(html, etag)``"""
+    global _board_cache
+
+    etag = hashlib.blake2b(html.encode('utf-8'), digest_size=12).hexdigest()
+    with _board_lock:
+        # Don't let a slow rebuild overwrite a newer one
+        if _board_cache is None or _board_cache[1] <= built_at:
+            _board_cache = (generation, built_at, html, etag)
+    return html, etag
+
+def _get_board():
+    """Return ``(html, etag)`` for the board, rebuilding it when stale"""
+    board, generation = _cached_board()
+    if board:
+        return board
+
+    built_at = time.monotonic()
+    return _store_board(generation, built_at, _build_board())
+
+def board(if_none_match):
+    """The order board; ``(html, status, headers)``, a 304 when
+    ``if_none_match`` (the request's ETags) holds the current one"""
+    try:
+        html, etag = _get_board()
+    except Exception as e:
+        return f'<p>Error loading orders: {str(e)}</p>'
+
+    # Let the browser keep the board but revalidate it on every poll
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if if_none_match.contains(etag):
+        return '', 304, headers
+    return html, 200, headers
+
+def query_orders(args):
+    """A page of orders queried with ``limit``, ``cursor`` and/or ``status``"""
+    try:
+        status, limit, start = _parse_order_query(args)
+    except ValueError as e:
+        return f'<p>Invalid order query: {escape(str(e))}</p>', 400
+
+    try:
+        html, cursor = _order_page(status, limit, start)
+    except Exception as e:
+        return f'<p>Error loading orders: {str(e)}</p>'
+
+    return html, 200, {'X-Next-Cursor': cursor} if cursor else {}
+
+def _apply_completion(order, service_type, update):
+    """Record the kitchen or bar ETA or item progress, or mark that part of
+    an order as ready"""
+    if 'estimated_ready_at' in update:
+        order[f"{service_type}_eta"] = update['estimated_ready_at']
+    if 'items_done' in update:
+        # Counts only go up, so a late or repeated progress event is harmless
+        items_done = order.setdefault(f"{service_type}_items_done", {})
+        for item, count in update['items_done'].items():
+            items_done[item] = max(items_done.get(item, 0), count)
+    if 'completed_at' in update:
+        order[f"{service_type}_status"] = 'ready'
+        order[f"{service_type}_completed_at"] = update['completed_at']
+    return order
+
+def _completion_update(data):
+    """The ``completed_at`` and/or ``estimated_ready_at`` a station reported"""
+    update = {key: data[key] for key in ('completed_at', 'estimated_ready_at') if data.get(key) is not None}
+    if not update:
+        raise ValueError(f"completion event for order {data.get('order_id')} has no times")
+    return update
+
+def _parse_completion_event(headers, body):
+    """Return ``(order_id, update, event_id)`` from a completion CloudEvent"""
+    event = from_http(headers, body)
+    data = _event_data(event)
+    return data['order_id'], _completion_update(data), event['id']
+
+def _bulk_entry_event_id(entry):
+    """CloudEvent ID of a bulk subscribe entry; None for a raw payload"""
+    event = entry.get('event')
+    return event.get('id') if isinstance(event, dict) and 'specversion' in event else None
+
+def _bulk_entry_data(entry):
+    """Return ``(data, trace_carrier)`` for one bulk subscribe entry"""
+    event = entry['event']
+    if isinstance(event, dict) and 'specversion' in event:
+        data = event.get('data')
+        if data is None and 'data_base64' in event:
+            data = base64.b64decode(event['data_base64'])
+        carrier, content_type = event, event.get('datacontenttype')
+    else:
+        data, carrier = event, entry.get('metadata') or {}
+        content_type = entry.get('contentType')
+    return codec.decode(data, content_type), carrier
+
+def _apply_completions(order, completions):
+    """Apply every ``(service_type, update)`` queued for one order"""
+    for service_type, update in completions:
+        order = _apply_completion(order, service_type, update)
+    return order
+
+def _describe_completions(completions):
+    return ', '.join(
+        f"{service_type} {'ready' if 'completed_at' in update else 'progress' if 'items_done' in update else 'ETA'}"
+        for service_type, update in completions
+    )
+
+def _record_completion_metrics(order, completions):
+    """Record placed-to-completed times for completions just written to ``order``"""
+    created_at = datetime.fromisoformat(order['created_at']).timestamp()
+    completed = [(service_type, update['completed_at']) for service_type, update in completions if 'completed_at' in update]
+    for service_type, completed_at in completed:
+        order_station_duration.record(completed_at - created_at, {"station": service_type})
+    if completed and _determine_order_status(order)[0] == 'ready':
+        ready_at = max(order.get(f"{station}_completed_at") or 0 for station in ('kitchen', 'bar'))
+        order_ready_duration.record(ready_at - created_at)
+
+def _order_state_metadata(order):
+    """State metadata to write ``order`` with: the retention TTL once it is ready"""
+    return RETENTION_METADATA if _determine_order_status(order)[0] == 'ready' else {}
+
+def _write_order_transaction(client, updates):
+    """One state transaction writing ``{order_id: (order, etag)}`` guarded by ETag"""
+    upserts = [
+        (f"order-{order_id}", _encode(order), etag or None, _order_state_metadata(order))
+        for order_id, (order, etag) in updates.items()
+    ]
+    if any(metadata for *_, metadata in upserts):
+        # The SDK's execute_state_transaction cannot set the retention TTL per operation
+        transaction = TimedDaprClient._timed("execute_state_transaction", dapr_grpc.execute_state_transaction)
+        transaction(client, DAPR_STORE_NAME, upserts)
+    else:
+        client.execute_state_transaction(
+            store_name=DAPR_STORE_NAME,
+            operations=[TransactionalStateOperation(key, value, etag) for key, value, etag, _ in upserts]
+        )
+
+def _save_order_if_unchanged(client, order_id, order, etag):
+    """Save one order only if it still has ``etag``; False on a conflict"""
+    try:
+        client.save_state(
+            store_name=DAPR_STORE_NAME,
+            key=f"order-{order_id}",
+            value=_encode(order),
+            etag=etag or None,
+            options=StateOptions(concurrency=Concurrency.first_write),
+            state_metadata=_order_state_metadata(order)
+        )
+        return True
+    except DaprGrpcError as e:
+        log.info("⚠️ Order #%s changed during completion update (%s)", order_id, e.code())
+        return False
+
+def _write_orders(client, updates):
+    """Write ``{order_id: (order, etag)}`` guarded by the ETags read.
+
+    Tries a single state transaction for the batch. One stale ETag fails the
+    whole transaction, so on failure each order is saved on its own to find
+    out which ones another writer got to first. Returns the written IDs.
+    """
+    global _state_transactions_supported
+
+    if not updates:
+        return set()
+
+    if _state_transactions_supported and len(updates) > 1:
+        try:
+            _write_order_transaction(client, updates)
+            return set(updates)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                log.warning("⚠️ State transactions unavailable, saving orders one by one")
+                _state_transactions_supported = False
+
+    def save(item):
+        order_id, (order, etag) = item
+        return order_id, _save_order_if_unchanged(client, order_id, order, etag)
+
+    with ThreadPoolExecutor(max_workers=min(len(updates), STATE_READ_PARALLELISM)) as pool:
+        return {order_id for order_id, saved in pool.map(save, updates.items()) if saved}
+
+def _apply_to_stored_orders(client, batch):
+    """Apply completions to ``order-{id}`` keys with optimistic concurrency.
+
+    Each round bulk-reads the outstanding orders, applies their completions
+    and writes them back guarded by ETag. Orders that are not visible yet,
+    or that another writer changed in between, go round again with backoff.
+    Returns ``(previous, written, unchanged, pending, attempts)``: the
+    status each order had, the orders written, the IDs that needed no
+    change and the completions still outstanding after ORDER_READ_RETRIES.
+    """
+    pending = dict(batch)
+    previous, written, unchanged = {}, {}, set()
+    for attempt in range(ORDER_READ_RETRIES + 1):
+        updates = {}
+        for order_id, (data, etag) in _fetch_order_states(client, list(pending)).items():
+            order = codec.decode(data)
+            previous[order_id] = _determine_order_status(order)[0]
+            updated = _apply_completions(codec.decode(data), pending[order_id])
+            if updated == order:
+                # Already applied, e.g. redelivered after the ack was lost
+                unchanged.add(order_id)
+                del pending[order_id]
+                continue
+            updates[order_id] = (updated, etag)
+        for order_id in _write_orders(client, updates):
+            written[order_id] = updates[order_id][0]
+            del pending[order_id]
+        if not pending or attempt == ORDER_READ_RETRIES:
+            break
+        time.sleep(ORDER_READ_RETRY_DELAY * 2 ** attempt)
+    return previous, written, unchanged, pending, attempt + 1
+
+def _apply_to_order_actors(client, batch):
+    """Apply completions through each order's actor, in parallel.
+
+    The actor serializes calls for its order, so there is nothing to retry
+    here; an order whose actor has no order yet, or could not be called,
+    is left pending. Returns the same tuple as ``_apply_to_stored_orders``.
+    """
+    def apply(order_id):
+        try:
+            return order_id, json.loads(_invoke_order_actor(client, order_id, "ApplyCompletions", batch[order_id]))
+        except Exception as e:
+            log.warning("⚠️ Order actor #%s not updated: %s", order_id, e)
+            return order_id, None
+
+    previous, written, unchanged, pending = {}, {}, set(), {}
+    with ThreadPoolExecutor(max_workers=min(len(batch), STATE_READ_PARALLELISM)) as pool:
+        futures = [pool.submit(_in_current_context(apply, order_id)) for order_id in batch]
+        for order_id, result in (future.result() for future in futures):
+            if result is None:
+                pending[order_id] = batch[order_id]
+                continue
+            previous[order_id] = result['previous']
+            if result['changed']:
+                written[order_id] = result['order']
+            else:
+                unchanged.add(order_id)
+    return previous, written, unchanged, pending, 1
+
+def _flush_completions(batch, links):
+    """Apply a batch of coalesced completions.
+
+    Orders that could not be updated come back False so Dapr redelivers
+    their events.
+    """
+    client = get_dapr_client()
+    with tracer.start_as_current_span("apply_completion_batch", links=[trace.Link(link) for link in links]) as span:
+        if span.is_recording():
+            span.set_attributes({
+                "batch.orders": len(batch),
+                "batch.completions": sum(len(c) for c in batch.values())
+            })
+        apply = _apply_to_order_actors if ORDER_ACTORS else _apply_to_stored_orders
+        previous, written, unchanged, pending, attempts = apply(client, batch)
+        if span.is_recording():
+            span.set_attributes({
+                "batch.attempts": attempts,
+                "batch.unwritten": len(pending),
+                "batch.unchanged": len(unchanged)
+            })
+
+        # The orders are saved; a failure here only leaves the status
+        # filters behind, and queries re-check the status they return
+        open_changes, ready_entries = _status_index_changes(previous, written)
+        try:
+            if open_changes:
+                _update_open_orders(open_changes)
+            if ready_entries:
+                _write_index_entries(ready_entries, index='ready')
+        except Exception as e:
+            log.warning("⚠️ Order status index not updated: %s", e)
+        _archive_orders(written[order_id] for _, order_id in ready_entries)
+
+    if written:
+        _invalidate_board()
+    for order_id, order in written.items():
+        _push_order_card(order_id, order)
+        _record_completion_metrics(order, batch[order_id])
+        log.info("✅ Updated order #%s - %s", order_id, _describe_completions(batch[order_id]))
+    for order_id in pending:
+        log.warning("⚠️ Order #%s not updated (not visible yet or still conflicting)", order_id)
+    return {order_id: order_id in written or order_id in unchanged for order_id in batch}
+
+completion_batcher = CompletionBatcher(_flush_completions, window=COMPLETION_BATCH_WINDOW)
+
+def _archive_failed(e):
+    log.warning("⚠️ Finished orders not archived: %s", e)
+
+order_archive = OrderArchive(ORDER_ARCHIVE_PATH, ORDER_ARCHIVE_INTERVAL, on_error=_archive_failed) if ORDER_ARCHIVE_PATH else None
+
+@atexit.register
+def flush_order_archive():
+    """Write out the finished orders still queued on shutdown"""
+    if order_archive is not None:
+        try:
+            order_archive.flush()
+        except OSError as e:
+            _archive_failed(e)
+
+def _archive_orders(orders):
+    """Queue orders that just became ready for the archive"""
+    if order_archive is not None:
+        for order in orders:
+            order_archive.add(order)
+
+def _update_order_completion(order_id, update, service_type):
+    """Private function to handle order completion and ETA updates.
+
+    Queues the completion for the next batch and waits for it to be written.
+    Returns False if the order never became visible or kept conflicting, so
+    the caller can ask Dapr to redeliver the event later.
+    """
+    link = trace.get_current_span().get_span_context()
+    return completion_batcher.submit(order_id, service_type, update, link=link).result()
+
+# Dapr bulk subscribe: the sidecar batches deliveries into one request per
+# BULK_MAX_MESSAGES events or BULK_MAX_AWAIT_MS, whichever comes first
+BULK_SUBSCRIBE = os.getenv("BULK_SUBSCRIBE", "").lower() in ("1", "true")
+BULK_MAX_MESSAGES = int(os.getenv("BULK_MAX_MESSAGES", "100"))
+BULK_MAX_AWAIT_MS = int(os.getenv("BULK_MAX_AWAIT_MS", "40"))
+
+def _subscription(topic, route):
+    subscription = {
+        'pubsubname': 'orderpubsub',
+        'topic': topic,
+        'route': route
+    }
+    if BULK_SUBSCRIBE:
+        subscription['route'] = f"{route}-bulk"
+        subscription['bulkSubscribe'] = {
+            'enabled': True,
+            'maxMessagesCount': BULK_MAX_MESSAGES,
+            'maxAwaitDurationMs': BULK_MAX_AWAIT_MS
+        }
+    return subscription
+
+SUBSCRIPTIONS = [
+    _subscription('kitchen-completed', '/kitchen-completed'),
+    _subscription('bar-completed', '/bar-completed'),
+    _subscription('kitchen-progress', '/kitchen-progress'),
+    _subscription('bar-progress', '/bar-progress')
+]
+
+def subscriptions():
+    """The topics to tell Dapr we subscribe to"""
+    log.info("📋 Order service subscriptions: %s", SUBSCRIPTIONS)
+    return SUBSCRIPTIONS
+
+ACTOR_CONFIG_JSON = DefaultJSONSerializer()
+
+def actor_config():
+    """The actor types we host and when to deactivate them"""
+    return ACTOR_CONFIG_JSON.serialize(ActorRuntime.get_actor_config()), 200, {'Content-Type': 'application/json'}
+
+async def deactivate_actor(actor_type, actor_id):
+    """Deactivate an actor that Dapr found idle too long"""
+    try:
+        await ActorRuntime.deactivate(actor_type, actor_id)
+    except ValueError as e:
+        return {'error': str(e)}, 404
+    return '', 200
+
+async def invoke_actor_method(actor_type, actor_id, method, body, reentrancy_id):
+    """Run one actor call; Dapr sends each actor one call at a time"""
+    try:
+        reply = await ActorRuntime.dispatch(actor_type, actor_id, method, body, reentrancy_id)
+    except ValueError as e:
+        return {'error': str(e)}, 404
+    except Exception as e:
+        log.exception("❌ Actor %s/%s %s failed: %s", actor_type, actor_id, method, e)
+        return {'error': str(e)}, 500
+    return reply, 200, {'Content-Type': 'application/json'}
+
+def handle_completion(service_type, headers, body):
+    """Apply one kitchen-completed or bar-completed event"""
+    try:
+        order_id, update, event_id = _parse_completion_event(headers, body)
+        if event_id in seen_events:
+            log.debug("🔁 %s-completed event %s for order #%s already applied", service_type, event_id, order_id)
+            return '', 200
+
+        log.debug("📥 Received %s-completed for order #%s", service_type, order_id)
+        if not _update_order_completion(order_id, update, service_type):
+            return {'status': 'RETRY'}, 200
+
+        seen_events.add(event_id)
+        return '', 200
+
+    except Exception as e:
+        log.error("❌ Error handling %s-completed: %s", service_type, e)
+        return {'status': 'DROP'}, 200
+
+def _parse_progress_event(headers, body):
+    """Return ``({order_id: {item: done}}, event_id)`` from a station progress CloudEvent"""
+    event = from_http(headers, body)
+    return _event_data(event)['progress'], event['id']
+
+def _submit_progress(progress, service_type, link=None):
+    """Queue each order's item counts with the completions; returns the futures"""
+    return [
+        completion_batcher.submit(order_id, service_type, {'items_done': items_done}, link=link)
+        for order_id, items_done in progress.items()
+    ]
+
+def _progress_written(futures):
+    """Count of progress updates that were written.
+
+    Progress is advisory: the next event or the completion supersedes it,
+    so unwritten updates are logged rather than redelivered.
+    """
+    written = 0
+    for future in futures:
+        try:
+            written += bool(future.result())
+        except Exception as e:
+            log.warning("⚠️ Progress update failed: %s", e)
+    return written
+
+def handle_progress(service_type, headers, body):
+    """Apply one progress event covering many orders"""
+    try:
+        progress, event_id = _parse_progress_event(headers, body)
+        if event_id in seen_events:
+            return '', 200
+        link = trace.get_current_span().get_span_context()
+        written = _progress_written(_submit_progress(progress, service_type, link=link))
+        seen_events.add(event_id)
+        log.debug("📈 %s progress for %d orders, %d written", service_type, len(progress), written)
+        return '', 200
+
+    except Exception as e:
+        log.error("❌ Error handling %s-progress: %s", service_type, e)
+        return {'status': 'DROP'}, 200
+
+def _submit_bulk_entry(entry, service_type):
+    """Queue one completion from a bulk delivery; None if it cannot be parsed"""
+    if _bulk_entry_event_id(entry) in seen_events:
+        already_applied = Future()
+        already_applied.set_result(True)
+        return already_applied
+    try:
+        data, carrier = _bulk_entry_data(entry)
+        with tracer.start_as_current_span(f"handle_{service_type}_completed", context=propagate.extract(carrier)) as span:
+            span.set_attribute("order.id", data['order_id'])
+            return completion_batcher.submit(
+                data['order_id'], service_type, _completion_update(data), link=span.get_span_context()
+            )
+    except Exception as e:
+        log.error("❌ Error handling bulk %s-completed entry: %s", service_type, e)
+        return None
+
+def _bulk_completion_status(future):
+    if future is None:
+        return 'DROP'
+    try:
+        return 'SUCCESS' if future.result() else 'RETRY'
+    except Exception as e:
+        log.error("❌ Error applying bulk completion: %s", e)
+        return 'DROP'
+
+def handle_completions_bulk(service_type, payload):
+    """Queue a bulk delivery of completions together, one status per entry"""
+    entries = (payload or {}).get('entries') or []
+    submitted = [(entry, _submit_bulk_entry(entry, service_type)) for entry in entries]
+    statuses = []
+    for entry, future in submitted:
+        status = _bulk_completion_status(future)
+        if status == 'SUCCESS':
+            seen_events.add(_bulk_entry_event_id(entry))
+        statuses.append({'entryId': entry.get('entryId'), 'status': status})
+    log.debug("📦 Bulk %s-completed delivery: %d events", service_type, len(entries))
+    return {'statuses': statuses}
+
+def handle_progress_bulk(service_type, payload):
+    """Queue the progress of a bulk delivery of progress events together"""
+    entries = (payload or {}).get('entries') or []
+    statuses, futures, applied = [], [], []
+    for entry in entries:
+        event_id = _bulk_entry_event_id(entry)
+        try:
+            if event_id not in seen_events:
+                data, carrier = _bulk_entry_data(entry)
+                link = trace.get_current_span(propagate.extract(carrier)).get_span_context()
+                futures.extend(_submit_progress(data['progress'], service_type, link=link))
+                applied.append(event_id)
+            status = 'SUCCESS'
+        except Exception as e:
+            log.error("❌ Error handling bulk %s-progress entry: %s", service_type, e)
+            status = 'DROP'
+        statuses.append({'entryId': entry.get('entryId'), 'status': status})
+    _progress_written(futures)
+    for event_id in applied:
+        seen_events.add(event_id)
+    return {'statuses': statuses}
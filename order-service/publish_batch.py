@@ -0,0 +1,79 @@
+"""Grouping of station events into bulk publishes.
+
+Events submitted within a short window are handed to one flush call grouped
+by topic, so a burst of placed orders costs one bulk publish per topic
+instead of one publish per order and station.
+
+Each ``submit`` returns a future that resolves once that event is published
+and fails if it was not, so ``create_order`` still only reports an order as
+placed when its events went out.
+"""
+import itertools
+import threading
+from concurrent.futures import Future
+
+
+class PublishError(Exception):
+    """A bulk publish did not accept an event"""
+
+
+class PublishBatcher:
+    """Collect ``(topic, data)`` events for ``window`` seconds.
+
+    ``flush`` is called from a timer thread with a dict of topic to a list
+    of ``(entry_id, data)`` plus the ``link`` values passed to ``submit``
+    (e.g. span contexts), and returns the entry IDs that failed.
+    """
+
+    def __init__(self, flush, window=0.005):
+        self._flush = flush
+        self._window = window
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}  # topic -> [(entry_id, data, future)]
+        self._links = []
+
+    def submit(self, topic, data, link=None):
+        future = Future()
+        with self._lock:
+            first = not self._pending
+            self._pending.setdefault(topic, []).append((str(next(self._ids)), data, future))
+            if link is not None:
+                self._links.append(link)
+        if first:
+            timer = threading.Timer(self._window, self._run)
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def _take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            links, self._links = self._links, []
+        batch = {
+            topic: [(entry_id, data) for entry_id, data, _ in entries]
+            for topic, entries in pending.items()
+        }
+        return pending, batch, links
+
+    @staticmethod
+    def _resolve(pending, failed, error=None):
+        for topic, entries in pending.items():
+            for entry_id, _, future in entries:
+                if future.done():  # cancelled by a disconnected caller
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                elif entry_id in failed:
+                    future.set_exception(PublishError(f"bulk publish to {topic} rejected entry {entry_id}"))
+                else:
+                    future.set_result(True)
+
+    def _run(self):
+        pending, batch, links = self._take()
+        try:
+            failed = self._flush(batch, links)
+        except Exception as e:
+            self._resolve(pending, None, e)
+        else:
+            self._resolve(pending, failed)
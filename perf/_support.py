@@ -0,0 +1,152 @@
+"""Shared helpers for the perf scripts.
+
+The services live in hyphenated directories as plain modules (``app.py``
+and the service's logic beside it), so they are loaded by path here under a
+unique module name.
+"""
+import http.client
+import importlib.util
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Spans are not exported from perf runs; there is usually no collector around
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+# Flask's test client reuses the request context, which the Flask
+# instrumentation reports as a failed context detach on every request
+logging.getLogger('opentelemetry.context').setLevel(logging.CRITICAL)
+
+
+def load_service(service, module="app"):
+    """Import ``<service>/<module>.py`` and return the module object"""
+    service_dir = os.path.join(REPO_ROOT, service)
+    name = f"{service.replace('-', '_')}_{module}"
+    if name in sys.modules:
+        return sys.modules[name]
+
+    sys.path.insert(0, service_dir)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(service_dir, f"{module}.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def start_service(service, module, port, sidecar_ports, cpu=None, extra_env=None):
+    """Run ``<service>/<module>.py`` against a sidecar and wait for /ready.
+
+    ``cpu`` pins the process to one CPU; returns the ``Popen``.
+    """
+    grpc_port, http_port = sidecar_ports
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DAPR_GRPC_PORT=str(grpc_port),
+        DAPR_HTTP_PORT=str(http_port),
+        OTEL_SDK_DISABLED='true',
+        **(extra_env or {})
+    )
+    proc = subprocess.Popen(
+        [sys.executable, f'{module}.py'],
+        cwd=os.path.join(REPO_ROOT, service),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=None if cpu is None else lambda: os.sched_setaffinity(0, {cpu})
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/ready')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{service} ({module}) did not start')
+
+
+def percentiles(samples):
+    """p50/p90/p99/max/mean of durations in seconds, reported in milliseconds"""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'p90_ms': round(samples[int(len(samples) * 0.9)] * 1000, 2),
+        'p99_ms': round(samples[int(len(samples) * 0.99)] * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 2)
+    }
+
+
+class CountingStateClient:
+    """In-process stand-in for ``DaprClient`` that counts sidecar round trips.
+
+    Only the state and publish calls used by the services are implemented.
+    Every method call counts as one round trip, which is what it costs
+    against a real sidecar.
+    """
+
+    def __init__(self, store=None, bulk_supported=True, **kwargs):
+        self.store = store if store is not None else {}
+        self.bulk_supported = bulk_supported
+        self.calls = Counter()
+        self.published = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def get_state(self, store_name, key, **kwargs):
+        self.calls['get_state'] += 1
+        return SimpleNamespace(data=self.store.get(key, b''), etag='')
+
+    def get_bulk_state(self, store_name, keys, **kwargs):
+        self.calls['get_bulk_state'] += 1
+        if not self.bulk_supported:
+            from dapr.clients.exceptions import DaprGrpcError
+            raise DaprGrpcError(_UnimplementedRpcError())
+        items = [
+            SimpleNamespace(key=key, data=self.store.get(key, b''), etag='', error='')
+            for key in keys
+        ]
+        return SimpleNamespace(items=items)
+
+    def save_state(self, store_name, key, value, **kwargs):
+        self.calls['save_state'] += 1
+        self.store[key] = value.encode('utf-8') if isinstance(value, str) else value
+
+    def publish_event(self, pubsub_name, topic_name, data, **kwargs):
+        self.calls['publish_event'] += 1
+        self.published.append((topic_name, data))
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+
+class _UnimplementedRpcError(Exception):
+    def code(self):
+        import grpc
+        return grpc.StatusCode.UNIMPLEMENTED
+
+    def details(self):
+        return 'bulk get not supported'
+
+    def trailing_metadata(self):
+        return ()
@@ -0,0 +1,147 @@
+"""Load comparison of the Flask (app.py) and asyncio (asgi.py) serving modes.
+
+Each mode is started as a subprocess pinned to the same single CPU and
+pointed at the in-process fake sidecar, then driven with:
+
+* order-service: concurrent clients placing an order and polling the board
+  in a loop for a fixed duration;
+* kitchen-service: a burst of order deliveries, timed until every
+  completion event has been published.
+
+Reports throughput, latency percentiles and the CPU seconds the server used.
+
+    python perf/bench_asgi_vs_flask.py --clients 32 --duration 10 --burst 200
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+
+import _support
+from fake_sidecar import FakeSidecar
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def drive_order_service(port, clients, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client_loop(n):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        body = f'customer_name=bench{n}&items=Cheeseburger&items=IPA'
+        form = {'Content-Type': 'application/x-www-form-urlencoded'}
+        while time.monotonic() < stop_at:
+            for method, path, payload, headers in (
+                ('POST', '/api/orders', body, form),
+                ('GET', '/api/orders', None, {})
+            ):
+                start = time.perf_counter()
+                try:
+                    conn.request(method, path, payload, headers)
+                    conn.getresponse().read()
+                except (OSError, http.client.HTTPException) as e:
+                    with lock:
+                        errors.append(str(e))
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client_loop, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'errors': len(errors),
+        **_support.percentiles(latencies)
+    }
+
+
+def drive_kitchen_burst(port, sidecar, burst):
+    sidecar.published.clear()
+    acks = []
+    lock = threading.Lock()
+    # Fresh order IDs each run: the sidecar keeps the kitchen's dedup markers
+    run = uuid.uuid4().hex[:8]
+
+    def deliver(n):
+        event = {
+            'specversion': '1.0',
+            'id': str(uuid.uuid4()),
+            'source': 'bench',
+            'type': 'com.dapr.event.sent',
+            'datacontenttype': 'application/json',
+            'data': json.dumps({'order_id': f'b{run}-{n}', 'customer_name': 'bench', 'items': ['Cheeseburger']})
+        }
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        start = time.perf_counter()
+        conn.request('POST', '/kitchen-orders', json.dumps(event), {'Content-Type': 'application/cloudevents+json'})
+        conn.getresponse().read()
+        with lock:
+            acks.append(time.perf_counter() - start)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=deliver, args=(n,)) for n in range(burst)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    while len(sidecar.published) < burst and time.monotonic() - start < 120:
+        time.sleep(0.05)
+    return {
+        'completed': len(sidecar.published),
+        'burst_seconds': round(time.monotonic() - start, 2),
+        'ack': _support.percentiles(acks)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--server-cpu', type=int, default=min(os.sched_getaffinity(0)))
+    args = parser.parse_args()
+
+    sidecar = FakeSidecar()
+    ports = sidecar.start(max_workers=64)
+    results = {}
+    for module in ('app', 'asgi'):
+        proc = _support.start_service('order-service', module, 5101, ports, args.server_cpu)
+        try:
+            cpu = cpu_seconds(proc.pid)
+            results[f'order-service/{module}'] = drive_order_service(5101, args.clients, args.duration)
+            results[f'order-service/{module}']['server_cpu_seconds'] = round(cpu_seconds(proc.pid) - cpu, 2)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+        # Enough stations to cook the whole burst at once, as threads or as tasks
+        stations = {'STATION_COUNT': str(args.burst), 'ORDER_QUEUE_SIZE': str(args.burst)}
+        proc = _support.start_service('kitchen-service', module, 5102, ports, args.server_cpu, stations)
+        try:
+            cpu = cpu_seconds(proc.pid)
+            results[f'kitchen-service/{module}'] = drive_kitchen_burst(5102, sidecar, args.burst)
+            results[f'kitchen-service/{module}']['server_cpu_seconds'] = round(cpu_seconds(proc.pid) - cpu, 2)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    sidecar.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Count sidecar round trips per order-board render.
+
+Renders ``GET /api/orders`` against an in-process state store and compares
+the current bulk-read implementation with the previous one-read-per-order
+loop, for stores with and without bulk get support.
+
+    python perf/bench_board_round_trips.py --orders 10
+"""
+import argparse
+import json
+
+from _support import CountingStateClient, load_service
+
+
+def seed_store(order_service, order_count):
+    store = {}
+    order_ids = [f"{i:08x}" for i in range(order_count)]
+    for order_id in order_ids:
+        store[f"order-{order_id}"] = json.dumps({
+            'order_id': order_id,
+            'customer_name': 'Bench',
+            'burgers': ['Cheeseburger'],
+            'beers': ['IPA'],
+            'status': 'pending',
+            'created_at': '2024-01-01T00:00:00'
+        }).encode('utf-8')
+    # The pre-bulk board read a single order-list key
+    store['order-list'] = json.dumps(order_ids).encode('utf-8')
+
+    index = order_service.order_index
+    for shard in range(order_service.ORDER_INDEX_SHARDS):
+        entries = [
+            ('2024-01-01T00:00:00', order_id)
+            for order_id in order_ids[shard::order_service.ORDER_INDEX_SHARDS]
+        ]
+        head, _ = index.append(None, entries, order_service.ORDER_INDEX_PAGE_SIZE)
+        store[index.head_key(shard)] = head.encode('utf-8')
+    return store
+
+
+def n_plus_one_board(client):
+    """The pre-bulk implementation: one get_state per order"""
+    order_ids = json.loads(client.get_state(store_name='statestore', key='order-list').data)
+    for order_id in order_ids:
+        client.get_state(store_name='statestore', key=f"order-{order_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=10)
+    args = parser.parse_args()
+
+    app = load_service('order-service')
+    order_service = app.orders
+    store = seed_store(order_service, args.orders)
+
+    baseline = CountingStateClient(store)
+    n_plus_one_board(baseline)
+
+    results = {'n_plus_one': baseline.round_trips}
+    for label, bulk_supported in (('bulk', True), ('parallel_fallback', False)):
+        client = CountingStateClient(store, bulk_supported=bulk_supported)
+        order_service._dapr_client = client
+        with app.app.test_client() as http:
+            # Render twice: the fallback only probes bulk get on the first render
+            for _ in range(2):
+                order_service._invalidate_board()
+                client.calls.clear()
+                response = http.get('/api/orders')
+                assert response.status_code == 200
+        results[label] = client.round_trips
+
+    print(json.dumps({'orders': args.orders, 'round_trips_per_render': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
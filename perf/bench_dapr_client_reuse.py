@@ -0,0 +1,67 @@
+"""Per-request cost of a new DaprClient versus the shared process client.
+
+Times a state read against the in-process fake sidecar, once opening a
+fresh client per call (the old ``with DaprClient() as client`` pattern) and
+once through a single long-lived client.
+
+    python perf/bench_dapr_client_reuse.py --iterations 500
+"""
+import argparse
+import json
+import statistics
+import time
+
+import _support  # noqa: F401  (quietens OpenTelemetry for perf runs)
+from fake_sidecar import FakeSidecar, point_dapr_sdk_at
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'mean_us': round(statistics.fmean(samples), 1),
+        'p50_us': round(samples[len(samples) // 2], 1),
+        'p99_us': round(samples[int(len(samples) * 0.99)], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    sidecar = FakeSidecar()
+    point_dapr_sdk_at(*sidecar.start())
+    from dapr.clients import DaprClient
+
+    def per_request_client():
+        with DaprClient() as client:
+            client.get_state(store_name='statestore', key='order-list')
+
+    shared = DaprClient()
+
+    def shared_client():
+        shared.get_state(store_name='statestore', key='order-list')
+
+    # Warm up imports, channels and the server thread pool
+    timed(per_request_client, 20)
+    timed(shared_client, 20)
+
+    results = {
+        'per_request_client': timed(per_request_client, args.iterations),
+        'shared_client': timed(shared_client, args.iterations)
+    }
+    results['saved_per_call_us'] = round(
+        results['per_request_client']['mean_us'] - results['shared_client']['mean_us'], 1
+    )
+    shared.close()
+    sidecar.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Bytes and CPU per order: JSON vs the compact msgpack payload encoding.
+
+Builds every state value and event an order goes through with the real
+order-service helpers: the new order, one event per station, each station's
+ETA, progress and completion events, and the order as it is written back
+after each of them. Each is encoded and decoded with ``codec`` in both
+encodings; the report gives the bytes per hop and per order, and the CPU
+time to encode and decode one order's worth of payloads.
+
+    python perf/bench_encoding.py --orders 2000
+"""
+import argparse
+import json
+import time
+
+import _support
+
+ORDERS = (['Classic Burger', 'IPA'], ['Double Bacon Burger'], ['Veggie Burger', 'Lager', 'Stout'], ['Wheat Beer'])
+STATIONS = (('kitchen', 'burgers'), ('bar', 'beers'))
+
+
+def order_payloads(order_service, customer_name, items):
+    """``[(hop, value)]`` for every state write and event of one order"""
+    app = order_service
+    order = app._new_order(customer_name, items)
+    payloads = [('order_state', order)]
+    payloads += [('order_event', event) for _, event in app._station_events(order)]
+
+    now = time.time()
+    for station, field in STATIONS:
+        if not order[field]:
+            continue
+        updates = [('eta_event', {'order_id': order['order_id'], 'estimated_ready_at': now + 5})]
+        done = {}
+        for item in order[field][:-1]:
+            done[item] = done.get(item, 0) + 1
+            updates.append(('progress_event', {'progress': {order['order_id']: dict(done)}}))
+        updates.append(('completion_event', {'order_id': order['order_id'], 'completed_at': now + 6}))
+
+        for hop, event in updates:
+            payloads.append((hop, event))
+            if hop == 'progress_event':
+                update = {'items_done': event['progress'][order['order_id']]}
+            else:
+                update = app._completion_update(event)
+            order = app._apply_completion(dict(order), station, update)
+            payloads.append(('order_state', order))
+    return payloads
+
+
+def measure(codec, content_type, orders):
+    """``(bytes per hop, total bytes, CPU seconds)`` to encode and decode ``orders``"""
+    sizes = {}
+    start = time.process_time()
+    for payloads in orders:
+        for hop, value in payloads:
+            data = codec.encode(value, content_type)
+            codec.decode(data, content_type)
+            sizes[hop] = sizes.get(hop, 0) + len(data)
+    return sizes, sum(sizes.values()), time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000)
+    args = parser.parse_args()
+
+    order_service = _support.load_service('order-service', 'orders')
+    codec = order_service.codec
+    orders = [
+        order_payloads(order_service, f'Customer {n}', ORDERS[n % len(ORDERS)])
+        for n in range(args.orders)
+    ]
+
+    results = {}
+    for encoding, content_type in codec.CONTENT_TYPES.items():
+        sizes, total, seconds = measure(codec, content_type, orders)
+        results[encoding] = {
+            'bytes_per_order': round(total / args.orders, 1),
+            'bytes_per_hop': {hop: round(size / args.orders, 1) for hop, size in sizes.items()},
+            'cpu_us_per_order': round(seconds / args.orders * 1e6, 1)
+        }
+
+    json_result, compact = results['json'], results['msgpack']
+    results['savings'] = {
+        'bytes': f"{1 - compact['bytes_per_order'] / json_result['bytes_per_order']:.0%}",
+        'cpu': f"{1 - compact['cpu_us_per_order'] / json_result['cpu_us_per_order']:.0%}"
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
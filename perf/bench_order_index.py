@@ -0,0 +1,144 @@
+"""Lost orders under concurrent placement: order-list blob vs sharded index.
+
+Places ``--orders`` orders at once through the real ``POST /api/orders``
+handler against the in-process fake sidecar, then pages through the
+recent-orders index with its cursor and checks every order is there exactly
+once. ``--replicas`` gives the handlers that many independent index
+writers, as separate order-service processes would have, so appends from
+different "replicas" race on the shard ETags. The old read-modify-write of
+a single ``order-list`` key is replayed with the same concurrency for
+comparison (without its 10-entry cap, so only entries lost to races are
+counted).
+
+    python perf/bench_order_index.py --orders 500 --replicas 4
+"""
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+
+import _support
+from fake_sidecar import FakeSidecar, point_dapr_sdk_at
+
+
+def run_concurrently(count, fn):
+    """Call ``fn(n)`` from ``count`` threads released together"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(n):
+        barrier.wait()
+        results[n] = fn(n)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(count)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.monotonic() - start
+
+
+def legacy_order_list(client, count):
+    """Unguarded get-append-save of one JSON array per order"""
+    def place(n):
+        result = client.get_state(store_name='statestore', key='order-list')
+        order_list = json.loads(result.data) if result.data else []
+        order_list.insert(0, f'legacy{n}')
+        client.save_state(store_name='statestore', key='order-list', value=json.dumps(order_list))
+
+    _, elapsed = run_concurrently(count, place)
+    stored = json.loads(client.get_state(store_name='statestore', key='order-list').data)
+    return {'placed': count, 'listed': len(stored), 'lost': count - len(set(stored)), 'seconds': round(elapsed, 2)}
+
+
+class ReplicaWriters:
+    """Routes each placing thread to one of several independent index writers"""
+
+    def __init__(self, order_service, replicas):
+        self._writers = [
+            order_service.order_index.GroupCommit(order_service._write_index_entries) for _ in range(replicas)
+        ]
+        self._local = threading.local()
+
+    def use(self, n):
+        self._local.writer = self._writers[n % len(self._writers)]
+
+    def append(self, entry):
+        return self._local.writer.append(entry)
+
+
+def sharded_index(app, sidecar, count, page_size, replicas):
+    order_service = app.orders
+    order_id_re = re.compile(r'Order #(\w+) placed')
+    writers = order_service.order_index_writer = ReplicaWriters(order_service, replicas)
+
+    def place(n):
+        writers.use(n)
+        form = {'customer_name': f'bench{n}', 'items': ['Classic Burger']}
+        with app.app.test_client() as http:
+            body = http.post('/api/orders', data=form).get_data(as_text=True)
+        match = order_id_re.search(body)
+        return match.group(1) if match else None
+
+    sidecar.calls.clear()
+    placed, elapsed = run_concurrently(count, place)
+    conflicts = sidecar.calls.get('EtagMismatch', 0)
+
+    client = order_service.get_dapr_client()
+    listed, start, pages = [], None, 0
+    while True:
+        order_ids, cursor = order_service._recent_order_ids(client, page_size, start)
+        listed.extend(order_ids)
+        pages += 1
+        if not cursor:
+            break
+        start = order_service.order_index.decode_cursor(cursor)
+
+    placed_ids = {order_id for order_id in placed if order_id}
+    return {
+        'placed': len(placed_ids),
+        'failed_placements': placed.count(None),
+        'listed': len(listed),
+        'lost': len(placed_ids - set(listed)),
+        'duplicates': len(listed) - len(set(listed)),
+        'etag_conflicts_retried': conflicts,
+        'pages_read': pages,
+        'seconds': round(elapsed, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--replicas', type=int, default=4)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    sidecar = FakeSidecar()
+    point_dapr_sdk_at(*sidecar.start(max_workers=64))
+    app = _support.load_service('order-service')
+    order_service = app.orders
+
+    # The handlers log every step to the stdout the service's handler bound
+    # at import; keep the report readable
+    level = order_service.log.level
+    order_service.log.setLevel(logging.WARNING)
+    try:
+        results = {
+            'order_list_blob': legacy_order_list(order_service.get_dapr_client(), args.orders),
+            'sharded_index': sharded_index(app, sidecar, args.orders, args.page_size, args.replicas)
+        }
+    finally:
+        order_service.log.setLevel(level)
+
+    order_service.close_dapr_client()
+    sidecar.stop()
+    results['sharded_index']['replicas'] = args.replicas
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
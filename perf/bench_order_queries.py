@@ -0,0 +1,99 @@
+"""Cost of a filtered order query as the order history grows.
+
+Seeds an in-process state store with ``--history`` sizes worth of orders
+(all but ``--open`` of them ready) through the order-service index layout,
+then times ``GET /api/orders?status=...&limit=...`` and counts its sidecar
+round trips. The cost should follow the page size and the number of open
+orders, not the history size.
+
+    python perf/bench_order_queries.py --history 100 1000 10000 --open 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+from _support import CountingStateClient, load_service
+
+
+def seed_store(order_service, history, open_count):
+    index = order_service.order_index
+    shards = order_service.ORDER_INDEX_SHARDS
+    page_size = order_service.ORDER_INDEX_PAGE_SIZE
+    store, open_orders = {}, {}
+
+    def append(key_index, entry):
+        shard = index.pick_shard(shards)
+        key = index.head_key(shard, key_index)
+        head, sealed = index.append(store.get(key), [entry], page_size)
+        if sealed:
+            store[index.page_key(shard, sealed[0], key_index)] = sealed[1].encode('utf-8')
+        store[key] = head.encode('utf-8')
+
+    for n in range(history):
+        order_id = f"{n:08x}"
+        created_at = f"2024-01-01T00:00:00.{n:06d}"
+        ready = n < history - open_count
+        order = {
+            'order_id': order_id,
+            'customer_name': 'Bench',
+            'burgers': [],
+            'beers': ['IPA'],
+            'status': 'pending',
+            'created_at': created_at
+        }
+        if ready:
+            order['bar_status'] = 'ready'
+        store[f"order-{order_id}"] = json.dumps(order).encode('utf-8')
+        append(None, (created_at, order_id))
+        if ready:
+            append('ready', (created_at, order_id))
+        else:
+            shard = index.open_shard(order_id, shards)
+            open_orders.setdefault(shard, {})[order_id] = (created_at, 'pending')
+
+    for shard, changes in open_orders.items():
+        store[index.open_key(shard)] = index.update_open(None, changes).encode('utf-8')
+    return store
+
+
+def time_query(app, client, params, iterations):
+    samples = []
+    with app.app.test_client() as http:
+        for _ in range(iterations):
+            client.calls.clear()
+            start = time.perf_counter()
+            response = http.get('/api/orders', query_string=params)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    return {'round_trips': client.round_trips, 'mean_ms': round(statistics.fmean(samples) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--open', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_service('order-service')
+    order_service = app.orders
+    results = {}
+    for history in args.history:
+        client = CountingStateClient(seed_store(order_service, history, args.open))
+        order_service._dapr_client = client
+        results[history] = {
+            status or 'all': time_query(
+                app, client,
+                {'limit': args.limit, **({'status': status} if status else {})},
+                args.iterations
+            )
+            for status in (None, 'pending', 'ready')
+        }
+
+    print(json.dumps({'limit': args.limit, 'open_orders': args.open, 'by_history_size': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
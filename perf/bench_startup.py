@@ -0,0 +1,156 @@
+"""Cold start of each service: per-import cost and time until it takes traffic.
+
+For every service and telemetry setting:
+
+* ``python -X importtime -c "import app"`` is run ``--runs`` times; the
+  report gives the median total import time and the ``--top`` modules
+  anywhere below ``app.py`` by median self time, so the cost inside the
+  service module (``orders.py``, ``kitchen.py``, ``bar.py``) shows up;
+* ``app.py`` is started against the fake sidecar and polled until
+  ``/health`` (the process answers) and ``/ready`` (the sidecar is up too)
+  return 200, timed from the spawn.
+
+``--telemetry off`` runs with ``OTEL_SDK_DISABLED=true``, which skips the
+OpenTelemetry SDK, exporter and instrumentation; ``both`` reports the
+difference.
+
+    python perf/bench_startup.py --runs 5 --telemetry both
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import _support
+from fake_sidecar import FakeSidecar
+
+SERVICES = (('order-service', 5201), ('kitchen-service', 5202), ('bar-service', 5203))
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def service_env(telemetry, **extra):
+    env = dict(os.environ, **extra)
+    env['OTEL_SDK_DISABLED'] = 'false' if telemetry else 'true'
+    return env
+
+
+def import_profile(service, telemetry):
+    """``(total ms, {module imported for app: self ms})`` for one import of ``app``"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=os.path.join(_support.REPO_ROOT, service),
+        env=service_env(telemetry),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True
+    )
+    # Children are listed before their parent, so everything app imports is
+    # the lines between the previous top-level import and app itself
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, name = int(match.group(1)), int(match.group(2)), match.group(4)
+        if not match.group(3):
+            if name == 'app':
+                return cumulative / 1000, modules
+            modules = {}
+        else:
+            modules[name] = modules.get(name, 0) + own / 1000
+    raise RuntimeError(f'{service}: app not found in the import profile')
+
+
+def wait_for(port, path, deadline):
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return time.monotonic()
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f'{path} on port {port} did not answer')
+
+
+def time_to_serve(service, port, sidecar_ports, telemetry):
+    """Seconds from spawning ``app.py`` until ``/health`` and ``/ready`` answer"""
+    grpc_port, http_port = sidecar_ports
+    env = service_env(telemetry, PORT=str(port), DAPR_GRPC_PORT=str(grpc_port), DAPR_HTTP_PORT=str(http_port))
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, 'app.py'],
+        cwd=os.path.join(_support.REPO_ROOT, service),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        healthy = wait_for(port, '/health', start + 30)
+        ready = wait_for(port, '/ready', start + 30)
+        return healthy - start, ready - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(samples, top):
+    """Medians over the ``(import ms, imports, health s, ready s)`` samples of one mode"""
+    imports = {}
+    for _, modules, _, _ in samples:
+        for name, ms in modules.items():
+            imports.setdefault(name, []).append(ms)
+    costs = {name: statistics.median(ms) for name, ms in imports.items()}
+    slowest = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'import_ms': round(statistics.median(sample[0] for sample in samples), 1),
+        'top_imports_ms': {name: round(ms, 1) for name, ms in slowest},
+        'health_ms': round(statistics.median(sample[2] for sample in samples) * 1000, 1),
+        'ready_ms': round(statistics.median(sample[3] for sample in samples) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--telemetry', choices=('on', 'off', 'both'), default='both')
+    args = parser.parse_args()
+
+    modes = {'on': (True,), 'off': (False,), 'both': (True, False)}[args.telemetry]
+    sidecar = FakeSidecar()
+    sidecar_ports = sidecar.start()
+    results = {}
+    try:
+        for service, port in SERVICES:
+            # Modes take turns within each run so drift on the host hits them alike
+            samples = {telemetry: [] for telemetry in modes}
+            for _ in range(args.runs):
+                for telemetry in modes:
+                    total, modules = import_profile(service, telemetry)
+                    health, ready = time_to_serve(service, port, sidecar_ports, telemetry)
+                    samples[telemetry].append((total, modules, health, ready))
+            results[service] = {
+                f"telemetry_{'on' if telemetry else 'off'}": summarize(samples[telemetry], args.top)
+                for telemetry in modes
+            }
+            if args.telemetry == 'both':
+                on, off = results[service]['telemetry_on'], results[service]['telemetry_off']
+                results[service]['telemetry_off_saves_ms'] = {
+                    'import': round(on['import_ms'] - off['import_ms'], 1),
+                    'ready': round(on['ready_ms'] - off['ready_ms'], 1)
+                }
+    finally:
+        sidecar.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
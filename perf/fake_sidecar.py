@@ -0,0 +1,690 @@
+"""In-process stand-in for the Dapr sidecar.
+
+Serves the part of the Dapr API the services use from memory: state
+get/save/delete, transactions and (bulk) publish over gRPC, and the same
+state and publish calls plus the health endpoint ``DaprClient`` polls over
+HTTP. Writes that carry an ETag are rejected (ABORTED, or 409 over HTTP)
+when it no longer matches, and first-write saves without one when the key
+already exists, like the Redis store.
+
+Several sidecars can share one ``FakeDapr`` backend, the way the services'
+sidecars share the Redis state store and pub/sub. A sidecar connected to its
+app reads the app's ``/dapr/subscribe`` and delivers published events to the
+subscribed routes as CloudEvents, one at a time or batched for bulk
+subscriptions, honouring the SUCCESS/RETRY/DROP replies. It also reads the
+app's ``/dapr/config`` and hosts the actor types listed there: actor calls
+are sent to the app one at a time per actor, actor state lives in the same
+store under ``{app id}||{type}||{id}||{name}`` keys, and actors idle past
+their timeout are deactivated. Service invocation over the HTTP API
+reaches the other apps connected to the same ``FakeDapr``.
+
+``latency`` injects a delay per kind of call (``state_read``,
+``state_write``, ``publish``, ``delivery``) to stand in for the network and
+Redis, so the services' own cost can be told apart from the sidecar's.
+``duplicates`` delivers that share of events a second time, the way
+at-least-once delivery does after a lost ack.
+
+Run as a script it starts one sidecar per service on the ports in
+dapr.yaml, so the services can be started against it by hand::
+
+    python perf/fake_sidecar.py --latency state_read=1 state_write=2
+    cd order-service && DAPR_GRPC_PORT=50001 DAPR_HTTP_PORT=3501 python app.py
+"""
+import argparse
+import base64
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent import futures
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+from google.protobuf import empty_pb2
+
+from dapr.proto.common.v1 import common_pb2
+from dapr.proto.runtime.v1 import dapr_pb2, dapr_pb2_grpc
+from dapr.serializers.util import convert_from_dapr_duration
+
+LATENCY_KINDS = ('state_read', 'state_write', 'publish', 'delivery')
+
+# (app id, app port, gRPC port, HTTP port) of the sidecars the script starts
+DEFAULT_APPS = (
+    ('order-service', 5001, 50001, 3501),
+    ('kitchen-service', 5002, 50002, 3502),
+    ('bar-service', 5003, 50003, 3503),
+)
+
+
+def parse_latency(specs):
+    """``["state_read=2", ...]`` in milliseconds to ``{kind: seconds}``"""
+    latency = {}
+    for spec in specs or ():
+        kind, _, millis = spec.partition('=')
+        if kind not in LATENCY_KINDS:
+            raise ValueError(f"unknown latency kind {kind!r}, expected one of {', '.join(LATENCY_KINDS)}")
+        latency[kind] = float(millis) / 1000
+    return latency
+
+
+class FakeDapr:
+    """State store and pub/sub shared by a group of sidecars.
+
+    ``store`` maps keys to ``(data, etag)`` and ``published`` collects
+    ``(topic, data)`` tuples. Keys written with ``ttlInSeconds`` metadata
+    read as missing once it has passed, counted in ``expired``. Harnesses
+    can follow the pipeline by adding callables to ``on_write``
+    (``fn(key, value)``, value None for a delete), ``on_publish``
+    (``fn(topic, data)``) and ``on_deliver`` (``fn(topic, data, status)``
+    once an app has answered a delivery). ``deliveries`` counts delivery
+    outcomes per event.
+
+    ``latency`` maps a kind of call to seconds added to each one, varied
+    by up to ``jitter`` (a fraction) either way. A ``duplicates`` share of
+    events is delivered again ``redelivery_delay`` after the first time,
+    counted in ``duplicated``.
+    """
+
+    def __init__(self, delivery_workers=32, redelivery_delay=0.1, max_redeliveries=20,
+                 latency=None, jitter=0.0, duplicates=0.0):
+        self.store = {}
+        self.expires = {}  # key -> time.monotonic() deadline
+        self.expired = 0
+        self.published = []
+        self.lock = threading.Lock()
+        self.on_write = []
+        self.on_publish = []
+        self.on_deliver = []
+        self.deliveries = {'SUCCESS': 0, 'RETRY': 0, 'DROP': 0, 'FAILED': 0}
+        self.redelivery_delay = redelivery_delay
+        self.max_redeliveries = max_redeliveries
+        self.latency = dict(latency or {})
+        self.jitter = jitter
+        self.duplicates = duplicates
+        self.duplicated = 0
+        self._etag = 0
+        self._subscriptions = {}  # topic -> [(app_port, subscription)]
+        self._bulk_lock = threading.Lock()
+        self._bulk = {}  # (app_port, route) -> {'entries': [...], 'timer': Timer}
+        self._delivery = futures.ThreadPoolExecutor(max_workers=delivery_workers)
+        self.apps = {}  # app ID -> app port, for service invocation
+        self._actor_hosts = {}  # actor type -> (app_port, idle timeout in seconds)
+        self._actors = {}  # (actor type, actor ID) -> [call lock, last call]
+        self._actors_lock = threading.Lock()
+        self._scanner = None
+        self.deactivations = 0
+
+    def delay(self, kind):
+        seconds = self.latency.get(kind)
+        if seconds:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def next_etag(self):
+        """Next ETag; call with ``lock`` held"""
+        self._etag += 1
+        return str(self._etag)
+
+    def current(self, key):
+        """``(data, etag)`` of a key, ``(b'', '')`` if it is missing or expired"""
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            with self.lock:
+                if self.expires.pop(key, None) is not None:
+                    self.store.pop(key, None)
+                    self.expired += 1
+            return b'', ''
+        return self.store.get(key, (b'', ''))
+
+    def written(self, writes):
+        for key, value in writes:
+            for hook in self.on_write:
+                hook(key, value)
+
+    def subscribe(self, app_port, subscriptions):
+        with self.lock:
+            for subscription in subscriptions:
+                self._subscriptions.setdefault(subscription['topic'], []).append((app_port, subscription))
+
+    def host_actors(self, app_port, config):
+        """Send calls for the actor types in an app's ``/dapr/config`` to it"""
+        idle = convert_from_dapr_duration(config.get('actorIdleTimeout') or '1h').total_seconds()
+        scan = convert_from_dapr_duration(config.get('actorScanInterval') or '30s').total_seconds()
+        with self._actors_lock:
+            for actor_type in config.get('entities') or ():
+                self._actor_hosts[actor_type] = (app_port, idle)
+            if self._actor_hosts and self._scanner is None:
+                self._scanner = threading.Thread(target=self._deactivate_idle, args=(scan,), daemon=True)
+                self._scanner.start()
+
+    def invoke_actor(self, actor_type, actor_id, method, data):
+        """Call an actor method on its app; returns ``(http_status, body)``.
+
+        Calls to one actor wait for each other. KeyError if no app hosts
+        ``actor_type``.
+        """
+        app_port, _ = self._actor_hosts[actor_type]
+        with self._actors_lock:
+            actor = self._actors.setdefault((actor_type, actor_id), [threading.Lock(), 0.0])
+        with actor[0]:
+            self.delay('delivery')
+            reply = _call_app(app_port, 'PUT', f'/actors/{actor_type}/{actor_id}/method/{method}', data)
+            actor[1] = time.monotonic()
+        return reply
+
+    def _deactivate_idle(self, interval):
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._actors_lock:
+                for (actor_type, actor_id), (call_lock, last_call) in list(self._actors.items()):
+                    app_port, idle = self._actor_hosts[actor_type]
+                    if now - last_call < idle or not call_lock.acquire(blocking=False):
+                        continue
+                    try:
+                        del self._actors[(actor_type, actor_id)]
+                        _call_app(app_port, 'DELETE', f'/actors/{actor_type}/{actor_id}')
+                        self.deactivations += 1
+                    except OSError:
+                        pass
+                    finally:
+                        call_lock.release()
+
+    def publish(self, pubsub_name, topic, data, content_type, source):
+        with self.lock:
+            self.published.append((topic, data))
+            targets = list(self._subscriptions.get(topic, ()))
+        for hook in self.on_publish:
+            hook(topic, data)
+
+        event = {
+            'specversion': '1.0',
+            'id': str(uuid.uuid4()),
+            'source': source,
+            'type': 'com.dapr.event.sent',
+            'topic': topic,
+            'pubsubname': pubsub_name,
+            'datacontenttype': content_type or 'text/plain',
+        }
+        # Like Dapr: JSON is embedded, other text is a string, binary is base64
+        if content_type == 'application/json':
+            event['data'] = json.loads(data)
+        elif not content_type or content_type.startswith('text/'):
+            event['data'] = data.decode('utf-8')
+        else:
+            event['data_base64'] = base64.b64encode(data).decode('ascii')
+        for app_port, subscription in targets:
+            deliver = partial(self._deliver_event, app_port, subscription, topic, data, event)
+            deliver()
+            if self.duplicates and random.random() < self.duplicates:
+                with self.lock:
+                    self.duplicated += 1
+                timer = threading.Timer(self.redelivery_delay, deliver)
+                timer.daemon = True
+                timer.start()
+
+    def _deliver_event(self, app_port, subscription, topic, data, event):
+        if (subscription.get('bulkSubscribe') or {}).get('enabled'):
+            entry = {
+                'entryId': str(uuid.uuid4()),
+                'event': event,
+                'contentType': 'application/cloudevents+json',
+                'metadata': {}
+            }
+            self._add_bulk(app_port, subscription, (entry, topic, data, 0))
+        else:
+            self._delivery.submit(
+                self._deliver, app_port, subscription['route'], topic, data, json.dumps(event), 0
+            )
+
+    def _post(self, app_port, route, body):
+        """POST ``body`` to the app; returns ``(http_status, parsed JSON reply or None)``"""
+        self.delay('delivery')
+        conn = http.client.HTTPConnection('127.0.0.1', app_port, timeout=30)
+        try:
+            conn.request('POST', route, body, {'Content-Type': 'application/cloudevents+json'})
+            response = conn.getresponse()
+            reply = response.read()
+        finally:
+            conn.close()
+        try:
+            return response.status, json.loads(reply)
+        except ValueError:
+            return response.status, None
+
+    def _settle(self, topic, data, status, attempt, redeliver):
+        """Count a delivery outcome and schedule ``redeliver`` on RETRY"""
+        if status == 'RETRY' and attempt >= self.max_redeliveries:
+            status = 'FAILED'
+        with self.lock:
+            self.deliveries[status] = self.deliveries.get(status, 0) + 1
+        for hook in self.on_deliver:
+            hook(topic, data, status)
+        if status == 'RETRY':
+            timer = threading.Timer(self.redelivery_delay * (attempt + 1), redeliver)
+            timer.daemon = True
+            timer.start()
+
+    def _deliver(self, app_port, route, topic, data, event, attempt):
+        try:
+            http_status, reply = self._post(app_port, route, event)
+        except OSError:
+            status = 'RETRY'
+        else:
+            if http_status == 404:
+                status = 'DROP'
+            elif http_status >= 300:
+                status = 'RETRY'
+            else:
+                status = reply.get('status', 'SUCCESS') if isinstance(reply, dict) else 'SUCCESS'
+        self._settle(topic, data, status, attempt, partial(
+            self._delivery.submit, self._deliver, app_port, route, topic, data, event, attempt + 1
+        ))
+
+    def _add_bulk(self, app_port, subscription, item):
+        """Buffer a bulk entry until the batch is full or its wait is over"""
+        config = subscription['bulkSubscribe']
+        key = (app_port, subscription['route'])
+        with self._bulk_lock:
+            batch = self._bulk.setdefault(key, {'entries': [], 'timer': None})
+            batch['entries'].append(item)
+            if len(batch['entries']) >= config.get('maxMessagesCount', 100):
+                if batch['timer']:
+                    batch['timer'].cancel()
+                self._flush_bulk_locked(key, subscription)
+            elif batch['timer'] is None:
+                batch['timer'] = threading.Timer(
+                    config.get('maxAwaitDurationMs', 1000) / 1000,
+                    self._flush_bulk, (key, subscription)
+                )
+                batch['timer'].daemon = True
+                batch['timer'].start()
+
+    def _flush_bulk(self, key, subscription):
+        with self._bulk_lock:
+            self._flush_bulk_locked(key, subscription)
+
+    def _flush_bulk_locked(self, key, subscription):
+        batch = self._bulk.pop(key, None)
+        if batch and batch['entries']:
+            self._delivery.submit(self._deliver_bulk, key[0], subscription, batch['entries'])
+
+    def _deliver_bulk(self, app_port, subscription, items):
+        body = json.dumps({
+            'id': str(uuid.uuid4()),
+            'entries': [entry for entry, _, _, _ in items],
+            'metadata': {},
+            'topic': subscription['topic'],
+            'pubsubname': subscription.get('pubsubname'),
+            'type': 'com.dapr.event.sent'
+        })
+        try:
+            http_status, reply = self._post(app_port, subscription['route'], body)
+        except OSError:
+            http_status, reply = None, None
+        statuses = {}
+        if http_status is not None and http_status < 300 and isinstance(reply, dict):
+            statuses = {s.get('entryId'): s.get('status') for s in reply.get('statuses') or ()}
+        for entry, topic, data, attempt in items:
+            status = 'DROP' if http_status == 404 else statuses.get(entry['entryId'], 'RETRY')
+            self._settle(topic, data, status, attempt, partial(
+                self._add_bulk, app_port, subscription, (entry, topic, data, attempt + 1)
+            ))
+
+    def close(self):
+        with self._bulk_lock:
+            for batch in self._bulk.values():
+                if batch['timer']:
+                    batch['timer'].cancel()
+            self._bulk.clear()
+        self._delivery.shutdown(wait=False, cancel_futures=True)
+
+
+def _call_app(app_port, method, path, body=None):
+    """One HTTP request to an app; returns ``(http_status, body)``"""
+    conn = http.client.HTTPConnection('127.0.0.1', app_port, timeout=30)
+    try:
+        conn.request(method, path, body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+class FakeSidecar(dapr_pb2_grpc.DaprServicer):
+    """Dapr gRPC and HTTP API for one app, backed by a ``FakeDapr``.
+
+    ``store`` and ``published`` are the backend's; ``calls`` counts this
+    sidecar's requests per API method.
+    """
+
+    def __init__(self, dapr=None, app_id='app'):
+        self._owns_dapr = dapr is None
+        self.dapr = dapr or FakeDapr()
+        self.app_id = app_id
+        self.store = self.dapr.store
+        self.published = self.dapr.published
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._grpc_server = None
+        self._http_server = None
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def _stale_key(self, items):
+        """First item with a stale ETag or a first-write to an existing key, or None"""
+        first_write = common_pb2.StateOptions.CONCURRENCY_FIRST_WRITE
+        for item in items:
+            current = self.store.get(item.key, (b'', ''))[1]
+            deadline = self.dapr.expires.get(item.key)
+            if deadline is not None and deadline <= time.monotonic():
+                current = ''
+            if item.HasField('etag') and item.etag.value:
+                stale = item.etag.value != current
+            else:
+                stale = item.options.concurrency == first_write and bool(current)
+            if stale:
+                self._count('EtagMismatch')
+                return item.key
+        return None
+
+    def save(self, items, writes):
+        """Check ``items`` and apply ``(key, value)`` writes atomically.
+
+        Returns the key that failed its ETag check, or None once written.
+        """
+        self.dapr.delay('state_write')
+        ttls = {item.key: int(item.metadata['ttlInSeconds']) for item in items if 'ttlInSeconds' in item.metadata}
+        with self.dapr.lock:
+            stale = self._stale_key(items)
+            if stale is not None:
+                return stale
+            for key, value in writes:
+                if value is None:
+                    self.store.pop(key, None)
+                else:
+                    self.store[key] = (value, self.dapr.next_etag())
+                if key in ttls and value is not None:
+                    self.dapr.expires[key] = time.monotonic() + ttls[key]
+                else:
+                    self.dapr.expires.pop(key, None)
+        self.dapr.written(writes)
+        return None
+
+    def get(self, key):
+        self.dapr.delay('state_read')
+        return self.dapr.current(key)
+
+    def GetState(self, request, context):
+        self._count('GetState')
+        data, etag = self.get(request.key)
+        return dapr_pb2.GetStateResponse(data=data, etag=etag)
+
+    def GetBulkState(self, request, context):
+        self._count('GetBulkState')
+        self.dapr.delay('state_read')
+        items = []
+        for key in request.keys:
+            data, etag = self.dapr.current(key)
+            items.append(dapr_pb2.BulkStateItem(key=key, data=data, etag=etag))
+        return dapr_pb2.GetBulkStateResponse(items=items)
+
+    def SaveState(self, request, context):
+        self._count('SaveState')
+        stale = self.save(request.states, [(item.key, item.value) for item in request.states])
+        if stale is not None:
+            context.abort(grpc.StatusCode.ABORTED, f'possible etag mismatch for {stale}')
+        return empty_pb2.Empty()
+
+    def DeleteState(self, request, context):
+        self._count('DeleteState')
+        item = common_pb2.StateItem(key=request.key, etag=request.etag, options=request.options)
+        stale = self.save([item], [(request.key, None)])
+        if stale is not None:
+            context.abort(grpc.StatusCode.ABORTED, f'possible etag mismatch for {stale}')
+        return empty_pb2.Empty()
+
+    def ExecuteStateTransaction(self, request, context):
+        self._count('ExecuteStateTransaction')
+        stale = self.save(
+            [op.request for op in request.operations],
+            [
+                (op.request.key, None if op.operationType == 'delete' else op.request.value)
+                for op in request.operations
+            ]
+        )
+        if stale is not None:
+            context.abort(grpc.StatusCode.ABORTED, f'possible etag mismatch for {stale}')
+        return empty_pb2.Empty()
+
+    def publish(self, pubsub_name, topic, data, content_type):
+        self.dapr.delay('publish')
+        self.dapr.publish(pubsub_name, topic, data, content_type, self.app_id)
+
+    def PublishEvent(self, request, context):
+        self._count('PublishEvent')
+        self.publish(request.pubsub_name, request.topic, request.data, request.data_content_type)
+        return empty_pb2.Empty()
+
+    def BulkPublishEventAlpha1(self, request, context):
+        self._count('BulkPublishEventAlpha1')
+        self.dapr.delay('publish')
+        for entry in request.entries:
+            self.dapr.publish(request.pubsub_name, request.topic, entry.event, entry.content_type, self.app_id)
+        return dapr_pb2.BulkPublishResponse()
+
+    def InvokeActor(self, request, context):
+        self._count('InvokeActor')
+        try:
+            status, body = self.dapr.invoke_actor(request.actor_type, request.actor_id, request.method, request.data)
+        except KeyError:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'no app hosts actor type {request.actor_type}')
+        if status >= 300:
+            context.abort(grpc.StatusCode.INTERNAL, body.decode('utf-8', 'replace'))
+        return dapr_pb2.InvokeActorResponse(data=body)
+
+    def actor_state_key(self, actor_type, actor_id, name):
+        return f'{self.app_id}||{actor_type}||{actor_id}||{name}'
+
+    def start(self, grpc_port=0, http_port=0, max_workers=32):
+        """Start serving and return ``(grpc_port, http_port)``"""
+        self._grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        dapr_pb2_grpc.add_DaprServicer_to_server(self, self._grpc_server)
+        grpc_port = self._grpc_server.add_insecure_port(f'127.0.0.1:{grpc_port}')
+        self._grpc_server.start()
+
+        handler = type('HttpApiHandler', (_HttpApiHandler,), {'sidecar': self})
+        self._http_server = ThreadingHTTPServer(('127.0.0.1', http_port), handler)
+        threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+        return grpc_port, self._http_server.server_address[1]
+
+    def connect_app(self, app_port, timeout=30):
+        """Read the app's ``/dapr/subscribe`` and deliver its topics to it.
+
+        Waits up to ``timeout`` seconds (forever if None) for the app.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', app_port, timeout=5)
+                conn.request('GET', '/dapr/subscribe')
+                subscriptions = json.loads(conn.getresponse().read() or b'[]')
+                conn.close()
+                break
+            except OSError:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.dapr.subscribe(app_port, subscriptions)
+        self.dapr.apps[self.app_id] = app_port
+
+        status, config = _call_app(app_port, 'GET', '/dapr/config')
+        if status == 200:
+            self.dapr.host_actors(app_port, json.loads(config))
+        return subscriptions
+
+    def stop(self):
+        if self._grpc_server:
+            self._grpc_server.stop(grace=None)
+        if self._http_server:
+            self._http_server.shutdown()
+        if self._owns_dapr:
+            self.dapr.close()
+
+
+class _HttpApiHandler(BaseHTTPRequestHandler):
+    """Health, state and publish endpoints of the Dapr HTTP API"""
+
+    sidecar = None
+    protocol_version = 'HTTP/1.1'
+
+    STATE_KEY = re.compile(r'^/v1\.0/state/[^/]+/(?P<key>[^/?]+)')
+    INVOKE = re.compile(r'^/v1\.0/invoke/(?P<app_id>[^/]+)/method(?P<path>/.*)')
+    ACTOR_STATE = re.compile(r'^/v1\.0/actors/(?P<type>[^/]+)/(?P<id>[^/]+)/state(/(?P<name>[^/?]+))?')
+    STATE = re.compile(r'^/v1\.0/state/[^/?]+/?(\?|$)')
+    PUBLISH = re.compile(r'^/v1\.0/publish/(?P<pubsub>[^/]+)/(?P<topic>[^/?]+)')
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message):
+        """Reply with Dapr's JSON error body"""
+        self._reply(status, json.dumps({'errorCode': code, 'message': message}).encode('utf-8'))
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _invoke(self, method):
+        match = self.INVOKE.match(self.path)
+        app_port = self.sidecar.dapr.apps.get(match.group('app_id'))
+        if app_port is None:
+            return self._error(500, 'ERR_DIRECT_INVOKE', 'app not found')
+        self.sidecar._count('HttpInvoke')
+        status, body = _call_app(app_port, method, match.group('path'), self._body() if method != 'GET' else None)
+        self._reply(status, body, {'Content-Type': 'application/json'})
+
+    def do_GET(self):
+        if self.path.startswith('/v1.0/healthz'):
+            return self._reply(204)
+        if self.INVOKE.match(self.path):
+            return self._invoke('GET')
+        match = self.ACTOR_STATE.match(self.path)
+        if match and match.group('name'):
+            self.sidecar._count('HttpGetActorState')
+            data, etag = self.sidecar.get(self.sidecar.actor_state_key(*match.group('type', 'id', 'name')))
+            return self._reply(200, data) if etag else self._reply(204)
+        match = self.STATE_KEY.match(self.path)
+        if not match:
+            return self._reply(404)
+        self.sidecar._count('HttpGetState')
+        data, etag = self.sidecar.get(match.group('key'))
+        if not etag:
+            return self._reply(204)
+        self._reply(200, data, {'Content-Type': 'application/json', 'ETag': etag})
+
+    def do_POST(self):
+        if self.INVOKE.match(self.path):
+            return self._invoke('POST')
+        if self.STATE.match(self.path):
+            return self._save_state()
+        match = self.PUBLISH.match(self.path)
+        if not match:
+            return self._reply(404)
+        self.sidecar._count('HttpPublishEvent')
+        self.sidecar.publish(
+            match.group('pubsub'), match.group('topic'), self._body(),
+            self.headers.get('Content-Type', 'application/json')
+        )
+        self._reply(204)
+
+    def do_PUT(self):
+        match = self.ACTOR_STATE.match(self.path)
+        if not match:
+            return self._reply(404)
+        self.sidecar._count('HttpActorStateTransaction')
+        writes = []
+        for op in json.loads(self._body()):
+            key = self.sidecar.actor_state_key(match.group('type'), match.group('id'), op['request']['key'])
+            value = json.dumps(op['request']['value']).encode('utf-8') if op['operation'] == 'upsert' else None
+            writes.append((key, value))
+        self.sidecar.save([], writes)
+        self._reply(204)
+
+    def _save_state(self):
+        self.sidecar._count('HttpSaveState')
+        try:
+            states = json.loads(self._body())
+            items = []
+            for state in states:
+                value = state['value']
+                items.append(common_pb2.StateItem(
+                    key=state['key'],
+                    value=value.encode('utf-8') if isinstance(value, str) else json.dumps(value).encode('utf-8'),
+                    etag=common_pb2.Etag(value=state['etag']) if state.get('etag') else None,
+                    metadata={name: str(value) for name, value in (state.get('metadata') or {}).items()},
+                    options=common_pb2.StateOptions(
+                        concurrency=common_pb2.StateOptions.CONCURRENCY_FIRST_WRITE
+                        if (state.get('options') or {}).get('concurrency') == 'first-write'
+                        else common_pb2.StateOptions.CONCURRENCY_LAST_WRITE
+                    )
+                ))
+        except (ValueError, TypeError, KeyError) as e:
+            return self._error(400, 'ERR_MALFORMED_REQUEST', str(e))
+        stale = self.sidecar.save(items, [(item.key, item.value) for item in items])
+        if stale is not None:
+            return self._error(409, 'ERR_STATE_SAVE', f'possible etag mismatch for {stale}')
+        self._reply(204)
+
+    def log_message(self, *args):
+        pass
+
+
+def point_dapr_sdk_at(grpc_port, http_port):
+    """Make new ``DaprClient`` instances connect to the given ports"""
+    from dapr.conf import settings
+    settings.DAPR_RUNTIME_HOST = '127.0.0.1'
+    settings.DAPR_GRPC_PORT = grpc_port
+    settings.DAPR_HTTP_PORT = http_port
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Dapr sidecars for the three services, sharing one store')
+    parser.add_argument('--latency', nargs='*', default=[], metavar='KIND=MS',
+                        help=f"injected latency per call, kinds: {', '.join(LATENCY_KINDS)}")
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency variation, as a fraction')
+    args = parser.parse_args()
+
+    dapr = FakeDapr(latency=parse_latency(args.latency), jitter=args.jitter)
+    sidecars = []
+    for app_id, app_port, grpc_port, http_port in DEFAULT_APPS:
+        sidecar = FakeSidecar(dapr, app_id=app_id)
+        sidecar.start(grpc_port, http_port)
+        sidecars.append(sidecar)
+        threading.Thread(target=sidecar.connect_app, args=(app_port, None), daemon=True).start()
+        print(
+            f"🧪 {app_id}: DAPR_GRPC_PORT={grpc_port} DAPR_HTTP_PORT={http_port}, delivering to port {app_port}",
+            flush=True
+        )
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sidecar in sidecars:
+            sidecar.stop()
+        dapr.close()
+
+
+if __name__ == '__main__':
+    main()
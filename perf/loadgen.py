@@ -0,0 +1,470 @@
+"""End-to-end load generator for the three services.
+
+Runs the real order, kitchen and bar services as subprocesses, each against
+its own fake sidecar on one shared in-memory state store and pub/sub (see
+fake_sidecar.py), so the whole order loop runs without Redis or Dapr. Orders
+are placed through ``POST /api/orders`` at a fixed rate, or replayed from a
+JSONL file, while clients poll the board. Every order is followed through
+the sidecars until it is stored as ready.
+
+Prints (and with ``--output`` saves) a JSON report with the git commit:
+throughput, order-to-ready latency percentiles, request latencies and these
+per-stage timings:
+
+    state_save   POST sent -> order-{id} written
+    publish      order written -> last station event published
+    delivery     station event published -> accepted by the station
+    prep         accepted by a station -> its completion published
+    completion   last completion published -> order stored as ready
+
+``--latency`` injects sidecar latency per kind of call, ``--bulk`` runs
+the services with bulk subscribe, ``--encoding`` sets their
+PAYLOAD_ENCODING, ``--actors`` keeps orders in order actors,
+``--retention``/``--archive`` expire and archive finished orders and
+``--max-backlog``/``--max-open`` turn on admission control. The report
+counts the bytes of order state and events written per order, and orders
+turned away apart from failures. The exit status is 1 when an order failed
+or never became ready, so a short run works as a CI check of the loop.
+
+``--compare`` adds the change against an earlier report::
+
+    python perf/loadgen.py --rate 10 --duration 30 --output before.json
+    python perf/loadgen.py --rate 10 --duration 30 --compare before.json
+
+Replay files hold one order per line, ``{"customer_name": ..., "items":
+[...], "at": seconds}``; ``at`` is the offset from the start and defaults
+to the ``--rate`` schedule.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent import futures
+from urllib.parse import urlencode
+
+import _support
+from fake_sidecar import FakeDapr, FakeSidecar, LATENCY_KINDS, parse_latency
+
+codec = _support.load_service('order-service', 'codec')
+
+SERVICES = ('order-service', 'kitchen-service', 'bar-service')
+STATION_TOPICS = {'kitchen-orders': 'kitchen-completed', 'bar-orders': 'bar-completed'}
+DEFAULT_ITEMS = (['Classic Burger', 'IPA'], ['Double Bacon Burger'], ['Veggie Burger', 'Lager', 'Stout'], ['Wheat Beer'])
+ORDER_ID_RE = re.compile(r'Order #(\w+) placed')
+TURNED_AWAY_RE = re.compile(r'try again in (\d+) s')
+ARCHIVE_INTERVAL = 0.5
+ORDER_KEY = re.compile(r'^order-[0-9a-f]{8}$|\|\|OrderActor\|\|')
+ACTOR_STATE_KEY = re.compile(r'\|\|OrderActor\|\|(?P<order_id>\w+)\|\|order$')
+
+
+class OrderTracker:
+    """Timestamps of every order's way through the pipeline, fed by sidecar hooks"""
+
+    def __init__(self, dapr):
+        self.orders = {}
+        self.bytes = {'order_state': 0, 'events': 0}
+        self._lock = threading.Lock()
+        dapr.on_write.append(self.written)
+        dapr.on_publish.append(self.published)
+        dapr.on_deliver.append(self.delivered)
+
+    def _mark(self, order_id, stage, first=True):
+        now = time.monotonic()
+        with self._lock:
+            times = self.orders.setdefault(order_id, {})
+            if not first or stage not in times:
+                times[stage] = now
+
+    def sent(self, order_id, sent_at):
+        with self._lock:
+            self.orders.setdefault(order_id, {})['sent'] = sent_at
+
+    def written(self, key, value):
+        actor = ACTOR_STATE_KEY.search(key)
+        if value is None or not (key.startswith('order-') or actor):
+            return
+        try:
+            order = codec.decode(value)
+        except ValueError:
+            return
+        order_id = actor.group('order_id') if actor else key[len('order-'):]
+        if not isinstance(order, dict) or order.get('order_id') != order_id:
+            return
+        with self._lock:
+            self.bytes['order_state'] += len(value)
+        self._mark(order['order_id'], 'saved')
+        if _is_ready(order):
+            self._mark(order['order_id'], 'ready')
+
+    def published(self, topic, data):
+        with self._lock:
+            self.bytes['events'] += len(data)
+        event = codec.decode(data)
+        order_id = event.get('order_id')
+        if topic in STATION_TOPICS.values():
+            # Stations announce an ETA on the completion topic before the completion itself
+            with self._lock:
+                times = self.orders.setdefault(order_id, {})
+                for field in ('estimated_ready_at', 'completed_at'):
+                    if field in event:
+                        times.setdefault(f'{field}:{topic}', event[field])
+            if 'completed_at' not in event:
+                return
+        if topic in STATION_TOPICS or topic in STATION_TOPICS.values():
+            self._mark(order_id, f'published:{topic}')
+
+    def delivered(self, topic, data, status):
+        if status == 'SUCCESS' and topic in STATION_TOPICS:
+            self._mark(codec.decode(data).get('order_id'), f'accepted:{topic}', first=False)
+
+    def stages(self, order_ids):
+        """``{stage: [seconds, ...]}`` over the given orders"""
+        stages = {name: [] for name in ('order_to_ready', 'state_save', 'publish', 'delivery', 'prep', 'completion', 'eta_late')}
+        with self._lock:
+            orders = [self.orders.get(order_id, {}) for order_id in order_ids]
+        for t in orders:
+            if 'sent' in t and 'ready' in t:
+                stages['order_to_ready'].append(t['ready'] - t['sent'])
+            if 'sent' in t and 'saved' in t:
+                stages['state_save'].append(t['saved'] - t['sent'])
+            station_published = [t[f'published:{topic}'] for topic in STATION_TOPICS if f'published:{topic}' in t]
+            if 'saved' in t and station_published:
+                stages['publish'].append(max(station_published) - t['saved'])
+            for topic, completed_topic in STATION_TOPICS.items():
+                published, accepted = t.get(f'published:{topic}'), t.get(f'accepted:{topic}')
+                completed = t.get(f'published:{completed_topic}')
+                if published and accepted:
+                    stages['delivery'].append(accepted - published)
+                if accepted and completed:
+                    stages['prep'].append(completed - accepted)
+                estimated, completed_at = t.get(f'estimated_ready_at:{completed_topic}'), t.get(f'completed_at:{completed_topic}')
+                if estimated and completed_at:
+                    stages['eta_late'].append(completed_at - estimated)
+            completions = [t[f'published:{topic}'] for topic in STATION_TOPICS.values() if f'published:{topic}' in t]
+            if completions and 'ready' in t:
+                stages['completion'].append(t['ready'] - max(completions))
+        return stages
+
+    def is_ready(self, order_id):
+        with self._lock:
+            return 'ready' in self.orders.get(order_id, {})
+
+
+def _is_ready(order):
+    """Whether every station the order needs has marked it ready"""
+    return (
+        (bool(order.get('burgers')) or bool(order.get('beers')))
+        and (not order.get('burgers') or order.get('kitchen_status') == 'ready')
+        and (not order.get('beers') or order.get('bar_status') == 'ready')
+    )
+
+
+def load_schedule(args):
+    """``[(offset_seconds, customer_name, items)]`` from ``--replay`` or ``--rate``"""
+    if args.replay:
+        schedule = []
+        with open(args.replay) as f:
+            for n, line in enumerate(line for line in f if line.strip()):
+                order = json.loads(line)
+                schedule.append((
+                    float(order.get('at', n / args.rate)),
+                    order.get('customer_name', f'replay{n}'),
+                    order['items']
+                ))
+        return sorted(schedule, key=lambda entry: entry[0])
+    count = int(args.rate * args.duration)
+    return [(n / args.rate, f'load{n}', DEFAULT_ITEMS[n % len(DEFAULT_ITEMS)]) for n in range(count)]
+
+
+class Client:
+    """Keep-alive HTTP connection per thread, timing each request"""
+
+    def __init__(self, port):
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self._local, 'conn', None) or http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        self._local.conn = conn
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers or {})
+            response = conn.getresponse()
+            text = response.read().decode('utf-8')
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            conn.close()
+            raise
+        return response.status, text, time.perf_counter() - start
+
+
+def place_orders(client, tracker, schedule, workers):
+    """Open-loop placement: each order goes out at its offset however slow earlier ones are"""
+    posts, placed, failures, turned_away = [], [], [], []
+    lock = threading.Lock()
+
+    def place(customer_name, items):
+        body = urlencode({'customer_name': customer_name, 'items': items}, doseq=True)
+        sent_at = time.monotonic()
+        try:
+            status, text, seconds = client.request(
+                'POST', '/api/orders', body, {'Content-Type': 'application/x-www-form-urlencoded'}
+            )
+        except (OSError, http.client.HTTPException) as e:
+            with lock:
+                failures.append(str(e))
+            return
+        match = ORDER_ID_RE.search(text)
+        with lock:
+            posts.append(seconds)
+            if status == 200 and match:
+                placed.append(match.group(1))
+            elif status == 200 and TURNED_AWAY_RE.search(text):
+                turned_away.append(int(TURNED_AWAY_RE.search(text).group(1)))
+            else:
+                failures.append(text.strip()[:200])
+        if match:
+            tracker.sent(match.group(1), sent_at)
+
+    start = time.monotonic()
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for offset, customer_name, items in schedule:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(place, customer_name, items)
+    return posts, placed, failures, turned_away, time.monotonic() - start
+
+
+def poll_board(client, stop, interval, samples):
+    while not stop.is_set():
+        try:
+            status, _, seconds = client.request('GET', '/api/orders')
+            samples.append((status, seconds))
+        except (OSError, http.client.HTTPException):
+            samples.append((None, 0.0))
+        stop.wait(interval)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=_support.REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Change of each latency percentile against an earlier report"""
+    changes = {}
+    sections = {'order_to_ready': report['order_to_ready'], 'post': report['post'], 'board_poll': report['board_poll']}
+    sections.update({f'stages.{name}': values for name, values in report['stages'].items()})
+    for section, values in sections.items():
+        before_values = baseline
+        for part in section.split('.'):
+            before_values = before_values.get(part, {})
+        for metric in ('p50_ms', 'p90_ms', 'p99_ms'):
+            before, after = before_values.get(metric), values.get(metric)
+            if before and after is not None:
+                changes[f'{section}.{metric}'] = {
+                    'before': before, 'after': after, 'change_pct': round((after - before) / before * 100, 1)
+                }
+    before, after = baseline['throughput']['ready_per_second'], report['throughput']['ready_per_second']
+    if before:
+        changes['throughput.ready_per_second'] = {
+            'before': before, 'after': after, 'change_pct': round((after - before) / before * 100, 1)
+        }
+    return {'baseline_commit': baseline.get('commit'), 'changes': changes}
+
+
+def count_archived(path):
+    """Orders in an archive written by the order service, None without one"""
+    if not path or not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt') as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=10, help='orders per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of order placement')
+    parser.add_argument('--replay', help='JSONL file of orders to place instead of the --rate schedule')
+    parser.add_argument('--pollers', type=int, default=4, help='clients polling the board')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--server', choices=('app', 'asgi'), default='app', help='serving mode of the services')
+    parser.add_argument('--prep-scale', type=float, default=0.1, help='PREP_TIME_SCALE for the stations')
+    parser.add_argument('--stations', type=int, help='STATION_COUNT for the stations')
+    parser.add_argument('--bulk', action='store_true', help='run the services with BULK_SUBSCRIBE')
+    parser.add_argument('--latency', nargs='*', default=[], metavar='KIND=MS',
+                        help=f"injected sidecar latency per call, kinds: {', '.join(LATENCY_KINDS)}")
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency variation, as a fraction')
+    parser.add_argument('--publish-window', type=float, default=0, metavar='MS',
+                        help="order-service PUBLISH_BATCH_WINDOW_MS, 0 for no bulk publish")
+    parser.add_argument('--encoding', choices=tuple(codec.CONTENT_TYPES), default='json',
+                        help='PAYLOAD_ENCODING for the services')
+    parser.add_argument('--actors', action='store_true', help='run the order service with ORDER_ACTORS')
+    parser.add_argument('--retention', type=int, default=0, metavar='SECONDS',
+                        help='ORDER_RETENTION_SECONDS for the order service, 0 keeps orders')
+    parser.add_argument('--archive', metavar='PATH', help='ORDER_ARCHIVE_PATH for the order service')
+    parser.add_argument('--max-backlog', type=float, default=0, metavar='SECONDS',
+                        help='order-service ADMISSION_MAX_BACKLOG_SECONDS, 0 admits every order')
+    parser.add_argument('--max-open', type=int, default=0, help='order-service ADMISSION_MAX_OPEN_ORDERS')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='share of events delivered twice')
+    parser.add_argument('--drain', type=float, default=60, help='seconds to wait for placed orders to be ready')
+    parser.add_argument('--base-port', type=int, default=5201)
+    parser.add_argument('--workers', type=int, default=64, help='concurrent order placements')
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    args = parser.parse_args()
+
+    schedule = load_schedule(args)
+    dapr = FakeDapr(delivery_workers=64, latency=parse_latency(args.latency), jitter=args.jitter,
+                    duplicates=args.duplicates)
+    tracker = OrderTracker(dapr)
+    service_env = {'PAYLOAD_ENCODING': args.encoding}
+    if args.bulk:
+        service_env['BULK_SUBSCRIBE'] = 'true'
+    order_env = dict(service_env, PUBLISH_BATCH_WINDOW_MS=str(args.publish_window))
+    if args.actors:
+        order_env['ORDER_ACTORS'] = 'true'
+    if args.max_backlog:
+        order_env['ADMISSION_MAX_BACKLOG_SECONDS'] = str(args.max_backlog)
+    if args.max_open:
+        order_env['ADMISSION_MAX_OPEN_ORDERS'] = str(args.max_open)
+    if args.retention:
+        order_env['ORDER_RETENTION_SECONDS'] = str(args.retention)
+    if args.archive:
+        order_env['ORDER_ARCHIVE_PATH'] = os.path.abspath(args.archive)
+        order_env['ORDER_ARCHIVE_INTERVAL'] = str(ARCHIVE_INTERVAL)
+    # Progress events keep the pace they have against unscaled prep times
+    station_env = dict(service_env, PREP_TIME_SCALE=str(args.prep_scale), PROGRESS_INTERVAL=str(args.prep_scale))
+    if args.stations:
+        station_env['STATION_COUNT'] = str(args.stations)
+
+    sidecars, procs = [], []
+    try:
+        for n, service in enumerate(SERVICES):
+            port = args.base_port + n
+            sidecar = FakeSidecar(dapr, app_id=service)
+            sidecars.append(sidecar)
+            procs.append(_support.start_service(
+                service, args.server, port, sidecar.start(max_workers=64),
+                extra_env=order_env if service == 'order-service' else station_env
+            ))
+            sidecar.connect_app(port)
+
+        client = Client(args.base_port)
+        stop, polls = threading.Event(), []
+        pollers = [
+            threading.Thread(target=poll_board, args=(client, stop, args.poll_interval, polls))
+            for _ in range(args.pollers)
+        ]
+        for t in pollers:
+            t.start()
+        start = time.monotonic()
+        posts, placed, failures, turned_away, placing_seconds = place_orders(client, tracker, schedule, args.workers)
+
+        deadline = time.monotonic() + args.drain
+        while time.monotonic() < deadline and not all(tracker.is_ready(order_id) for order_id in placed):
+            time.sleep(0.1)
+        if args.archive:
+            # The services are killed without a chance to flush their archive queue
+            time.sleep(2 * ARCHIVE_INTERVAL)
+        stop.set()
+        for t in pollers:
+            t.join()
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+        for sidecar in sidecars:
+            sidecar.stop()
+        dapr.close()
+
+    stages = tracker.stages(placed)
+    ready = [order_id for order_id in placed if tracker.is_ready(order_id)]
+    last_ready = max((tracker.orders[order_id]['ready'] for order_id in ready), default=start)
+    report = {
+        'commit': git_commit(),
+        'config': {
+            'server': args.server,
+            'rate': args.rate,
+            'duration': args.duration,
+            'replay': os.path.basename(args.replay) if args.replay else None,
+            'pollers': args.pollers,
+            'poll_interval': args.poll_interval,
+            'prep_scale': args.prep_scale,
+            'stations': args.stations,
+            'bulk_subscribe': args.bulk,
+            'encoding': args.encoding,
+            'publish_window_ms': args.publish_window,
+            'order_actors': args.actors,
+            'retention_seconds': args.retention,
+            'archive': bool(args.archive),
+            'max_backlog_seconds': args.max_backlog,
+            'max_open_orders': args.max_open,
+            'latency_ms': {kind: seconds * 1000 for kind, seconds in dapr.latency.items()},
+            'jitter': args.jitter,
+            'duplicates': args.duplicates
+        },
+        'orders': {
+            'scheduled': len(schedule),
+            'placed': len(placed),
+            'failed': len(failures),
+            'turned_away': len(turned_away),
+            'ready': len(ready),
+            'not_ready': len(placed) - len(ready)
+        },
+        'throughput': {
+            'placed_per_second': round(len(placed) / placing_seconds, 2) if placing_seconds else 0,
+            'ready_per_second': round(len(ready) / (last_ready - start), 2) if last_ready > start else 0
+        },
+        'order_to_ready': _support.percentiles(stages.pop('order_to_ready')),
+        'post': _support.percentiles(posts),
+        'board_poll': {
+            'requests': len(polls),
+            'errors': sum(1 for status, _ in polls if status != 200),
+            **_support.percentiles([seconds for status, seconds in polls if status == 200])
+        },
+        'stages': {name: _support.percentiles(samples) for name, samples in stages.items()},
+        'bytes_per_order': {
+            kind: round(total / len(placed)) if placed else 0 for kind, total in tracker.bytes.items()
+        },
+        'state': {
+            'orders_stored': sum(1 for key in list(dapr.store) if ORDER_KEY.search(key) and dapr.current(key)[1]),
+            'expired': dapr.expired,
+            'orders_archived': count_archived(args.archive)
+        },
+        'sidecar': {
+            'deliveries': dict(dapr.deliveries),
+            'duplicated': dapr.duplicated,
+            'actor_deactivations': dapr.deactivations,
+            'calls': {sidecar.app_id: dict(sidecar.calls) for sidecar in sidecars}
+        }
+    }
+    if failures:
+        report['orders']['failure_samples'] = failures[:5]
+    if args.compare:
+        with open(args.compare) as f:
+            report['compare'] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    # Non-zero exit for CI when the loop lost or stalled an order
+    return 1 if failures or len(ready) < len(placed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
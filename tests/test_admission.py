@@ -0,0 +1,68 @@
+"""Admission control in orders.py: a slow load refresh must not hold up the
+orders that can use the last reading.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'order-service'))
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+
+import orders
+
+ORDER = {'burgers': ['Classic Burger'], 'beers': []}
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.station_reads = threading.Event()
+        self.release_station = threading.Event()
+        self.addCleanup(self.release_station.set)
+
+        def slow_backlog(client, station):
+            self.station_reads.set()
+            self.release_station.wait(10)
+            return 0.0
+
+        for name, value in (
+            ('ADMISSION_MAX_BACKLOG_SECONDS', 30.0),
+            ('ADMISSION_MAX_OPEN_ORDERS', 0),
+            ('ADMISSION_CHECK_INTERVAL', 60.0),
+            ('_load', (time.monotonic() - 120, {'kitchen': 0.0, 'bar': 0.0}, None)),
+            ('_admitted_since_load', 0),
+            ('_read_station_backlog', slow_backlog),
+            ('get_dapr_client', lambda: None)
+        ):
+            patcher = mock.patch.object(orders, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_orders_are_admitted_while_a_refresh_waits_on_a_station(self):
+        refresh = threading.Thread(target=orders._admit, args=(ORDER,))
+        refresh.start()
+        self.addCleanup(refresh.join)
+        self.assertTrue(self.station_reads.wait(5))
+
+        started = time.monotonic()
+        for _ in range(10):
+            self.assertIsNone(orders._admit(ORDER))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(orders._admitted_since_load, 10)
+
+        # Orders taken during the refresh still count after it lands, and
+        # so does the order that did the refresh
+        self.release_station.set()
+        refresh.join(5)
+        self.assertEqual(orders._admitted_since_load, 11)
+        self.assertGreater(orders._load[0], started)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Payload encodings (codec.py): every value must come back as it was written,
+whichever encoding wrote it.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'order-service'))
+
+import codec
+
+ORDER = {
+    'order_id': 'ab12cd34',
+    'customer_name': 'Zoë',
+    'burgers': ['Classic Burger', 'Veggie Burger'],
+    'beers': ['IPA', 'IPA', 'Pale Ale'],
+    'status': 'preparing',
+    'created_at': '2026-10-17T12:00:00',
+    'kitchen_status': 'preparing',
+    'kitchen_eta': 1234.5,
+    'kitchen_items_done': {'Classic Burger': 1},
+    'bar_status': 'pending',
+    'bar_items_done': {'IPA': 2, 'Pale Ale': 0},
+    'progress': {'ab12cd34': {'IPA': 1, 'Pale Ale': 1}},
+    'table': 7
+}
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_round_trip_in_each_encoding(self):
+        for encoding in codec.CONTENT_TYPES:
+            content_type = codec.content_type(encoding)
+            with self.subTest(encoding=encoding):
+                data = codec.encode(ORDER, content_type)
+                self.assertEqual(codec.decode(data, content_type), ORDER)
+                # State values are read back without their content type
+                self.assertEqual(codec.decode(data), ORDER)
+
+    def test_json_read_back_as_bytes_is_sniffed(self):
+        self.assertEqual(codec.decode(codec.encode(ORDER).encode('utf-8')), ORDER)
+        self.assertEqual(codec.decode(b' ' + json.dumps(ORDER).encode('utf-8')), ORDER)
+
+    def test_parsed_event_body_is_returned_as_is(self):
+        self.assertIs(codec.decode(ORDER, codec.MSGPACK), ORDER)
+
+    def test_msgpack_is_smaller(self):
+        self.assertLess(len(codec.encode(ORDER, codec.MSGPACK)), len(codec.encode(ORDER).encode('utf-8')))
+
+    def test_code_tables_only_grow(self):
+        # Stored orders and in-flight events refer to these by position
+        self.assertEqual(codec.MENU[:3], ('Classic Burger', 'Double Bacon Burger', 'Veggie Burger'))
+        self.assertEqual(codec.FIELDS[:5], ('order_id', 'customer_name', 'burgers', 'beers', 'items'))
+
+    def test_unknown_encoding_is_rejected(self):
+        self.assertEqual(codec.content_type('MsgPack'), codec.MSGPACK)
+        with self.assertRaises(ValueError):
+            codec.content_type('protobuf')
+
+
+if __name__ == '__main__':
+    unittest.main()
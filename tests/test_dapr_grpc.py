@@ -0,0 +1,124 @@
+"""The order service's direct Dapr gRPC calls (dapr_grpc.py) against the
+fake sidecar, so an SDK upgrade that breaks them shows up here.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'order-service'), os.path.join(REPO_ROOT, 'perf')]
+
+import dapr_grpc
+from dapr.clients import DaprClient
+from fake_sidecar import FakeSidecar, point_dapr_sdk_at
+
+STORE = 'statestore'
+
+
+class EchoActorApp(BaseHTTPRequestHandler):
+    """An app hosting actors that reply with the path and body of each call"""
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        reply = json.dumps({'path': self.path, 'body': body.decode('utf-8')}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+class DaprGrpcTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sidecar = FakeSidecar()
+        point_dapr_sdk_at(*cls.sidecar.start())
+        cls.client = DaprClient()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.sidecar.stop()
+
+    def test_bulk_publish(self):
+        failed = dapr_grpc.bulk_publish(
+            self.client, 'orderpubsub', 'bulk-test', [('1', b'{"n": 1}'), ('2', '{"n": 2}')], 'application/json'
+        )
+        self.assertEqual(failed, set())
+        self.assertEqual(
+            [data for topic, data in self.sidecar.published if topic == 'bulk-test'],
+            [b'{"n": 1}', b'{"n": 2}']
+        )
+
+    def test_transaction_writes_with_etags_and_per_operation_ttl(self):
+        self.client.save_state(STORE, 'tx-guarded', 'old')
+        etag = self.client.get_state(STORE, 'tx-guarded').etag
+
+        dapr_grpc.execute_state_transaction(self.client, STORE, [
+            ('tx-guarded', 'new', etag, {}),
+            ('tx-kept', b'kept', None, {}),
+            ('tx-expiring', b'gone', None, {'ttlInSeconds': '0'})
+        ])
+
+        self.assertEqual(self.client.get_state(STORE, 'tx-guarded').data, b'new')
+        self.assertEqual(self.client.get_state(STORE, 'tx-kept').data, b'kept')
+        self.assertEqual(self.client.get_state(STORE, 'tx-expiring').data, b'')
+
+    def test_transaction_with_a_stale_etag_writes_nothing(self):
+        self.client.save_state(STORE, 'tx-stale', 'v1')
+        etag = self.client.get_state(STORE, 'tx-stale').etag
+        self.client.save_state(STORE, 'tx-stale', 'v2')
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            dapr_grpc.execute_state_transaction(self.client, STORE, [
+                ('tx-other', 'written?', None, {}),
+                ('tx-stale', 'v3', etag, {})
+            ])
+
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.ABORTED)
+        self.assertEqual(self.client.get_state(STORE, 'tx-stale').data, b'v2')
+        self.assertEqual(self.client.get_state(STORE, 'tx-other').data, b'')
+
+    def test_first_write_transaction_to_an_existing_key_writes_nothing(self):
+        self.client.save_state(STORE, 'tx-claimed', 'first')
+        upserts = [('tx-new', '1', None, {}), ('tx-claimed', '1', None, {})]
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            dapr_grpc.execute_state_transaction(self.client, STORE, upserts, first_write=True)
+
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.ABORTED)
+        self.assertEqual(self.client.get_state(STORE, 'tx-claimed').data, b'first')
+        self.assertEqual(self.client.get_state(STORE, 'tx-new').data, b'')
+
+        dapr_grpc.execute_state_transaction(self.client, STORE, upserts[:1], first_write=True)
+        self.assertEqual(self.client.get_state(STORE, 'tx-new').data, b'1')
+
+    def test_invoke_actor(self):
+        app = ThreadingHTTPServer(('127.0.0.1', 0), EchoActorApp)
+        threading.Thread(target=app.serve_forever, daemon=True).start()
+        self.addCleanup(app.server_close)
+        self.addCleanup(app.shutdown)
+        self.sidecar.dapr.host_actors(app.server_address[1], {'entities': ['EchoActor']})
+
+        reply = dapr_grpc.invoke_actor(self.client, 'EchoActor', 'a1', 'Echo', b'{"x": 1}')
+
+        self.assertEqual(json.loads(reply), {'path': '/actors/EchoActor/a1/method/Echo', 'body': '{"x": 1}'})
+
+    def test_invoke_actor_of_an_unhosted_type_raises(self):
+        with self.assertRaises(grpc.RpcError):
+            dapr_grpc.invoke_actor(self.client, 'NoSuchActor', 'a1', 'Echo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Paging through the recent-orders index (order_index.py) with the reads
+kept in a dict, as orders.py does them against the state store.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'order-service'))
+
+import order_index
+
+SHARDS = 3
+PAGE_SIZE = 4
+
+
+class IndexStore:
+    """Appends entries to the index layout and reads it back page by page"""
+
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+        self.count = 0
+
+    def add(self, count):
+        for _ in range(count):
+            self.count += 1
+            # Entries land slightly out of time order, as from several writers
+            created_at = f"{self.count * 10 + (self.count % 3) * 7:06d}"
+            shard = self.count % SHARDS
+            head, sealed = order_index.append(
+                self.data.get(order_index.head_key(shard)), [(created_at, f"o{self.count}")], PAGE_SIZE
+            )
+            if sealed:
+                self.data[order_index.page_key(shard, sealed[0])] = sealed[1]
+            self.data[order_index.head_key(shard)] = head
+
+    def newest_first(self):
+        entries = [tuple(entry) for doc in self.data.values() for entry in json.loads(doc)['entries']]
+        return [order_id for _, order_id in sorted(entries, reverse=True)]
+
+    def page(self, limit, cursor=None):
+        start = order_index.decode_cursor(cursor) if cursor else None
+        reader = order_index.RecentReader(SHARDS, limit, start)
+        keys = reader.first_keys()
+        while keys:
+            self.reads += 1
+            reader.add({key: self.data[key] for key in keys if key in self.data})
+            keys = reader.next_keys()
+        return reader.result()
+
+    def list_all(self, limit, between_pages=None):
+        order_ids, cursor = self.page(limit)
+        while cursor:
+            if between_pages:
+                between_pages()
+            more, cursor = self.page(limit, cursor)
+            order_ids += more
+        return order_ids
+
+
+class RecentReaderTest(unittest.TestCase):
+
+    def test_pages_list_every_entry_once_in_order(self):
+        store = IndexStore()
+        store.add(53)
+        self.assertEqual(store.list_all(5), store.newest_first())
+
+    def test_later_pages_resume_instead_of_starting_at_the_heads(self):
+        store = IndexStore()
+        store.add(53)
+        store.list_all(5)
+        resumed = store.reads
+        store.reads = 0
+        order_ids, cursor = store.page(5)
+        while cursor:
+            more, cursor = store.page(5, order_index.encode_cursor(order_index.decode_cursor(cursor)[0]))
+            order_ids += more
+        self.assertEqual(order_ids, store.newest_first())
+        self.assertLess(resumed, store.reads)
+
+    def test_heads_sealed_between_pages_lose_nothing(self):
+        store = IndexStore()
+        store.add(30)
+        listed = store.newest_first()
+        order_ids = store.list_all(4, between_pages=lambda: store.add(5))
+        self.assertEqual(len(order_ids), len(set(order_ids)))
+        self.assertFalse(set(listed) - set(order_ids))
+
+    def test_expired_page_ends_its_shard(self):
+        store = IndexStore()
+        store.add(30)
+        # Retention expires the oldest pages first
+        for page in range(2):
+            del store.data[order_index.page_key(0, page)]
+        remaining = store.newest_first()
+        for limit in (4, 30):
+            order_ids = store.list_all(limit)
+            self.assertEqual(len(order_ids), len(set(order_ids)))
+            self.assertEqual(set(order_ids), set(remaining))
+
+    def test_cursor_from_other_shard_count_falls_back_to_the_heads(self):
+        store = IndexStore()
+        store.add(20)
+        entry = order_index.decode_cursor(store.page(5)[1])[0]
+        cursor = order_index.encode_cursor(entry, [[0, False]])
+        order_ids, _ = store.page(20, cursor)
+        self.assertEqual(order_ids, store.newest_first()[5:])
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('not-base64!', order_index.encode_cursor(('1', 'o1'), [['x', 1]])):
+            with self.assertRaises(ValueError):
+                order_index.decode_cursor(cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
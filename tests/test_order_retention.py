@@ -0,0 +1,89 @@
+"""Order retention (ORDER_RETENTION_SECONDS) against the fake sidecar: expired
+index pages must not take orders that are still open off the order list, and
+the index must not keep growing.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'order-service'), os.path.join(REPO_ROOT, 'perf')]
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+
+import orders
+from fake_sidecar import FakeSidecar, point_dapr_sdk_at
+
+TTL_SECONDS = 1
+INDEX_TTL_SECONDS = 2
+
+
+class RetentionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sidecar = FakeSidecar()
+        point_dapr_sdk_at(*self.sidecar.start())
+        self.addCleanup(self.sidecar.stop)
+        for name, value in (
+            ('ORDER_INDEX_SHARDS', 1),
+            ('ORDER_INDEX_PAGE_SIZE', 2),
+            ('RETENTION_METADATA', {'ttlInSeconds': str(TTL_SECONDS)}),
+            ('INDEX_RETENTION_METADATA', {'ttlInSeconds': str(INDEX_TTL_SECONDS)}),
+            ('_dapr_client', None)
+        ):
+            patcher = mock.patch.object(orders, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(orders.close_dapr_client)
+
+    def list_all(self, status=None):
+        client = orders.get_dapr_client()
+        order_ids, cursor = orders._query_order_ids(client, status, 2)
+        while cursor:
+            more, cursor = orders._query_order_ids(client, status, 2, orders.order_index.decode_cursor(cursor))
+            order_ids += more
+        return order_ids
+
+    def index_keys(self):
+        # Reading a key is what drops it from the fake store once expired
+        return [
+            key for key in list(self.sidecar.store)
+            if key.startswith('order-index-') and self.sidecar.dapr.current(key)[0]
+        ]
+
+    def test_open_order_outlives_its_sealed_page(self):
+        # o1 is still open; the orders after it seal its page and then the
+        # page after that, while o2 and o3 finish
+        for n in range(1, 7):
+            orders._write_index_entries([(f"{n:04d}", f"o{n}")])
+        orders._write_index_entries([('0002', 'o2')], index='ready')
+        orders._write_index_entries([('0003', 'o3')], index='ready')
+        orders._write_index_entries([('0005', 'o5')], index='ready')
+
+        time.sleep(TTL_SECONDS + 0.2)
+
+        self.assertEqual(self.list_all(), ['o6', 'o5', 'o4', 'o3', 'o2', 'o1'])
+        # The finished orders' ready-index page did expire
+        self.assertEqual(self.list_all('ready'), ['o5'])
+        self.assertGreater(self.sidecar.dapr.expired, 0)
+
+    def test_index_keys_stay_bounded(self):
+        counts = []
+        for batch in range(3):
+            for n in range(batch * 20, batch * 20 + 20):
+                created_at = f"{n:04d}"
+                orders._write_index_entries([(created_at, f"o{n}")])
+                orders._write_index_entries([(created_at, f"o{n}")], index='ready')
+            counts.append(len(self.index_keys()))
+            time.sleep(INDEX_TTL_SECONDS + 0.2)
+
+        # Each index holds at most one batch's 10 pages and its head; the
+        # older batches' pages have expired by the time the next is counted
+        self.assertLessEqual(max(counts), 2 * 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Modules each service carries its own copy of, so it builds and deploys on
+its own, must stay identical: change one copy and copy it to the others.
+
+    python -m unittest discover tests
+"""
+import os
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHARED = {
+    'codec.py': ('order-service', 'kitchen-service', 'bar-service'),
+    'seen_events.py': ('order-service', 'kitchen-service', 'bar-service'),
+    'dapr_grpc.py': ('order-service', 'kitchen-service', 'bar-service'),
+    'station_scheduler.py': ('kitchen-service', 'bar-service')
+}
+
+
+def read(service, module):
+    with open(os.path.join(REPO_ROOT, service, module), 'rb') as f:
+        return f.read()
+
+
+class SharedModulesTest(unittest.TestCase):
+
+    def test_copies_are_identical(self):
+        for module, services in SHARED.items():
+            first = read(services[0], module)
+            for service in services[1:]:
+                with self.subTest(module=module, service=service):
+                    self.assertEqual(
+                        read(service, module), first, f"{service}/{module} differs from {services[0]}/{module}"
+                    )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Bulk deliveries to the kitchen (kitchen.py) against the fake sidecar: a
+batch of orders costs a fixed number of sidecar calls, not some per order.
+The bar shares the code.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+import uuid
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'kitchen-service'), os.path.join(REPO_ROOT, 'perf')]
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+# Nothing gets cooked while a test looks at the sidecar calls
+os.environ.setdefault('PREP_TIME_SCALE', '1000')
+
+import kitchen
+from fake_sidecar import FakeSidecar, point_dapr_sdk_at
+
+ORDERS = 10
+
+
+def bulk_entry(order_id, items=('Classic Burger',)):
+    data = {'order_id': order_id, 'customer_name': 'test', 'items': list(items)}
+    return {
+        'entryId': order_id,
+        'event': {
+            'specversion': '1.0',
+            'id': str(uuid.uuid4()),
+            'source': 'test',
+            'type': 'com.dapr.event.sent',
+            'datacontenttype': 'application/json',
+            'data': data
+        },
+        'contentType': 'application/cloudevents+json'
+    }
+
+
+class KitchenBulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sidecar = FakeSidecar()
+        point_dapr_sdk_at(*self.sidecar.start())
+        self.addCleanup(self.sidecar.stop)
+        for name, value in (('ORDER_QUEUE_SIZE', 1000), ('_dapr_client', None)):
+            patcher = mock.patch.object(kitchen, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # The dropped entries are logged as errors
+        patcher = mock.patch.object(kitchen.log, 'disabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(kitchen.close_dapr_client)
+
+    def deliver(self, entries):
+        statuses = kitchen.handle_orders_bulk({'entries': entries})['statuses']
+        return {status['entryId']: status['status'] for status in statuses}
+
+    def eta_order_ids(self):
+        return [
+            kitchen.codec.decode(data)['order_id'] for topic, data in self.sidecar.published
+            if topic == 'kitchen-completed'
+        ]
+
+    def test_a_bulk_delivery_costs_one_claim_and_one_publish(self):
+        order_ids = [f'bulk-{uuid.uuid4().hex[:8]}' for _ in range(ORDERS)]
+        self.sidecar.calls.clear()
+
+        statuses = self.deliver([bulk_entry(order_id) for order_id in order_ids])
+
+        self.assertEqual(statuses, {order_id: 'SUCCESS' for order_id in order_ids})
+        self.assertEqual(self.sidecar.calls, {'ExecuteStateTransaction': 1, 'BulkPublishEventAlpha1': 1})
+        self.assertEqual(sorted(self.eta_order_ids()), sorted(order_ids))
+        for order_id in order_ids:
+            self.assertEqual(self.sidecar.store[f'kitchen-seen-{order_id}'][0], b'1')
+
+    def test_orders_marked_by_another_replica_are_acked_not_cooked(self):
+        taken, new = f'taken-{uuid.uuid4().hex[:8]}', f'new-{uuid.uuid4().hex[:8]}'
+        self.sidecar.store[f'kitchen-seen-{taken}'] = (b'1', '1')
+
+        statuses = self.deliver([bulk_entry(taken), bulk_entry(new)])
+
+        self.assertEqual(statuses, {taken: 'SUCCESS', new: 'SUCCESS'})
+        self.assertNotIn(taken, kitchen.scheduler)
+        self.assertIn(new, kitchen.scheduler)
+        self.assertEqual(self.eta_order_ids(), [new])
+
+    def test_orders_without_items_are_dropped_before_their_marker(self):
+        empty, good = f'empty-{uuid.uuid4().hex[:8]}', f'good-{uuid.uuid4().hex[:8]}'
+
+        statuses = self.deliver([bulk_entry(empty, items=()), bulk_entry(good)])
+
+        self.assertEqual(statuses, {empty: 'DROP', good: 'SUCCESS'})
+        self.assertNotIn(f'kitchen-seen-{empty}', self.sidecar.store)
+
+    def test_an_order_that_cannot_be_scheduled_gives_its_marker_back(self):
+        order_ids = [f'fail-{uuid.uuid4().hex[:8]}' for _ in range(2)]
+        with mock.patch.object(kitchen, 'enqueue_order', side_effect=RuntimeError('scheduler broke')):
+            statuses = self.deliver([bulk_entry(order_id) for order_id in order_ids])
+
+        self.assertEqual(set(statuses.values()), {'DROP'})
+        for order_id in order_ids:
+            self.assertNotIn(f'kitchen-seen-{order_id}', self.sidecar.store)
+
+
+if __name__ == '__main__':
+    unittest.main()
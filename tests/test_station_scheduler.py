@@ -0,0 +1,74 @@
+"""Per-item station scheduling (station_scheduler.py), as the kitchen and bar
+run it: identical items from different orders are prepared as one batch.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'bar-service'))
+
+from station_scheduler import StationScheduler
+
+PREP_TIMES = {'IPA': 1.0, 'Lager': 2.0}
+
+
+class StationSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = StationScheduler(1, PREP_TIMES.get, batch_size=3)
+
+    def test_identical_items_from_several_orders_share_a_batch(self):
+        for n in range(4):
+            self.scheduler.add(f'o{n}', ['IPA'], None, 0.0)
+
+        batch = self.scheduler.next_batch(0.0)
+
+        self.assertEqual(batch.item, 'IPA')
+        self.assertEqual([order.order_id for order in batch.orders], ['o0', 'o1', 'o2'])
+        self.assertEqual(batch.finish_at, 1.0)
+        self.assertEqual(self.scheduler.queued, 1)
+        done = self.scheduler.finish(batch)
+        self.assertEqual([order.order_id for order in done], ['o0', 'o1', 'o2'])
+        self.assertEqual(self.scheduler.next_batch(1.0).orders[0].order_id, 'o3')
+
+    def test_oldest_waiting_item_goes_first(self):
+        self.scheduler.add('o1', ['Lager', 'IPA'], None, 0.0)
+        self.scheduler.add('o2', ['IPA'], None, 0.0)
+
+        self.assertEqual(self.scheduler.next_batch(0.0).item, 'Lager')
+        self.assertEqual(self.scheduler.busy, 1)
+
+    def test_estimates_play_the_queue_forward(self):
+        self.assertEqual(self.scheduler.add('o1', ['IPA'], None, 0.0), 1.0)
+        self.assertEqual(self.scheduler.add('o2', ['Lager'], None, 0.0), 3.0)
+        # A later IPA joins the first batch and does not move o2
+        self.assertEqual(self.scheduler.add('o3', ['IPA'], None, 0.5), 1.5)
+        self.assertEqual(self.scheduler.estimate(0.5)['o2'], 3.5)
+        self.assertEqual(self.scheduler.backlog(0.5), 3.0)
+
+    def test_order_is_done_with_its_last_unit(self):
+        self.scheduler.add('o1', ['IPA', 'Lager'], None, 0.0)
+
+        self.assertEqual(self.scheduler.finish(self.scheduler.next_batch(0.0)), [])
+        last = self.scheduler.next_batch(1.0)
+        done = self.scheduler.finish(last)
+
+        self.assertEqual([order.order_id for order in done], ['o1'])
+        self.assertEqual(done[0].done, {'IPA': 1, 'Lager': 1})
+        self.assertNotIn('o1', self.scheduler)
+
+    def test_redelivered_order_keeps_its_place(self):
+        ready_at = self.scheduler.add('o1', ['IPA'], None, 0.0)
+        self.assertEqual(self.scheduler.add('o1', ['IPA'], None, 0.5), ready_at)
+        self.assertEqual(self.scheduler.waiting_units(), {'IPA': 1})
+
+    def test_order_without_items_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.add('o1', [], None, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()